@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from .routes import merge, split, compress, project_exporter
+from .routes import merge, split, compress, project_exporter, documents, jobs, thumbnails, analyze, storage
 
 api_router = APIRouter()
 
@@ -7,3 +7,8 @@ api_router.include_router(merge.router, prefix="/merge", tags=["Merge"])
 api_router.include_router(split.router, prefix="/split", tags=["Split"])
 api_router.include_router(compress.router, prefix="/compress", tags=["Compress"])
 api_router.include_router(project_exporter.router, prefix="/project-exporter", tags=["Project Exporter"])
+api_router.include_router(documents.router, prefix="/documents", tags=["Documents"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
+api_router.include_router(thumbnails.router, prefix="/thumbnails", tags=["Thumbnails"])
+api_router.include_router(analyze.router, prefix="/analyze", tags=["Analyze"])
+api_router.include_router(storage.router, prefix="/storage", tags=["Storage"])
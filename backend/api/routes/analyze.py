@@ -0,0 +1,48 @@
+import json
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Response
+from typing import Optional
+import logging
+
+from app.core.lazy_imports import lazy_import
+from app.services.document_sessions import pdf_source
+from app.services.pdf_analyzer import analyze_pdf_file
+from app.services.pdf_processor import pdf_processor_service
+from app.services.result_cache import CachedResult, cache_key, result_cache
+from .compress import COMPRESSION_LEVELS
+
+pikepdf = lazy_import("pikepdf")
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.post("/")
+async def analyze_document(file: Optional[UploadFile] = File(None), document_id: Optional[str] = Form(None),
+                           input_key: Optional[str] = Form(None)):
+    """
+    Describe what a PDF contains: page count, images by filter and DPI, embedded fonts,
+    duplicate streams, incremental-update bloat and encryption, plus the expected savings
+    of each compression level. Takes an upload, a document opened via /documents, or a
+    file uploaded to /storage (input_key).
+    """
+    try:
+        async with pdf_source(file, document_id, input_key) as source:
+            key = cache_key("analyze_pdf_file", [source.sha256], COMPRESSION_LEVELS)
+            result = await result_cache.get(key)
+            if result is None:
+                report = await pdf_processor_service.run(analyze_pdf_file, source.path, COMPRESSION_LEVELS)
+                logger.info(f"Analyzed {source.filename}: {report['page_count']} pages, "
+                            f"{report['images']['count']} images, rewrite estimate {report['estimates']['rewrite_savings']}")
+                result = await result_cache.put(
+                    key, CachedResult(json.dumps(report).encode("utf-8"), "application/json", {})
+                )
+        return Response(content=result.read(), media_type="application/json")
+    except HTTPException:
+        raise
+    except pikepdf.PasswordError:
+        raise HTTPException(status_code=400, detail="The PDF is password protected.")
+    except pikepdf.PdfError as e:
+        logger.warning(f"Rejected analysis input: {e}")
+        raise HTTPException(status_code=400, detail="The uploaded file is not a valid PDF.")
+    except Exception as e:
+        logger.error(f"Error analyzing PDF: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error analyzing PDF.")
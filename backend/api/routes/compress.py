@@ -1,108 +1,390 @@
+from __future__ import annotations
+
+import asyncio
 import io
+import json
+import os
+import shutil
+import time
 import zipfile
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
+from fastapi import APIRouter, File, UploadFile, Form, Header, HTTPException, Request
 from fastapi.responses import StreamingResponse
-import pikepdf
-from typing import List
+from typing import List, Optional
 import logging
-from PIL import Image
+
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.admission import charge
+from app.services.dedup import deduplicate
+from app.services.image_compression import ImageRecompressor
+from app.services.jobs import ProgressReporter
+from app.services.metrics import observe_document, span
+from app.services.pdf_analyzer import analyze_pdf
+from app.services.pdf_processor import pdf_processor_service
+from app.services.result_cache import CachedResult, cache_key, not_modified, result_cache, result_response
+from app.services.uploads import (SpooledUpload, open_spooled_pdf, output_file, remove_file, spool_output_path,
+                                  spool_upload, spool_uploads)
+from app.services.zip_stream import stream_zip
+
+pikepdf = lazy_import("pikepdf")
+Image = lazy_import("PIL.Image")
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Compression levels
+COMPRESSION_LEVELS = {
+    "high": {"dpi": 72, "quality": 60},      # High compression
+    "medium": {"dpi": 150, "quality": 75},   # Balanced
+    "low": {"dpi": 300, "quality": 85}       # Low compression
+}
+
 @router.post("/")
-async def compress_pdfs(files: List[UploadFile] = File(...), level: str = Form("medium")):
+async def compress_pdfs(request: Request, files: List[UploadFile] = File(...), level: str = Form("medium"),
+                        if_none_match: Optional[str] = Header(None)):
     """
     Simple compression endpoint that works reliably
     """
     try:
         logger.info(f"Compressing {len(files)} files with level: {level}")
+        charge(request, files=len(files))
         
-        # Compression levels
-        compression_levels = {
-            "high": {"dpi": 72, "quality": 60},      # High compression
-            "medium": {"dpi": 150, "quality": 75},   # Balanced
-            "low": {"dpi": 300, "quality": 85}       # Low compression
-        }
-        
-        params = compression_levels.get(level, compression_levels["medium"])
+        params = COMPRESSION_LEVELS.get(level, COMPRESSION_LEVELS["medium"])
         
         # For single file, return PDF directly; for multiple, return ZIP
         if len(files) == 1:
-            return await compress_single_pdf(files[0], params)
+            return await compress_single_pdf(files[0], compress_pdf_file, params, if_none_match=if_none_match)
         else:
-            return await compress_multiple_pdfs(files, params)
+            return await compress_multiple_pdfs(files, compress_pdf_file, params)
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Compression error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def compress_single_pdf(file: UploadFile, params: dict):
-    """Compress single PDF and return as PDF"""
+async def compress_single_pdf(file: UploadFile, job, *job_args, if_none_match: Optional[str] = None):
+    """Compress single PDF with the given worker job and return as PDF"""
+    upload = await spool_upload(file)
     try:
-        pdf_bytes = await file.read()
-        compressed_pdf = compress_pdf_bytes(pdf_bytes, params)
-        
-        output_buffer = io.BytesIO(compressed_pdf)
-        filename = f"compressed_{file.filename}"
-        
-        return StreamingResponse(
-            output_buffer,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-    except Exception as e:
-        raise e
-
-async def compress_multiple_pdfs(files: List[UploadFile], params: dict):
-    """Compress multiple PDFs and return as ZIP"""
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for file in files:
-            try:
-                pdf_bytes = await file.read()
-                compressed_pdf = compress_pdf_bytes(pdf_bytes, params)
-                
-                filename = f"compressed_{file.filename}"
-                zip_file.writestr(filename, compressed_pdf)
-                
-            except Exception as e:
-                logger.warning(f"Failed to compress {file.filename}: {e}")
-                continue
+        key = cache_key(job.__name__, [upload.sha256], job_args)
+        response = not_modified(key, if_none_match)
+        if response is not None:
+            return response
+        result = await result_cache.get(key)
+        if result is None:
+            with output_file() as output_path:
+                report = await pdf_processor_service.run(job, upload.path, *job_args, output_path)
+            logger.info(f"Compression report for {file.filename}: {report}")
+            observe_compression(report)
+            result = await result_cache.put(key, compressed_result(output_path, report))
+    finally:
+        upload.cleanup()
     
-    zip_buffer.seek(0)
+    filename = f"compressed_{file.filename}"
+    return result_response(key, result, filename)
+
+def observe_compression(report: dict) -> None:
+    operation = "compress_to_size" if "target_size" in report else "compress"
+    observe_document(operation, report["original_size"], report["compressed_size"])
+
+def compressed_result(output_path: str, report: dict) -> CachedResult:
+    """Wrap a worker's output file and its report; the file is owned by the result"""
+    headers = {"X-Compression-Report": json.dumps(report, separators=(",", ":"))}
+    if "target_size" in report:
+        headers["X-Achieved-Size"] = str(report["compressed_size"])
+        headers["X-Target-Met"] = "true" if report["target_met"] else "false"
+    return CachedResult.from_file(output_path, "application/pdf", headers)
+
+async def compress_multiple_pdfs(files: List[UploadFile], job, *job_args, include_report: bool = False):
+    """Compress multiple PDFs with the given worker job and return as ZIP"""
+    uploads = await spool_uploads(files)
+    # The members are already-compressed PDFs, so deflating them again costs CPU for almost nothing
     return StreamingResponse(
-        zip_buffer,
+        stream_zip(compressed_members(uploads, job, job_args, include_report), zipfile.ZIP_STORED),
         media_type="application/zip",
         headers={"Content-Disposition": "attachment; filename=compressed_pdfs.zip"}
     )
 
+async def compressed_members(uploads: List[SpooledUpload], job, job_args: tuple, include_report: bool):
+    """Yields (name, data) ZIP members in upload order while later files are still compressing"""
+    reports = {}
+    results = None
+    output_paths = {}
+    try:
+        keys = [cache_key(job.__name__, [upload.sha256], job_args) for upload in uploads]
+        cached = [await result_cache.get(key) for key in keys]
+
+        # Uncached files are compressed concurrently in the worker pool; failures are skipped
+        # like before, but a full pool (503) or timeout (504) aborts the archive.
+        for upload, result in zip(uploads, cached):
+            if result is None:
+                output_paths[upload.path] = spool_output_path()
+        jobs = ((upload.path, *job_args, output_paths[upload.path]) for upload in uploads if upload.path in output_paths)
+        results = pdf_processor_service.run_ordered(job, jobs, return_exceptions=True)
+        for upload, key, result in zip(uploads, keys, cached):
+            if result is None:
+                outcome = await results.__anext__()
+                if isinstance(outcome, Exception):
+                    logger.warning(f"Failed to compress {upload.filename}: {outcome}")
+                    continue
+                logger.info(f"Compression report for {upload.filename}: {outcome}")
+                observe_compression(outcome)
+                result = await result_cache.put(key, compressed_result(output_paths.pop(upload.path), outcome))
+            reports[upload.filename] = json.loads(result.headers["X-Compression-Report"])
+            data = await asyncio.to_thread(result.read)
+            result.discard()
+            yield f"compressed_{upload.filename}", data
+        if include_report:
+            yield "compression_report.json", json.dumps(reports, indent=2).encode("utf-8")
+    finally:
+        if results is not None:
+            await results.aclose()
+        for output_path in output_paths.values():
+            remove_file(output_path)
+        for upload in uploads:
+            upload.cleanup()
+
 def compress_pdf_bytes(pdf_bytes: bytes, params: dict) -> bytes:
     """Core PDF compression function"""
+    output = io.BytesIO()
+    with pikepdf.Pdf.open(io.BytesIO(pdf_bytes)) as pdf:
+        compress_pdf(pdf, params, pdf_bytes, output)
+    return output.getvalue()
+
+def compress_pdf_file(pdf_path: str, params: dict, output_path: str, progress_path: Optional[str] = None) -> dict:
+    """Compress a spooled upload into output_path; runs in a worker process and returns the report"""
+    with open_spooled_pdf(pdf_path) as pdf:
+        return compress_pdf(pdf, params, pdf_path, output_path, ProgressReporter(progress_path))
+
+def compress_pdf(pdf: pikepdf.Pdf, params: dict, source, output,
+                 progress: Optional[ProgressReporter] = None) -> dict:
+    """
+    Compress an already opened PDF in stages, write it to output (a path
+    or a binary stream) and return the report: identical streams are merged
+    into one object, images are downsampled to params["dpi"] and re-encoded
+    as JPEG at params["quality"], then the whole file is rewritten with
+    recompressed streams.
+
+    source is the file pdf was opened from (a path or bytes). A quick analysis
+    decides which stages can pay off: dedup only runs when there are duplicate
+    streams, the image stage only when there are images it can re-encode, and
+    when nothing changed and the rewrite is not expected to save
+    COMPRESS_MIN_REWRITE_SAVINGS_PERCENT, the original file is returned as is.
+    A rewrite that comes out larger is also replaced by the original.
+    """
+    progress = progress or ProgressReporter(None)
+    original_size = os.path.getsize(source) if isinstance(source, str) else len(source)
     try:
-        # Open PDF
-        pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes))
+        progress.update(force=True, stage="analyze", pages_total=len(pdf.pages))
+        with span("pdf_analyze"):
+            analysis = analyze_pdf(pdf, source)
+
+        dedup_stage = None
+        if (settings.PDF_DEDUPLICATE and analysis.report["duplicate_streams"]["extra_copies"]
+                and (analysis.images or analysis.rewrite_worthwhile())):
+            progress.update(force=True, stage="dedup")
+            dedup_stage = deduplicate(pdf)
+        deduplicated = bool(dedup_stage and dedup_stage["objects_merged"])
+
+        image_stage = {"images_found": 0, "images_recompressed": 0, "bytes_before": 0, "bytes_after": 0,
+                       "bytes_saved": 0, "skipped": True}
+        if analysis.images:
+            progress.update(force=True, stage="images")
+            with span("image_recompress"):
+                # Merged duplicates are no longer placed on any page, so the images are looked up again
+                recompressor = ImageRecompressor(pdf, images=None if deduplicated else analysis.images)
+                try:
+                    image_stage = recompressor.apply(params["dpi"], params["quality"])
+                finally:
+                    recompressor.close()
+
+        changed = deduplicated or image_stage["images_recompressed"] > 0
+        if not changed and not analysis.rewrite_worthwhile():
+            compressed_size = write_original(source, output)
+            return build_report(original_size, compressed_size, params, image_stage, rewrite_skipped=True,
+                                rewrite_estimate=analysis.rewrite_savings, dedup_stage=dedup_stage)
+
+        progress.update(force=True, stage="rewrite")
+        compressed_size = save_compressed(pdf, output)
+        if not changed and compressed_size >= original_size:
+            compressed_size = write_original(source, output)
+        return build_report(original_size, compressed_size, params, image_stage,
+                            rewrite_estimate=analysis.rewrite_savings, dedup_stage=dedup_stage)
         
-        # Basic compression without image processing (more reliable)
-        output_buffer = io.BytesIO()
+    except Exception as e:
+        logger.error(f"PDF compression error: {e}")
+        raise e
+
+def save_compressed(pdf: pikepdf.Pdf, output) -> int:
+    """Rewrite the whole file with recompressed streams and object streams; returns the size written"""
+    with span("pdf_save"):
         pdf.save(
-            output_buffer,
+            output,
             linearize=True,
             compress_streams=True,
             object_stream_mode=pikepdf.ObjectStreamMode.generate,
             recompress_flate=True
         )
-        
-        return output_buffer.getvalue()
-        
-    except Exception as e:
-        logger.error(f"PDF compression error: {e}")
-        raise e
+    if isinstance(output, (str, os.PathLike)):
+        return os.path.getsize(output)
+    return output.seek(0, io.SEEK_END)
+
+def write_original(source, output) -> int:
+    """Write the unmodified input to output (a path or a binary stream); returns its size"""
+    if isinstance(output, (str, os.PathLike)):
+        if isinstance(source, str):
+            shutil.copyfile(source, output)
+        else:
+            with open(output, "wb") as f:
+                f.write(source)
+        return os.path.getsize(output)
+    output.seek(0)
+    output.truncate()
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            shutil.copyfileobj(f, output)
+    else:
+        output.write(source)
+    return output.tell()
+
+def save_candidate(pdf: pikepdf.Pdf) -> tuple:
+    """Save pdf to a new output_file() path; returns (path, size)"""
+    with output_file() as path:
+        return path, save_compressed(pdf, path)
+
+def build_report(original_size: int, compressed_size: int, params, image_stage: dict,
+                 rewrite_skipped: bool = False, rewrite_estimate: Optional[int] = None,
+                 dedup_stage: Optional[dict] = None) -> dict:
+    rewrite_input = original_size - image_stage["bytes_saved"] - (dedup_stage["bytes_saved"] if dedup_stage else 0)
+    rewrite_stage = {"stage": "rewrite", "bytes_before": rewrite_input, "bytes_after": compressed_size,
+                     "bytes_saved": rewrite_input - compressed_size}
+    if rewrite_skipped:
+        rewrite_stage["skipped"] = True
+    if rewrite_estimate is not None:
+        rewrite_stage["estimated_savings"] = rewrite_estimate
+    return {
+        "original_size": original_size,
+        "compressed_size": compressed_size,
+        "params": params,
+        "stages": ([{"stage": "dedup", **dedup_stage}] if dedup_stage else [])
+                  + [{"stage": "images", **image_stage}, rewrite_stage],
+    }
+
+# Size search ladder, ordered from gentlest to most aggressive
+TARGET_SIZE_LADDER = [
+    {"dpi": 300, "quality": 85},
+    {"dpi": 300, "quality": 75},
+    {"dpi": 200, "quality": 75},
+    {"dpi": 150, "quality": 75},
+    {"dpi": 150, "quality": 65},
+    {"dpi": 120, "quality": 60},
+    {"dpi": 96, "quality": 55},
+    {"dpi": 72, "quality": 50},
+    {"dpi": 72, "quality": 40},
+    {"dpi": 60, "quality": 35},
+    {"dpi": 50, "quality": 30},
+]
+
+def compress_pdf_file_to_size(pdf_path: str, target_bytes: int, output_path: str,
+                              progress_path: Optional[str] = None) -> dict:
+    """Target-size compression of a spooled upload into output_path; runs in a worker process"""
+    with open_spooled_pdf(pdf_path) as pdf:
+        return compress_pdf_to_size(pdf, target_bytes, os.path.getsize(pdf_path), output_path,
+                                    progress=ProgressReporter(progress_path))
+
+def compress_pdf_to_size(pdf: pikepdf.Pdf, target_bytes: int, original_size: int, output_path: str,
+                         time_budget: Optional[float] = None,
+                         progress: Optional[ProgressReporter] = None) -> dict:
+    """
+    Find the gentlest TARGET_SIZE_LADDER step whose output fits in target_bytes.
+
+    Decoded images are kept in a cache of TARGET_SIZE_DECODE_CACHE_MB, so
+    most are decoded only once. Each step's size is estimated as the non-image
+    bytes of a baseline save plus the re-encoded size of every image, and a
+    binary search over the ladder picks a step. The pick is verified with a
+    real save; on a miss the estimate is corrected and the search continues
+    on the more aggressive steps until the time budget runs out.
+
+    Every candidate is saved to its own output_file(); only the path and
+    size of the smallest one are kept, and it is moved to output_path at
+    the end, so no candidate is ever held in memory. Returns the report.
+    """
+    deadline = time.monotonic() + (time_budget or settings.TARGET_SIZE_TIME_BUDGET_SECONDS)
+    progress = progress or ProgressReporter(None)
+    dedup_stage = None
+    if settings.PDF_DEDUPLICATE:
+        progress.update(force=True, stage="dedup", pages_total=len(pdf.pages))
+        dedup_stage = deduplicate(pdf)
+    progress.update(force=True, stage="images", pages_total=len(pdf.pages))
+    with span("image_scan"):
+        recompressor = ImageRecompressor(
+            pdf, decoded_cache_bytes=int(settings.TARGET_SIZE_DECODE_CACHE_MB * 1024 * 1024)
+        )
+    best_path = None
+    try:
+        best_path, best_size = save_candidate(pdf)
+        best_params = None
+        best_stage = {"images_found": recompressor.images_found, "images_recompressed": 0,
+                      "bytes_before": 0, "bytes_after": 0, "bytes_saved": 0}
+        iterations = [{"params": None, "actual_size": best_size}]
+        overhead = best_size - recompressor.total_raw_bytes
+
+        def estimate(index: int) -> int:
+            params = TARGET_SIZE_LADDER[index]
+            size = overhead + recompressor.estimated_image_bytes(params["dpi"], params["quality"])
+            iterations.append({"params": params, "estimated_size": size})
+            return size
+
+        def search(low: int, high: int) -> int:
+            chosen = high
+            while low <= high and time.monotonic() < deadline:
+                mid = (low + high) // 2
+                if estimate(mid) <= target_bytes:
+                    chosen, high = mid, mid - 1
+                else:
+                    low = mid + 1
+            return chosen
+
+        index = search(0, len(TARGET_SIZE_LADDER) - 1)
+        while best_size > target_bytes and recompressor.images_found:
+            params = TARGET_SIZE_LADDER[index]
+            image_stage = recompressor.apply(params["dpi"], params["quality"])
+            path, size = save_candidate(pdf)
+            iterations.append({"params": params, "actual_size": size})
+            if size < best_size:
+                remove_file(best_path)
+                best_path, best_size, best_params, best_stage = path, size, params, image_stage
+            else:
+                remove_file(path)
+            progress.update(force=True, stage="search", best_size=best_size)
+            if size <= target_bytes or index == len(TARGET_SIZE_LADDER) - 1 or time.monotonic() >= deadline:
+                break
+            # Fold the estimation error into the overhead and retry on the more aggressive steps
+            overhead += size - (overhead + image_stage["bytes_after"]
+                                + recompressor.total_raw_bytes - image_stage["bytes_before"])
+            index = search(index + 1, len(TARGET_SIZE_LADDER) - 1)
+
+        with span("output_write"):
+            shutil.move(best_path, output_path)
+        best_path = None
+    finally:
+        recompressor.close()
+        if best_path is not None:
+            remove_file(best_path)
+
+    report = build_report(original_size, best_size, best_params, best_stage, dedup_stage=dedup_stage)
+    report.update({
+        "target_size": target_bytes,
+        "target_met": best_size <= target_bytes,
+        "iterations": iterations,
+    })
+    return report
 
 # Simple quality-based endpoint
 @router.post("/quality")
-async def compress_by_quality(files: List[UploadFile] = File(...), quality: int = Form(50)):
+async def compress_by_quality(request: Request, files: List[UploadFile] = File(...), quality: int = Form(50),
+                              if_none_match: Optional[str] = Header(None)):
     """Quality-based compression (1-100%)"""
     try:
         # Map quality percentage to compression level
@@ -113,32 +395,38 @@ async def compress_by_quality(files: List[UploadFile] = File(...), quality: int
         else:
             level = "high"     # 1-49% = high compression
             
-        return await compress_pdfs(files, level)
+        return await compress_pdfs(request, files, level, if_none_match=if_none_match)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Quality compression error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Simple size-based endpoint
 @router.post("/size")
-async def compress_by_size(files: List[UploadFile] = File(...), 
+async def compress_by_size(request: Request, files: List[UploadFile] = File(...), 
                           target_size: int = Form(...), 
-                          size_unit: str = Form("KB")):
-    """Size-based compression"""
+                          size_unit: str = Form("KB"),
+                          if_none_match: Optional[str] = Header(None)):
+    """Size-based compression: searches quality/DPI until each file fits target_size"""
     try:
-        # Convert to KB
+        # Convert to bytes
         target_kb = target_size * 1024 if size_unit.upper() == "MB" else target_size
-        
-        # Map target size to compression level
-        if target_kb <= 500:    # <= 500KB
-            level = "high"
-        elif target_kb <= 2000: # <= 2MB  
-            level = "medium"
-        else:                   # > 2MB
-            level = "low"
+        if target_kb <= 0:
+            raise HTTPException(status_code=400, detail="target_size must be positive.")
+        target_bytes = target_kb * 1024
+        logger.info(f"Compressing {len(files)} files to target size: {target_bytes} bytes")
+        charge(request, files=len(files))
             
-        return await compress_pdfs(files, level)
+        if len(files) == 1:
+            return await compress_single_pdf(files[0], compress_pdf_file_to_size, target_bytes,
+                                             if_none_match=if_none_match)
+        else:
+            return await compress_multiple_pdfs(files, compress_pdf_file_to_size, target_bytes, include_report=True)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Size compression error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
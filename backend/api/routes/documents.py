@@ -0,0 +1,37 @@
+from fastapi import APIRouter, File, UploadFile, HTTPException
+import logging
+
+from app.core.lazy_imports import lazy_import
+from app.services.document_sessions import document_sessions
+from app.services.uploads import spool_upload
+
+pikepdf = lazy_import("pikepdf")
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.post("/")
+async def upload_document(file: UploadFile = File(...)):
+    """Upload a PDF once; later split/merge/extract calls can refer to it by document_id"""
+    try:
+        upload = await spool_upload(file)
+        session = await document_sessions.open(upload)
+        logger.info(f"Opened document session {session.document_id} for {upload.filename} ({len(session.pages)} pages)")
+        return session.metadata()
+    except HTTPException:
+        raise
+    except pikepdf.PdfError as e:
+        logger.warning(f"Rejected document upload {file.filename}: {e}")
+        raise HTTPException(status_code=400, detail="The uploaded file is not a valid PDF.")
+    except Exception as e:
+        logger.error(f"Error opening document: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error opening document.")
+
+@router.get("/{document_id}")
+async def get_document(document_id: str):
+    return document_sessions.get(document_id).metadata()
+
+@router.delete("/{document_id}")
+async def delete_document(document_id: str):
+    document_sessions.delete(document_id)
+    return {"deleted": document_id}
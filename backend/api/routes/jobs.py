@@ -0,0 +1,185 @@
+import json
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
+from typing import List, Optional
+import logging
+
+from app.services.admission import charge, hold_admission
+from app.services.jobs import COMPLETED, Job, JobResult, job_queue
+from app.services.merge_planner import MergePlanError, plan_merge, referenced_sources
+from app.services.result_cache import CachedResult, cache_key, result_cache
+from app.services.storage import get_object_store
+from app.services.uploads import spool_upload, spool_uploads
+from .compress import COMPRESSION_LEVELS, compress_pdf_file, compress_pdf_file_to_size, compressed_result
+from .merge import merge_pages
+
+class JobSubmitRoute(APIRoute):
+    """Rejects a submission with 503 while the job queue is full, before the upload is read"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def check_capacity_first(request: Request) -> Response:
+            if request.method == "POST":
+                job_queue.check_capacity()
+            return await handler(request)
+
+        return check_capacity_first
+
+router = APIRouter(route_class=JobSubmitRoute)
+logger = logging.getLogger(__name__)
+
+# Seconds between SSE keep-alive comments when a job's progress has not changed
+SSE_KEEPALIVE_SECONDS = 15
+
+async def cached_or_run(job: Job, run, key: str, fn, args: tuple) -> CachedResult:
+    """
+    Reuse a result cached by the synchronous endpoints, otherwise run fn in the
+    worker pool with the job's output file path appended to args
+    """
+    result = await result_cache.get(key)
+    if result is None:
+        output_path = job_queue.store.output_path(job.job_id)
+        output = await run(fn, (*args, output_path))
+        if isinstance(output, dict):
+            result = compressed_result(output_path, output)
+        else:
+            result = CachedResult.from_file(output_path, "application/pdf")
+        result = await result_cache.put(key, result)
+    return result
+
+async def open_inputs(input_keys: List[str]) -> list:
+    """Open storage objects as job inputs; on failure the ones already opened are released"""
+    store = get_object_store()
+    inputs = []
+    try:
+        for key in input_keys:
+            inputs.append(await store.open_input(key))
+    except BaseException:
+        for stored in inputs:
+            stored.cleanup()
+        raise
+    return inputs
+
+@router.post("/merge", status_code=202)
+async def submit_merge(request: Request, files: Optional[List[UploadFile]] = File(None), pages_data: str = Form(...),
+                       input_keys: Optional[List[str]] = Form(None)):
+    """
+    Queue a merge; same instructions as POST /merge but returns a job id immediately.
+    Files uploaded to /storage can be passed as input_keys instead of files; pages_data
+    then names them by key in sourceFile.
+    """
+    files, input_keys = files or [], input_keys or []
+    if not files and not input_keys:
+        raise HTTPException(status_code=400, detail="Either files or input_keys are required.")
+    try:
+        plan = plan_merge(json.loads(pages_data), [file.filename for file in files] + input_keys)
+    except MergePlanError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="pages_data must be valid JSON.")
+    needed = set(referenced_sources(plan))
+    stored = await open_inputs([key for key in input_keys if key in needed])
+    try:
+        charge(request, files=len(needed), pages=len(plan), stored_bytes=sum(item.size for item in stored))
+        uploads = await spool_uploads([file for file in files if file.filename in needed])
+    except BaseException:
+        for item in stored:
+            item.cleanup()
+        raise
+    # Stored inputs are named by their key, uploads by their filename
+    names = [upload.filename for upload in uploads] + [key for key in input_keys if key in needed]
+    uploads += stored
+
+    async def work(job: Job, run) -> JobResult:
+        key = cache_key("merge", sorted((name, upload.sha256) for name, upload in zip(names, uploads)), plan)
+        file_map = {name: upload.path for name, upload in zip(names, uploads)}
+        result = await cached_or_run(job, run, key, merge_pages, (file_map, plan))
+        return JobResult(result, "merged_by_PDFkaro.in.pdf")
+
+    job = job_queue.submit("merge", uploads, work, release=hold_admission(request))
+    logger.info(f"Queued merge job {job.job_id} for {len(uploads)} files")
+    return job.to_dict()
+
+@router.post("/compress", status_code=202)
+async def submit_compress(request: Request, file: Optional[UploadFile] = File(None), level: str = Form("medium"),
+                          target_size: Optional[int] = Form(None), size_unit: str = Form("KB"),
+                          input_key: Optional[str] = Form(None)):
+    """
+    Queue a compression by level, or by target size when target_size is given.
+    Takes an upload or a file uploaded to /storage (input_key).
+    """
+    if target_size is not None:
+        target_kb = target_size * 1024 if size_unit.upper() == "MB" else target_size
+        if target_kb <= 0:
+            raise HTTPException(status_code=400, detail="target_size must be positive.")
+        fn, job_args = compress_pdf_file_to_size, (target_kb * 1024,)
+    else:
+        fn, job_args = compress_pdf_file, (COMPRESSION_LEVELS.get(level, COMPRESSION_LEVELS["medium"]),)
+    if input_key:
+        upload = (await open_inputs([input_key]))[0]
+        try:
+            charge(request, stored_bytes=upload.size)
+        except BaseException:
+            upload.cleanup()
+            raise
+    elif file is not None:
+        upload = await spool_upload(file)
+    else:
+        raise HTTPException(status_code=400, detail="Either a file or an input_key is required.")
+
+    async def work(job: Job, run) -> JobResult:
+        key = cache_key(fn.__name__, [upload.sha256], job_args)
+        result = await cached_or_run(job, run, key, fn, (upload.path, *job_args))
+        return JobResult(result, f"compressed_{upload.filename}")
+
+    job = job_queue.submit("compress", [upload], work, release=hold_admission(request))
+    logger.info(f"Queued compress job {job.job_id} for {upload.filename}")
+    return job.to_dict()
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    return job_queue.get(job_id).to_dict()
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-Sent Events stream of the job's status and progress until it finishes"""
+    job = job_queue.get(job_id)
+
+    async def events():
+        version = None
+        while True:
+            if version != job.version:
+                version = job.version
+                yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+                if job.finished:
+                    return
+            elif await request.is_disconnected():
+                return
+            elif not await job.wait_for_change(version, SSE_KEEPALIVE_SECONDS):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/{job_id}/result")
+async def download_job_result(job_id: str):
+    """
+    Download a finished job's result. With S3 storage this redirects to a presigned URL,
+    so the file never passes through the API; result_url in the job status is the same link.
+    """
+    job = job_queue.get(job_id)
+    if job.status != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}; its result is not available.")
+    store = get_object_store()
+    path = store.local_path(job.result_key)
+    if path is None:
+        return RedirectResponse(store.download_url(job.result_key, job.filename), status_code=307)
+    return FileResponse(path, media_type=job.media_type, filename=job.filename, headers=job.headers)
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job, or delete a finished job and its result"""
+    job = job_queue.cancel(job_id)
+    return {"job_id": job.job_id, "status": job.status if job.finished else "cancelling"}
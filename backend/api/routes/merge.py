@@ -1,48 +1,110 @@
-import io
 import json
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from fastapi.responses import StreamingResponse
-import pikepdf
-from typing import List
+import os
+from contextlib import AsyncExitStack
+from fastapi import APIRouter, File, UploadFile, Form, Header, HTTPException, Request
+from typing import List, Optional
 import logging
 
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.admission import charge
+from app.services.dedup import deduplicate
+from app.services.document_sessions import document_sessions
+from app.services.jobs import ProgressReporter
+from app.services.merge_planner import MergePlanError, execute_merge_plan, plan_merge, referenced_sources, source_name
+from app.services.metrics import observe_document, span
+from app.services.pdf_processor import pdf_processor_service
+from app.services.result_cache import CachedResult, cache_key, not_modified, result_cache, result_response
+from app.services.uploads import output_file, spooled_uploads
+
+pikepdf = lazy_import("pikepdf")
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def merge_pages(file_map: dict, plan: list, output, progress_path: Optional[str] = None) -> int:
+    """
+    Runs in a worker process: builds the merged PDF from a validated merge plan,
+    writes it to output (a path or a binary stream) and returns its size
+    """
+    progress = ProgressReporter(progress_path)
+    progress.update(force=True, pages_processed=0, pages_total=len(plan))
+    merged_pdf = execute_merge_plan(file_map, plan, on_page=lambda done: progress.update(pages_processed=done))
+
+    if settings.PDF_DEDUPLICATE:
+        # Merging exports of the same tool repeats its fonts, logos and ICC profiles in every source
+        progress.update(force=True, stage="dedup")
+        stats = deduplicate(merged_pdf)
+        logger.info(f"Merge dedup: {stats}")
+
+    progress.update(force=True, stage="saving")
+    with span("pdf_save"):
+        merged_pdf.save(output)
+    merged_pdf.close()
+
+    return os.path.getsize(output) if isinstance(output, str) else output.tell()
+
 @router.post("/")
-async def merge_pdfs(files: List[UploadFile] = File(...), pages_data: str = Form(...)):
+async def merge_pdfs(request: Request, files: Optional[List[UploadFile]] = File(None), pages_data: str = Form(...),
+                     if_none_match: Optional[str] = Header(None)):
+    """
+    Merge pages from uploaded files and/or documents opened earlier via /documents.
+    Each instruction names its source with either "sourceFile" (an uploaded
+    filename) or "documentId". Instructions are validated before any PDF is
+    opened, and uploads no instruction refers to are never read.
+    """
+    files = files or []
     logger.info(f"Received {len(files)} files for merging.")
     try:
-        page_instructions = json.loads(pages_data)
-        file_map = {file.filename: await file.read() for file in files}
-        open_pdfs = {filename: pikepdf.Pdf.open(io.BytesIO(data)) for filename, data in file_map.items()}
-        
-        merged_pdf = pikepdf.Pdf.new()
-        for instruction in page_instructions:
-            source_filename = instruction['sourceFile']
-            page_index = instruction['pageIndex']
-            rotation = instruction.get('rotation', 0)
-            
-            if source_filename in open_pdfs:
-                source_pdf = open_pdfs[source_filename]
-                page = source_pdf.pages[page_index]
-                if rotation != 0:
-                    page.rotate(rotation, relative=True)
-                merged_pdf.pages.append(page)
-
-        for pdf in open_pdfs.values():
-            pdf.close()
-            
-        output_buffer = io.BytesIO()
-        merged_pdf.save(output_buffer)
-        output_buffer.seek(0)
-        
+        try:
+            page_instructions = json.loads(pages_data)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="pages_data must be valid JSON.")
+        document_names = {
+            source_name(instruction) for instruction in page_instructions
+            if isinstance(instruction, dict) and 'documentId' in instruction
+        } if isinstance(page_instructions, list) else set()
+        try:
+            plan = plan_merge(page_instructions, {file.filename for file in files} | document_names)
+        except MergePlanError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        needed = set(referenced_sources(plan))
+        charge(request, files=len(needed), pages=len(plan))
+
+        async with AsyncExitStack() as stack:
+            # Documents are looked up first, so an expired one is reported before any upload is read
+            sources = {}
+            for name in sorted(document_names):
+                session = await stack.enter_async_context(document_sessions.use(name.split(":", 1)[1]))
+                sources[name] = session
+            uploads = await stack.enter_async_context(
+                spooled_uploads([file for file in files if file.filename in needed])
+            )
+            sources.update((upload.filename, upload) for upload in uploads)
+
+            # The plan refers to sources by name, so the name is part of the key
+            key = cache_key("merge", sorted((name, source.sha256) for name, source in sources.items()), plan)
+            response = not_modified(key, if_none_match)
+            if response is not None:
+                return response
+            result = await result_cache.get(key)
+            if result is None:
+                file_map = {name: source.path for name, source in sources.items()}
+                try:
+                    with output_file() as output_path:
+                        merged_size = await pdf_processor_service.run(merge_pages, file_map, plan, output_path)
+                except MergePlanError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+                observe_document("merge", sum(source.size for source in sources.values()), merged_size, len(plan))
+                result = await result_cache.put(key, CachedResult.from_file(output_path, "application/pdf"))
+
         branded_filename = "merged_by_PDFkaro.in.pdf"
-        return StreamingResponse(
-            output_buffer,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={branded_filename}"}
-        )
+        return result_response(key, result, branded_filename)
+    except HTTPException:
+        raise
+    except pikepdf.PdfError as e:
+        logger.warning(f"Rejected merge input: {e}")
+        raise HTTPException(status_code=400, detail="One of the files is not a valid PDF.")
     except Exception as e:
         logger.error(f"Error during merging: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error during PDF merging process.")
@@ -1,99 +1,244 @@
-import io
-import zipfile
+import asyncio
 import os
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-import docx
-from pydantic import BaseModel
-from typing import List, Dict
+import tempfile
+import zipfile
+from fastapi import APIRouter, HTTPException, Request
+from typing import Dict, Iterable, Iterator, List
 import logging
 
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.docx_writer import docx_bytes, docx_chunks
+from app.services.result_cache import ReleasingStreamingResponse
+from app.services.uploads import max_upload_bytes, remove_file
+from app.services.zip_stream import stream_zip
+
+ijson = lazy_import("ijson")
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-class FileData(BaseModel):
-    path: str
-    content: str
+# Text is sent to the client in pieces of about this size
+OUTPUT_CHUNK_SIZE = 64 * 1024
+SEPARATOR = "=" * 50
+
+# The body is parsed as a stream, so the route takes the raw request; this keeps the schema in the docs
+REQUEST_BODY = {
+    "required": True,
+    "content": {"application/json": {"schema": {
+        "type": "object",
+        "required": ["files"],
+        "properties": {
+            "files": {"type": "array", "items": {
+                "type": "object",
+                "required": ["path", "content"],
+                "properties": {"path": {"type": "string"}, "content": {"type": "string"}},
+            }},
+            "output_format": {"type": "string", "default": "txt", "enum": ["txt", "docx"]},
+            "include_paths": {"type": "boolean", "default": True},
+            "align_structure": {"type": "boolean", "default": False},
+        },
+    }}},
+}
+
+class SpooledFile:
+    """One exported file; its content lives in the request's spool file, not in memory"""
+
+    def __init__(self, path: str, offset: int, length: int):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+class ExportRequest:
+    """
+    The parsed request body. File contents are written to a temp file as they
+    are parsed, so only the paths are held in memory.
+    """
+
+    def __init__(self, spool_path: str):
+        self.spool_path = spool_path
+        self.files: List[SpooledFile] = []
+        self.output_format = "txt"
+        self.include_paths = True
+        self.align_structure = False
+
+    def read(self, file: SpooledFile) -> str:
+        with open(self.spool_path, "rb") as spool:
+            spool.seek(file.offset)
+            return spool.read(file.length).decode("utf-8")
+
+    def cleanup(self) -> None:
+        remove_file(self.spool_path)
+
+class _BodyReader:
+    """Async file-like view of the request body for ijson, with the upload size limit"""
 
-class ProcessRequest(BaseModel):
-    files: List[FileData]
-    output_format: str = "txt"
-    include_paths: bool = True
-    align_structure: bool = False
+    def __init__(self, request: Request):
+        self._chunks = request.stream()
+        self._size = 0
+        self._limit = max_upload_bytes()
 
-def create_tree_structure(files: List[FileData]):
-    structure = {}
-    for file in files:
-        parts = file.path.split('/')
+    async def read(self, size: int = -1) -> bytes:
+        # ijson calls read(0) first to tell bytes from text
+        if size == 0:
+            return b""
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+        self._size += len(chunk)
+        if self._size > self._limit:
+            raise HTTPException(
+                status_code=413, detail=f"The request is larger than the {settings.MAX_UPLOAD_SIZE_MB} MB upload limit."
+            )
+        return chunk
+
+async def parse_export_request(request: Request) -> ExportRequest:
+    """Streams the JSON body: options are kept, file contents go straight to the spool file"""
+    fd, spool_path = tempfile.mkstemp(suffix=".json", prefix="export_", dir=settings.UPLOAD_SPOOL_DIR)
+    export = ExportRequest(spool_path)
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            item: Dict = {}
+            has_files = False
+            async for prefix, event, value in ijson.parse_async(_BodyReader(request)):
+                if prefix == "files" and event == "start_array":
+                    has_files = True
+                elif prefix == "files.item" and event == "start_map":
+                    item = {}
+                elif prefix == "files.item.path" and event == "string":
+                    item["path"] = value
+                elif prefix == "files.item.content" and event == "string":
+                    data = value.encode("utf-8")
+                    item["content"] = (spool.tell(), len(data))
+                    spool.write(data)
+                elif prefix == "files.item" and event == "end_map":
+                    if "path" not in item or "content" not in item:
+                        raise HTTPException(status_code=422, detail="Every file needs a string path and content.")
+                    export.files.append(SpooledFile(item["path"], *item["content"]))
+                elif prefix == "output_format" and event == "string":
+                    export.output_format = value
+                elif prefix in ("include_paths", "align_structure") and event == "boolean":
+                    setattr(export, prefix, value)
+        if not has_files:
+            raise HTTPException(status_code=422, detail="The request body needs a files list.")
+    except ijson.JSONError:
+        export.cleanup()
+        raise HTTPException(status_code=422, detail="The request body is not valid JSON.")
+    except BaseException:
+        export.cleanup()
+        raise
+    return export
+
+def create_tree_structure(paths: Iterable[str]) -> Dict:
+    structure: Dict = {}
+    for path in paths:
+        parts = path.split('/')
         current_level = structure
         for part in parts[:-1]:
-            if part not in current_level: current_level[part] = {}
+            if not isinstance(current_level.get(part), dict): current_level[part] = {}
             current_level = current_level[part]
-        current_level[parts[-1]] = None
+        current_level.setdefault(parts[-1], None)
     return structure
 
-def generate_aligned_output(structure: Dict, path_prefix="", is_last=True):
-    output = ""
-    items = list(structure.items())
-    for i, (name, content) in enumerate(items):
-        is_current_last = (i == len(items) - 1)
+def generate_aligned_output(structure: Dict) -> Iterator[str]:
+    """Yields the tree one line at a time, entries sorted by name at every level"""
+    # Each level's entries are kept reversed so the next one is a cheap pop() from the end
+    stack = [("", sorted(structure.items(), reverse=True))]
+    while stack:
+        path_prefix, items = stack[-1]
+        if not items:
+            stack.pop()
+            continue
+        name, content = items.pop()
+        is_current_last = not items
         connector = "└── " if is_current_last else "├── "
-        output += f"{path_prefix}{connector}{name}\n"
+        yield f"{path_prefix}{connector}{name}\n"
         if isinstance(content, dict):
-            new_prefix = path_prefix + ("    " if is_current_last else "│   ")
-            output += generate_aligned_output(content, new_prefix, is_current_last)
-    return output
+            stack.append((path_prefix + ("    " if is_current_last else "│   "), sorted(content.items(), reverse=True)))
 
-@router.post("/single")
-async def process_structure(request: ProcessRequest):
-    try:
-        final_content = ""
-        if request.align_structure:
-            file_structure = create_tree_structure(request.files)
-            final_content += "Project Structure:\n" + generate_aligned_output(file_structure) + "\n" + ("=" * 50) + "\n\n"
-        for file_data in request.files:
-            if request.include_paths:
-                final_content += f"--- File: {file_data.path} ---\n\n"
-            final_content += file_data.content + "\n\n"
-        if request.output_format == "docx":
-            doc = docx.Document()
-            doc.add_paragraph(final_content)
-            buffer = io.BytesIO()
-            doc.save(buffer)
-            buffer.seek(0)
-            media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            filename = "project_export_by_PDFkaro.in.docx"
-        else:
-            buffer = io.BytesIO(final_content.encode('utf-8'))
-            media_type = "text/plain"
-            filename = "project_export_by_PDFkaro.in.txt"
-        return StreamingResponse(buffer, media_type=media_type, headers={"Content-Disposition": f"attachment; filename={filename}"})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Error creating single file export.")
+def export_text(export: ExportRequest) -> Iterator[str]:
+    """Yields the single-file export as text pieces"""
+    if export.align_structure:
+        yield "Project Structure:\n"
+        yield from generate_aligned_output(create_tree_structure(file.path for file in export.files))
+        yield "\n" + SEPARATOR + "\n\n"
+    for file in export.files:
+        if export.include_paths:
+            yield f"--- File: {file.path} ---\n\n"
+        yield export.read(file)
+        yield "\n\n"
+
+def encode_chunks(pieces: Iterable[str]) -> Iterator[bytes]:
+    """Joins small text pieces into UTF-8 chunks of about OUTPUT_CHUNK_SIZE"""
+    batch: List[str] = []
+    size = 0
+    for piece in pieces:
+        batch.append(piece)
+        size += len(piece)
+        if size >= OUTPUT_CHUNK_SIZE:
+            yield "".join(batch).encode("utf-8")
+            batch, size = [], 0
+    if batch:
+        yield "".join(batch).encode("utf-8")
 
-@router.post("/zip")
-async def export_zip_structure(request: ProcessRequest):
+async def iterate_in_thread(iterator: Iterator[bytes]):
+    """Runs a blocking iterator (file reads) off the event loop"""
+    sentinel = object()
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, sentinel)
+        if chunk is sentinel:
+            return
+        yield chunk
+
+async def log_errors(chunks):
+    """Streams the chunks; errors mid-stream are logged since the response has already started"""
     try:
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            if request.align_structure:
-                summary_content = "Project Structure:\n" + generate_aligned_output(create_tree_structure(request.files))
-                zip_file.writestr("00_project_structure.txt", summary_content)
-            for file_data in request.files:
-                file_content = f"--- File: {file_data.path} ---\n\n" + file_data.content if request.include_paths else file_data.content
-                if request.output_format == "docx":
-                    doc = docx.Document()
-                    doc.add_paragraph(file_content)
-                    file_buffer = io.BytesIO()
-                    doc.save(file_buffer)
-                    file_buffer.seek(0)
-                    base_name = os.path.splitext(file_data.path)[0]
-                    file_name_in_zip = f"{base_name}.docx"
-                    zip_file.writestr(file_name_in_zip, file_buffer.getvalue())
-                else:
-                    file_name_in_zip = f"{file_data.path}.txt" if not file_data.path.endswith('.txt') else file_data.path
-                    zip_file.writestr(file_name_in_zip, file_content.encode('utf-8'))
-        zip_buffer.seek(0)
-        return StreamingResponse(zip_buffer, media_type="application/zip", headers={"Content-Disposition": "attachment; filename=project_export_by_PDFkaro.in.zip"})
+        async for chunk in chunks:
+            yield chunk
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Error creating zip export.")
+        logger.error(f"Error streaming export: {e}", exc_info=True)
+        raise
+
+@router.post("/single", openapi_extra={"requestBody": REQUEST_BODY})
+async def process_structure(request: Request):
+    export = await parse_export_request(request)
+    if export.output_format == "docx":
+        return ReleasingStreamingResponse(
+            log_errors(iterate_in_thread(docx_chunks(export_text(export)))), export.cleanup,
+            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            headers={"Content-Disposition": "attachment; filename=project_export_by_PDFkaro.in.docx"},
+        )
+    return ReleasingStreamingResponse(
+        log_errors(iterate_in_thread(encode_chunks(export_text(export)))), export.cleanup, media_type="text/plain",
+        headers={"Content-Disposition": "attachment; filename=project_export_by_PDFkaro.in.txt"},
+    )
+
+def zip_member(export: ExportRequest, file: SpooledFile) -> tuple:
+    file_content = export.read(file)
+    if export.include_paths:
+        file_content = f"--- File: {file.path} ---\n\n" + file_content
+    file_name_in_zip = f"{file.path}.txt" if not file.path.endswith('.txt') else file.path
+    return file_name_in_zip, file_content.encode('utf-8')
+
+def docx_member(export: ExportRequest, file: SpooledFile) -> tuple:
+    heading = [f"--- File: {file.path} ---\n\n"] if export.include_paths else []
+    return f"{os.path.splitext(file.path)[0]}.docx", docx_bytes([*heading, export.read(file)])
+
+async def zip_members(export: ExportRequest):
+    """Yields (name, data) ZIP members one file at a time"""
+    if export.align_structure:
+        tree = create_tree_structure(file.path for file in export.files)
+        yield "00_project_structure.txt", "".join(["Project Structure:\n", *generate_aligned_output(tree)]).encode("utf-8")
+    member = docx_member if export.output_format == "docx" else zip_member
+    for file in export.files:
+        yield await asyncio.to_thread(member, export, file)
+
+@router.post("/zip", openapi_extra={"requestBody": REQUEST_BODY})
+async def export_zip_structure(request: Request):
+    export = await parse_export_request(request)
+    return ReleasingStreamingResponse(
+        log_errors(stream_zip(zip_members(export), zipfile.ZIP_DEFLATED)), export.cleanup,
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=project_export_by_PDFkaro.in.zip"},
+    )
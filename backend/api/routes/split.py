@@ -1,71 +1,189 @@
-import io
+from __future__ import annotations
+
 import json
+import os
 import zipfile
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from fastapi.responses import StreamingResponse
-import pikepdf
+from fastapi import APIRouter, File, UploadFile, Form, Header, HTTPException, Request
+from typing import Optional
 import logging
 
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.admission import charge
+from app.services.document_sessions import document_sessions, pdf_source
+from app.services.metrics import observe_document, span
+from app.services.pdf_processor import append_page, pdf_processor_service
+from app.services.result_cache import (CachedResult, ReleasingStreamingResponse, cache_key, not_modified,
+                                       result_cache, result_response)
+from app.services.split_engine import DuplicationReport, batch_chunks, plan_split, split_chunks
+from app.services.storage import get_object_store
+from app.services.uploads import open_spooled_pdf, output_file, spool_upload
+from app.services.zip_stream import stream_zip
+
+pikepdf = lazy_import("pikepdf")
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def extract_pages(pdf_path: str, page_instructions: list, output_path: str) -> int:
+    """Runs in a worker process: writes one PDF of the selected pages to output_path; returns its size"""
+    with open_spooled_pdf(pdf_path) as source_pdf:
+        new_pdf = pikepdf.Pdf.new()
+        with span("page_copy"):
+            for instruction in page_instructions:
+                # Yahan correction - instruction se pageIndex extract karo
+                index = instruction['pageIndex'] if isinstance(instruction, dict) and 'pageIndex' in instruction else instruction
+                rotation = instruction.get('rotation', 0) if isinstance(instruction, dict) else 0
+
+                if 0 <= index < len(source_pdf.pages):
+                    append_page(new_pdf, source_pdf.pages[index], rotation)
+        with span("pdf_save"):
+            new_pdf.save(output_path)
+    return os.path.getsize(output_path)
+
+async def split_all_pages(pdf_path: str, chunks: Optional[list] = None,
+                          strip_unused: bool = False, include_report: bool = False):
+    """
+    Yields (name, data) ZIP members in order while later chunks are still being split.
+    Chunks are batched into worker jobs of about SPLIT_PAGES_PER_JOB pages each.
+    """
+    if chunks is None:
+        chunks = await pdf_processor_service.run(plan_split, pdf_path)
+    report = DuplicationReport()
+    batches = batch_chunks(chunks, settings.SPLIT_PAGES_PER_JOB)
+    jobs = ((pdf_path, batch, strip_unused, include_report) for batch in batches)
+    results = pdf_processor_service.run_ordered(split_chunks, jobs)
+    try:
+        async for batch, outputs in zip_async(batches, results):
+            for chunk, (data, resources) in zip(batch, outputs):
+                report.add(chunk, data, resources)
+                yield chunk[0], data
+    finally:
+        await results.aclose()
+    input_bytes = os.path.getsize(pdf_path)
+    observe_document("split_all", input_bytes, report.output_bytes, report.pages)
+    if include_report:
+        yield "split_report.json", json.dumps(report.to_dict(input_bytes, strip_unused), indent=2).encode("utf-8")
+
+async def zip_async(items: list, results):
+    """Pairs each item with the async result produced for it"""
+    for item in items:
+        yield item, await results.__anext__()
+
+def extract_page(pdf_path: str, page_number: int, output_path: str) -> bool:
+    """Runs in a worker process: writes the single-page PDF, or returns False for an invalid page number"""
+    with open_spooled_pdf(pdf_path) as source_pdf:
+        if not 0 <= page_number < len(source_pdf.pages):
+            return False
+        new_pdf = pikepdf.Pdf.new()
+        new_pdf.pages.append(source_pdf.pages[page_number])
+        with span("pdf_save"):
+            new_pdf.save(output_path)
+    return True
+
 @router.post("/")
-async def split_pdf(file: UploadFile = File(...), pages_to_extract: str = Form(...)):
+async def split_pdf(request: Request, file: Optional[UploadFile] = File(None), pages_to_extract: str = Form(...),
+                    document_id: Optional[str] = Form(None), input_key: Optional[str] = Form(None),
+                    pages_per_file: int = Form(1), split_by: str = Form("pages"),
+                    strip_unused: bool = Form(False), include_report: bool = Form(False),
+                    if_none_match: Optional[str] = Header(None)):
+    """
+    Split an uploaded PDF, a document opened earlier via /documents (document_id), or
+    a file uploaded to /storage (input_key).
+
+    Without page instructions the whole document is split into a ZIP: one file per
+    pages_per_file pages, or one file per top-level bookmark with split_by=bookmarks.
+    strip_unused drops fonts/images a page does not use from its output file, and
+    include_report adds split_report.json with the size of duplicated shared resources.
+    """
     try:
         page_instructions = json.loads(pages_to_extract)
         logger.info(f"Page instructions for split: {page_instructions}")
-        pdf_bytes = await file.read()
-        source_pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes))
-        output_buffer = io.BytesIO()
 
         if page_instructions and isinstance(page_instructions, list) and len(page_instructions) > 0:
-            new_pdf = pikepdf.Pdf.new()
-            for instruction in page_instructions:
-                # Yahan correction - instruction se pageIndex extract karo
-                index = instruction['pageIndex'] if isinstance(instruction, dict) and 'pageIndex' in instruction else instruction
-                rotation = instruction.get('rotation', 0) if isinstance(instruction, dict) else 0
-                
-                if 0 <= index < len(source_pdf.pages):
-                    page = source_pdf.pages[index]
-                    if rotation != 0:
-                        page.rotate(rotation, relative=True)
-                    new_pdf.pages.append(page)
-            new_pdf.save(output_buffer)
+            charge(request, pages=len(page_instructions))
+            async with pdf_source(file, document_id, input_key) as source:
+                key = cache_key("extract_pages", [source.sha256], page_instructions)
+                response = not_modified(key, if_none_match)
+                if response is not None:
+                    return response
+                result = await result_cache.get(key)
+                if result is None:
+                    with output_file() as output_path:
+                        output_size = await pdf_processor_service.run(
+                            extract_pages, source.path, page_instructions, output_path
+                        )
+                    observe_document("split", source.size, output_size, len(page_instructions))
+                    result = await result_cache.put(key, CachedResult.from_file(output_path, "application/pdf"))
             filename = "extracted_pages_by_PDFkaro.in.pdf"
-            media_type = "application/pdf"
+            return result_response(key, result, filename)
+
+        # Split every page: ZIP members are streamed as soon as each page range is ready
+        if split_by not in ("pages", "bookmarks"):
+            raise HTTPException(status_code=400, detail="split_by must be 'pages' or 'bookmarks'.")
+        if pages_per_file < 1:
+            raise HTTPException(status_code=400, detail="pages_per_file must be at least 1.")
+        if document_id:
+            session = document_sessions.pin(document_id)
+            pdf_path, release = session.path, lambda: document_sessions.unpin(session)
+        elif input_key:
+            stored = await get_object_store().open_input(input_key)
+            pdf_path, release = stored.path, stored.cleanup
+        elif file is not None:
+            upload = await spool_upload(file)
+            pdf_path, release = upload.path, upload.cleanup
         else:
-            with zipfile.ZipFile(output_buffer, 'w') as zf:
-                for i, page in enumerate(source_pdf.pages):
-                    dst = pikepdf.Pdf.new()
-                    dst.pages.append(page)
-                    page_buffer = io.BytesIO()
-                    dst.save(page_buffer)
-                    page_buffer.seek(0)
-                    zf.writestr(f"page_{i+1}.pdf", page_buffer.getvalue())
-            filename = "split_files_by_PDFkaro.in.zip"
-            media_type = "application/zip"
-        
-        output_buffer.seek(0)
-        return StreamingResponse(output_buffer, media_type=media_type, headers={"Content-Disposition": f"attachment; filename={filename}"})
+            raise HTTPException(status_code=400, detail="Either a file, a document_id or an input_key is required.")
+        # Plan before streaming, so an unusable plan is still a normal error response
+        try:
+            chunks = await pdf_processor_service.run(plan_split, pdf_path, pages_per_file, split_by == "bookmarks")
+        except BaseException:
+            release()
+            raise
+        if not chunks:
+            release()
+            detail = "The PDF has no bookmarks to split by." if split_by == "bookmarks" else "The PDF has no pages."
+            raise HTTPException(status_code=400, detail=detail)
+        try:
+            charge(request, pages=chunks[-1][2])
+        except HTTPException:
+            release()
+            raise
+        filename = "split_files_by_PDFkaro.in.zip"
+        return ReleasingStreamingResponse(
+            stream_zip(split_all_pages(pdf_path, chunks, strip_unused, include_report), zipfile.ZIP_STORED),
+            release,
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during splitting: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error during PDF splitting.")
 
 @router.post("/extract-single-page")
-async def extract_single_page(file: UploadFile = File(...), page_number: int = Form(...)):
+async def extract_single_page(file: Optional[UploadFile] = File(None), page_number: int = Form(...),
+                              document_id: Optional[str] = Form(None), input_key: Optional[str] = Form(None),
+                              if_none_match: Optional[str] = Header(None)):
+    """Extract one page from an uploaded PDF, a document opened via /documents, or a /storage input_key"""
     try:
-        pdf_bytes = await file.read()
-        source_pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes))
-        if 0 <= page_number < len(source_pdf.pages):
-            new_pdf = pikepdf.Pdf.new()
-            new_pdf.pages.append(source_pdf.pages[page_number])
-            output_buffer = io.BytesIO()
-            new_pdf.save(output_buffer)
-            output_buffer.seek(0)
-            filename = f"page_{page_number + 1}_by_PDFkaro.in.pdf"
-            return StreamingResponse(output_buffer, media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename={filename}"})
-        else:
-            raise HTTPException(status_code=400, detail="Invalid page number.")
+        async with pdf_source(file, document_id, input_key) as source:
+            key = cache_key("extract_page", [source.sha256], page_number)
+            response = not_modified(key, if_none_match)
+            if response is not None:
+                return response
+            result = await result_cache.get(key)
+            if result is None:
+                with output_file() as output_path:
+                    found = await pdf_processor_service.run(extract_page, source.path, page_number, output_path)
+                    if not found:
+                        raise HTTPException(status_code=400, detail="Invalid page number.")
+                result = await result_cache.put(key, CachedResult.from_file(output_path, "application/pdf"))
+        filename = f"page_{page_number + 1}_by_PDFkaro.in.pdf"
+        return result_response(key, result, filename)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error extracting single page: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error extracting single page.")
@@ -0,0 +1,106 @@
+import json
+import time
+from fastapi import APIRouter, Form, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from typing import Optional
+import logging
+
+from app.core.config import settings
+from app.services.storage import LocalObjectStore, get_object_store, new_key
+from app.services.uploads import max_upload_bytes
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# The PUT routes read the raw body as a stream; declaring it also puts them under admission control
+RAW_BODY = {"required": True, "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}}
+
+def local_store() -> LocalObjectStore:
+    """The signed PUT/GET routes below are the local stand-in for S3; with S3 the URLs point at the bucket"""
+    store = get_object_store()
+    if not isinstance(store, LocalObjectStore):
+        raise HTTPException(status_code=404, detail="Not found")
+    return store
+
+def parse_parts(parts: str) -> list:
+    """parts is a JSON list of {"part_number", "etag"} as returned by each part upload"""
+    try:
+        items = [(int(item["part_number"]), str(item["etag"])) for item in json.loads(parts)]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail='parts must be a JSON list of {"part_number", "etag"}.')
+    numbers = [number for number, _ in items]
+    if not items or numbers != sorted(set(numbers)) or numbers[0] < 1 or numbers[-1] > settings.STORAGE_MAX_PARTS:
+        raise HTTPException(status_code=400, detail="parts must list each uploaded part once, in ascending order.")
+    return items
+
+@router.post("/uploads")
+async def create_upload(filename: str = Form(...), size: Optional[int] = Form(None), parts: int = Form(1)):
+    """
+    Reserve a key for a new input file and return where to upload it: a single PUT URL,
+    or with parts > 1 a multipart upload with one PUT URL per part (S3 requires every
+    part except the last to be at least 5 MB). Each part upload returns an ETag, which
+    goes to /uploads/{upload_id}/complete. The key is then passed to processing routes
+    as input_key, so the file is uploaded once and never re-sent through the API.
+    """
+    if size is not None and size > max_upload_bytes():
+        raise HTTPException(status_code=413,
+                            detail=f"{filename} is larger than the {settings.MAX_UPLOAD_SIZE_MB} MB upload limit.")
+    if not 1 <= parts <= settings.STORAGE_MAX_PARTS:
+        raise HTTPException(status_code=400, detail=f"parts must be between 1 and {settings.STORAGE_MAX_PARTS}.")
+    store = get_object_store()
+    store.sweep()
+    key = new_key("inputs", filename)
+    expires_at = time.time() + settings.STORAGE_URL_TTL_SECONDS
+    if parts == 1:
+        return {"key": key, "expires_at": expires_at, **store.upload_target(key)}
+
+    upload_id = await store.create_multipart(key)
+    logger.info(f"Started multipart upload {upload_id} of {filename} in {parts} parts")
+    return {
+        "key": key,
+        "upload_id": upload_id,
+        "expires_at": expires_at,
+        "parts": [{"part_number": number, **store.part_target(key, upload_id, number)}
+                  for number in range(1, parts + 1)],
+    }
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, key: str = Form(...), parts: str = Form(...)):
+    """Assemble a multipart upload from its parts; the key is usable once this returns"""
+    stored = await get_object_store().complete_multipart(key, upload_id, parse_parts(parts))
+    logger.info(f"Completed multipart upload {upload_id}: {stored.size} bytes")
+    return {"key": key, "size": stored.size}
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, key: str = Query(...)):
+    """Discard an unfinished multipart upload and the parts uploaded so far"""
+    await get_object_store().abort_multipart(key, upload_id)
+    return {"upload_id": upload_id, "status": "aborted"}
+
+@router.put("/objects/{key:path}", include_in_schema=False, openapi_extra={"requestBody": RAW_BODY})
+async def put_object(key: str, request: Request, expires: int = Query(...), signature: str = Query(...)):
+    """Signed single-request upload (local storage only)"""
+    store = local_store()
+    store.verify("PUT", f"objects/{key}", expires, signature)
+    stored = await store.write(key, request.stream())
+    return Response(status_code=200, headers={"ETag": stored.etag})
+
+@router.put("/parts/{upload_id}/{part_number}", include_in_schema=False, openapi_extra={"requestBody": RAW_BODY})
+async def put_part(upload_id: str, part_number: int, request: Request,
+                   expires: int = Query(...), signature: str = Query(...)):
+    """Signed multipart part upload (local storage only)"""
+    store = local_store()
+    store.verify("PUT", f"parts/{upload_id}/{part_number}", expires, signature)
+    stored = await store.write_part(upload_id, part_number, request.stream())
+    return Response(status_code=200, headers={"ETag": stored.etag})
+
+@router.get("/objects/{key:path}", include_in_schema=False)
+async def get_object(key: str, expires: int = Query(...), signature: str = Query(...), filename: str = Query(...)):
+    """Signed download (local storage only); supports Range requests"""
+    store = local_store()
+    store.verify("GET", f"objects/{key}", expires, signature, filename)
+    path = store.local_path(key)
+    meta = store.stat(key)
+    if path is None or meta is None:
+        raise HTTPException(status_code=404, detail="Object not found or it has expired.")
+    return FileResponse(path, media_type=meta["media_type"], filename=filename)
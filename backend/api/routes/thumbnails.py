@@ -0,0 +1,180 @@
+import asyncio
+import base64
+from fastapi import APIRouter, File, UploadFile, Form, Header, HTTPException, Query, Request, Response
+from typing import Dict, List, Optional
+import logging
+
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.admission import charge
+from app.services.document_sessions import DocumentSession, document_sessions, pdf_source
+from app.services.pdf_processor import pdf_processor_service
+from app.services.result_cache import CachedResult, cache_key, etag_for, not_modified, result_cache
+from app.services.thumbnails import (THUMBNAIL_FORMATS, ThumbnailUnavailable, count_pages, page_runs,
+                                     parse_page_ranges, render_thumbnails)
+
+pikepdf = lazy_import("pikepdf")
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Non-standard status (as used by nginx) recorded when the client leaves before the thumbnails are ready
+CLIENT_CLOSED_REQUEST = 499
+
+def thumbnail_key(sha256: str, index: int, width: int, fmt: str, quality: int) -> str:
+    return cache_key("thumbnail", [sha256], {"page": index, "width": width, "format": fmt, "quality": quality})
+
+def check_thumbnail_params(width: int, fmt: str, quality: int) -> str:
+    """Validates the request and returns the normalized format name"""
+    fmt = fmt.lower()
+    if fmt not in THUMBNAIL_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'webp' or 'jpeg'.")
+    if not 16 <= width <= settings.THUMBNAIL_MAX_WIDTH:
+        raise HTTPException(status_code=400, detail=f"width must be between 16 and {settings.THUMBNAIL_MAX_WIDTH}.")
+    if not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="quality must be between 1 and 100.")
+    return "jpeg" if fmt == "jpg" else fmt
+
+async def render_pages(pdf_path: str, sha256: str, indexes: List[int], width: int,
+                       fmt: str, quality: int) -> Dict[int, CachedResult]:
+    """
+    Returns a thumbnail per page index. Cached pages are reused; the rest are
+    rendered in parallel, a run of consecutive pages per worker job.
+    """
+    results = {}
+    missing = []
+    for index in indexes:
+        result = await result_cache.get(thumbnail_key(sha256, index, width, fmt, quality))
+        if result is None:
+            missing.append(index)
+        else:
+            results[index] = result
+
+    runs = page_runs(missing, settings.THUMBNAIL_PAGES_PER_JOB)
+    media_type = THUMBNAIL_FORMATS[fmt][1]
+    jobs = ((pdf_path, first, last, width, fmt, quality) for first, last in runs)
+    outputs = pdf_processor_service.run_ordered(render_thumbnails, jobs)
+    try:
+        for first, last in runs:
+            images = await outputs.__anext__()
+            for index, (data, image_width, image_height) in zip(range(first, last + 1), images):
+                headers = {"X-Image-Width": str(image_width), "X-Image-Height": str(image_height)}
+                results[index] = await result_cache.put(
+                    thumbnail_key(sha256, index, width, fmt, quality), CachedResult(data, media_type, headers)
+                )
+    finally:
+        await outputs.aclose()
+    return results
+
+async def unless_disconnected(request: Request, awaitable):
+    """
+    Awaits awaitable while watching for the client to disconnect. If it does,
+    the work is cancelled (render jobs still queued in the pool never start)
+    and None is returned.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait([task], timeout=settings.THUMBNAIL_DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                return None
+    finally:
+        task.cancel()
+
+@router.post("/")
+async def page_thumbnails(request: Request, file: Optional[UploadFile] = File(None),
+                          document_id: Optional[str] = Form(None), input_key: Optional[str] = Form(None),
+                          pages: str = Form("1"),
+                          width: Optional[int] = Form(None), format: str = Form("webp"), quality: int = Form(75)):
+    """
+    Render page previews of an uploaded PDF, a document opened via /documents, or a
+    file uploaded to /storage (input_key).
+    pages takes 1-based page numbers and ranges ("1-4,9", "all"); the response lists
+    each thumbnail with its 0-based index (as used by merge/split) and base64 data.
+    """
+    width = width or settings.THUMBNAIL_DEFAULT_WIDTH
+    fmt = check_thumbnail_params(width, format, quality)
+    try:
+        async with pdf_source(file, document_id, input_key) as source:
+            if isinstance(source, DocumentSession):
+                page_count = len(source.pages)
+            else:
+                page_count = await pdf_processor_service.run(count_pages, source.path)
+            try:
+                indexes = parse_page_ranges(pages, page_count)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if len(indexes) > settings.THUMBNAIL_MAX_PAGES:
+                raise HTTPException(
+                    status_code=400, detail=f"At most {settings.THUMBNAIL_MAX_PAGES} pages can be rendered per request."
+                )
+            charge(request, pages=len(indexes))
+
+            results = await unless_disconnected(
+                request, render_pages(source.path, source.sha256, indexes, width, fmt, quality)
+            )
+            if results is None:
+                logger.info(f"Client disconnected; cancelled {len(indexes)} thumbnails")
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+        return {
+            "page_count": page_count,
+            "width": width,
+            "format": fmt,
+            "thumbnails": [
+                {
+                    "index": index,
+                    "page": index + 1,
+                    "width": int(results[index].headers["X-Image-Width"]),
+                    "height": int(results[index].headers["X-Image-Height"]),
+                    "media_type": results[index].media_type,
+                    "data": base64.b64encode(results[index].read()).decode("ascii"),
+                }
+                for index in indexes
+            ],
+        }
+    except HTTPException:
+        raise
+    except ThumbnailUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except pikepdf.PdfError as e:
+        logger.warning(f"Rejected thumbnail input: {e}")
+        raise HTTPException(status_code=400, detail="The uploaded file is not a valid PDF.")
+    except Exception as e:
+        logger.error(f"Error rendering thumbnails: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error rendering page thumbnails.")
+
+@router.get("/{document_id}/{page_number}")
+async def document_page_thumbnail(request: Request, document_id: str, page_number: int,
+                                  width: Optional[int] = Query(None), format: str = Query("webp"), quality: int = Query(75),
+                                  if_none_match: Optional[str] = Header(None)):
+    """One page preview of an open document as an image, usable directly as an <img> src"""
+    width = width or settings.THUMBNAIL_DEFAULT_WIDTH
+    fmt = check_thumbnail_params(width, format, quality)
+    try:
+        async with document_sessions.use(document_id) as session:
+            if not 1 <= page_number <= len(session.pages):
+                raise HTTPException(status_code=400, detail="Invalid page number.")
+            key = thumbnail_key(session.sha256, page_number - 1, width, fmt, quality)
+            response = not_modified(key, if_none_match)
+            if response is not None:
+                return response
+            results = await unless_disconnected(
+                request, render_pages(session.path, session.sha256, [page_number - 1], width, fmt, quality)
+            )
+            if results is None:
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+        result = results[page_number - 1]
+        headers = {**result.headers, "ETag": etag_for(key), "Cache-Control": "private, max-age=3600"}
+        return Response(content=result.read(), media_type=result.media_type, headers=headers)
+    except HTTPException:
+        raise
+    except ThumbnailUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error rendering thumbnail: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error rendering page thumbnail.")
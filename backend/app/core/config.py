@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     """
@@ -14,10 +14,122 @@ class Settings(BaseSettings):
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://127.0.0.1:3000"]
 
     # AWS S3 सेटिंग्स
-    AWS_ACCESS_KEY_ID: str
-    AWS_SECRET_ACCESS_KEY: str
+    # सिर्फ़ STORAGE_BACKEND = "s3" होने पर ज़रूरी हैं, इसलिए इनके बिना भी ऐप शुरू हो सकता है।
+    # credentials न दिए जाएँ तो boto3 अपने सामान्य स्रोतों (environment, IAM role) से लेता है।
+    AWS_ACCESS_KEY_ID: Optional[str] = None
+    AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_REGION: str = "ap-south-1"  # अपनी पसंद का क्षेत्र चुनें
-    S3_BUCKET_NAME: str
+    S3_BUCKET_NAME: Optional[str] = None
+    # S3-संगत सेवा (MinIO, Cloudflare R2 आदि) का endpoint; None होने पर AWS S3।
+    S3_ENDPOINT_URL: Optional[str] = None
+
+    # ऑब्जेक्ट स्टोरेज सेटिंग्स (सीधे अपलोड, key से इनपुट, जॉब के परिणाम)
+    # "local": डिस्क पर, upload/download URLs यही API देता है; "s3": S3 bucket, URLs सीधे bucket के।
+    STORAGE_BACKEND: str = "local"
+    # local स्टोर की डायरेक्टरी; None होने पर सिस्टम temp डायरेक्टरी में "pdfkaro_storage"।
+    STORAGE_LOCAL_DIR: Optional[str] = None
+    # local स्टोर के URLs पर HMAC हस्ताक्षर की कुंजी; None होने पर एक बार बनकर स्टोर की डायरेक्टरी में रखी जाती है,
+    # ताकि उसी डायरेक्टरी वाले सभी worker और restart के बाद भी URLs मान्य रहें। अलग-अलग मशीनों पर सब में एक ही कुंजी दें।
+    STORAGE_SIGNING_SECRET: Optional[str] = None
+    # upload/download URLs कितने सेकंड तक मान्य रहें।
+    STORAGE_URL_TTL_SECONDS: int = 900
+    # local स्टोर में इससे पुराने objects और अधूरे multipart अपलोड हटा दिए जाते हैं (S3 पर bucket का lifecycle नियम)।
+    STORAGE_OBJECT_TTL_SECONDS: float = 86400.0
+    # एक multipart अपलोड में अधिकतम भाग (S3 की सीमा 10000 है)।
+    STORAGE_MAX_PARTS: int = 10000
+
+    # PDF वर्कर पूल सेटिंग्स
+    # None होने पर CPU कोर की संख्या के बराबर प्रोसेस बनाए जाते हैं।
+    PDF_WORKER_POOL_SIZE: Optional[int] = None
+    # चल रहे जॉब्स के अलावा अधिकतम कितने जॉब कतार में रुक सकते हैं; इसके बाद 503 लौटाया जाता है।
+    PDF_WORKER_MAX_QUEUE: int = 16
+    # एक जॉब के लिए अधिकतम समय (सेकंड में); इसके बाद 504 लौटाया जाता है।
+    PDF_JOB_TIMEOUT_SECONDS: float = 120.0
+    # "सभी पेज अलग करें" में एक वर्कर जॉब कितने पेज बनाए।
+    SPLIT_PAGES_PER_JOB: int = 8
+    # True होने पर ऐप शुरू होते समय ही वर्कर पूल बनाकर उसमें pikepdf/PIL load कर दिए जाते हैं; ऐप तैयार होने में
+    # थोड़ा ज़्यादा समय लगता है, पर पहले PDF अनुरोध को प्रोसेस बनने और import का इंतज़ार नहीं करना पड़ता।
+    PDF_WORKER_WARMUP: bool = False
+    # हर वर्कर प्रोसेस के अंदर छवियों को एन्कोड करने वाले थ्रेड; None होने पर min(4, CPU कोर)।
+    IMAGE_COMPRESSION_THREADS: Optional[int] = None
+    # लक्ष्य आकार (target size) तक पहुँचने के लिए खोज पर अधिकतम समय (सेकंड में)।
+    TARGET_SIZE_TIME_BUDGET_SECONDS: float = 30.0
+    # लक्ष्य आकार की खोज में हर छवि कई बार एन्कोड होती है; डिकोड की गई छवियों का कैश इतने MB तक रखा जाता है।
+    TARGET_SIZE_DECODE_CACHE_MB: float = 256.0
+    # पूरी फ़ाइल दोबारा लिखने (rewrite) से अनुमानित बचत फ़ाइल के इतने प्रतिशत से कम हो और कोई छवि न बदली हो,
+    # तो compress यह चरण छोड़कर मूल फ़ाइल लौटाता है।
+    COMPRESS_MIN_REWRITE_SAVINGS_PERCENT: float = 2.0
+    # merge और compress में एक जैसे streams (fonts, logos, ICC profiles) को एक ही ऑब्जेक्ट में मिलाया जाए।
+    PDF_DEDUPLICATE: bool = True
+    # PDF विश्लेषण में rewrite की बचत का अनुमान streams के इतने नमूने (MB में) को दोबारा compress करके लगाया जाता है।
+    ANALYZER_SAMPLE_MB: float = 0.25
+
+    # अपलोड सेटिंग्स
+    # हर फ़ाइल के लिए अधिकतम आकार (MB में); अपलोड डिस्क पर लिखते समय ही जाँचा जाता है।
+    MAX_UPLOAD_SIZE_MB: int = 200
+    # अपलोड को कितने बड़े टुकड़ों में डिस्क पर लिखा जाए (बाइट्स में)।
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    # अस्थायी फ़ाइलों की डायरेक्टरी; None होने पर सिस्टम की डिफ़ॉल्ट temp डायरेक्टरी।
+    UPLOAD_SPOOL_DIR: Optional[str] = None
+
+    # परिणाम कैश सेटिंग्स
+    # मेमोरी में रखे परिणामों की कुल सीमा (MB में)।
+    RESULT_CACHE_MEMORY_MB: int = 128
+    # इससे बड़े परिणाम मेमोरी में नहीं रखे जाते; वे डिस्क की फ़ाइल से सीधे भेजे जाते हैं (MB में)।
+    RESULT_CACHE_MEMORY_ITEM_MB: int = 8
+    # डिस्क कैश की डायरेक्टरी; None होने पर डिस्क कैश बंद रहता है।
+    RESULT_CACHE_DIR: Optional[str] = None
+    # डिस्क कैश की कुल सीमा (MB में)।
+    RESULT_CACHE_DISK_MB: int = 1024
+
+    # दस्तावेज़ सत्र (upload-once) सेटिंग्स
+    # एक साथ खुले रखे जाने वाले अधिकतम दस्तावेज़।
+    DOCUMENT_SESSION_MAX: int = 32
+    # इतने सेकंड तक इस्तेमाल न होने पर दस्तावेज़ हटा दिया जाता है।
+    DOCUMENT_SESSION_TTL_SECONDS: float = 900.0
+
+    # जॉब कतार (async jobs) सेटिंग्स
+    # एक साथ चलने वाले अधिकतम जॉब; बाक़ी कतार में रुकते हैं।
+    JOB_MAX_CONCURRENCY: int = 2
+    # अधूरे (कतार में या चल रहे) जॉब्स की अधिकतम संख्या; इसके बाद 503 लौटाया जाता है।
+    JOB_MAX_PENDING: int = 64
+    # पूरा होने के बाद परिणाम कितने सेकंड तक डाउनलोड के लिए रखा जाए।
+    JOB_RESULT_TTL_SECONDS: float = 3600.0
+    # परिणामों की डायरेक्टरी; None होने पर सिस्टम temp डायरेक्टरी में "pdfkaro_jobs"।
+    JOB_RESULT_DIR: Optional[str] = None
+    # वर्कर की प्रगति कितने अंतराल (सेकंड) पर पढ़ी जाए।
+    JOB_PROGRESS_INTERVAL_SECONDS: float = 0.5
+
+    # पेज थंबनेल सेटिंग्स
+    # width न दी जाए तो थंबनेल की चौड़ाई (pixels में), और अधिकतम अनुमत चौड़ाई।
+    THUMBNAIL_DEFAULT_WIDTH: int = 200
+    THUMBNAIL_MAX_WIDTH: int = 1024
+    # एक अनुरोध में अधिकतम कितने पेजों के थंबनेल माँगे जा सकते हैं।
+    THUMBNAIL_MAX_PAGES: int = 50
+    # एक वर्कर जॉब कितने लगातार पेज render करे; छोटा मान = ज़्यादा समानांतर काम और जल्दी रद्द होना।
+    THUMBNAIL_PAGES_PER_JOB: int = 4
+    # render के दौरान क्लाइंट के चले जाने की जाँच कितने अंतराल (सेकंड) पर हो।
+    THUMBNAIL_DISCONNECT_POLL_SECONDS: float = 0.25
+
+    # प्रवेश नियंत्रण (admission control) सेटिंग्स
+    # "लागत" इकाइयों में: हर अनुरोध का आधार + हर MB + हर फ़ाइल + हर पेज।
+    ADMISSION_ENABLED: bool = True
+    # एक साथ चल रहे सभी अनुरोधों की कुल लागत की सीमा; इसके बाद 503 लौटाया जाता है।
+    ADMISSION_MAX_INFLIGHT_COST: float = 600.0
+    # हर क्लाइंट (IP) के token bucket की क्षमता, यानी एक बार में ख़र्च की जा सकने वाली लागत।
+    ADMISSION_CLIENT_BURST: float = 400.0
+    # हर क्लाइंट का bucket प्रति सेकंड इतनी लागत से भरता है; ख़ाली होने पर 429 लौटाया जाता है।
+    ADMISSION_CLIENT_RATE: float = 4.0
+    ADMISSION_COST_PER_REQUEST: float = 1.0
+    ADMISSION_COST_PER_MB: float = 1.0
+    ADMISSION_COST_PER_FILE: float = 2.0
+    ADMISSION_COST_PER_PAGE: float = 0.1
+    # Content-Length न होने पर (chunked अपलोड) अनुरोध का अनुमानित आकार (MB में)।
+    ADMISSION_UNKNOWN_LENGTH_MB: float = 50.0
+    # याद रखे जाने वाले अधिकतम क्लाइंट buckets; सबसे पहले वे हटते हैं जिनका सबसे लंबे समय से इस्तेमाल नहीं हुआ।
+    ADMISSION_MAX_CLIENTS: int = 10000
+    # True होने पर क्लाइंट का IP X-Forwarded-For के पहले पते से लिया जाता है (सिर्फ़ भरोसेमंद proxy के पीछे)।
+    ADMISSION_TRUST_FORWARDED_FOR: bool = False
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,42 @@
+import importlib
+import threading
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    """
+    भारी मॉड्यूल (pikepdf, PIL) का स्थानापन्न: असली import उसके किसी attribute के पहले उपयोग पर होता है,
+    इसलिए ऐप जल्दी शुरू होता है और जो router कभी PDF नहीं छूता, वह इनका ख़र्च नहीं उठाता।
+    load होने के बाद असली मॉड्यूल के attributes यहीं कॉपी हो जाते हैं और यह सामान्य मॉड्यूल बन जाता है,
+    इसलिए hot loops में `pikepdf.Stream` जैसी पहुँच उतनी ही तेज़ रहती है जितनी सीधे import करने पर।
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> ModuleType:
+        # वर्कर प्रोसेस के threads एक साथ पहली पहुँच करें तो भी import एक ही बार हो
+        with self.__dict__["_lazy_lock"]:
+            module = self.__dict__["_lazy_module"]
+            if module is None:
+                module = importlib.import_module(self.__name__)
+                for attr, value in module.__dict__.items():
+                    self.__dict__.setdefault(attr, value)
+                self.__dict__["_lazy_module"] = module
+                # __getattr__ वाली subclass पर हर पहुँच धीमे रास्ते से जाती है
+                self.__class__ = ModuleType
+            return module
+
+    def __getattr__(self, attr: str):
+        # दूसरे thread ने इसी बीच class बदल दी हो तो self._load मौजूद नहीं रहता
+        return getattr(LazyModule._load(self), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self.__name__!r} (not loaded)>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """`import name` जैसा, पर मॉड्यूल पहली ज़रूरत पर ही load होता है।"""
+    return LazyModule(name)
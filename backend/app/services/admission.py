@@ -0,0 +1,285 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException, Request
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.services.metrics import registry
+
+# वैश्विक सीमा भरी होने पर क्लाइंट को कितने सेकंड बाद कोशिश करने को कहा जाए
+INFLIGHT_RETRY_AFTER_SECONDS = 5
+
+_MB = 1024 * 1024
+
+
+def estimate_cost(content_length: Optional[int], files: int = 1, pages: int = 0) -> float:
+    """
+    अनुरोध की अनुमानित लागत। body पढ़ने से पहले सिर्फ़ `Content-Length` पता होता है, इसलिए शुरुआती
+    अनुमान एक फ़ाइल और शून्य पेज मानता है; route फ़ाइलें और पेज गिनकर `charge()` से अनुमान बढ़ाते हैं।
+    """
+    size_mb = settings.ADMISSION_UNKNOWN_LENGTH_MB if content_length is None else content_length / _MB
+    return (
+        settings.ADMISSION_COST_PER_REQUEST
+        + size_mb * settings.ADMISSION_COST_PER_MB
+        + files * settings.ADMISSION_COST_PER_FILE
+        + pages * settings.ADMISSION_COST_PER_PAGE
+    )
+
+
+class AdmissionBackend(ABC):
+    """
+    प्रवेश नियंत्रण की स्थिति रखने का इंटरफ़ेस: हर क्लाइंट का token bucket और चल रहे अनुरोधों की कुल लागत।
+    कई सर्वर प्रोसेस के बीच साझा सीमा चाहिए हो (जैसे Redis पर), तो इसी को लागू करके `AdmissionController` को दें।
+    """
+
+    @abstractmethod
+    def take_tokens(self, client: str, cost: float, capacity: float, rate: float) -> float:
+        """
+        क्लाइंट के bucket से `cost` निकालता है और 0 लौटाता है; पर्याप्त tokens न हों तो कुछ नहीं निकालता
+        और बताता है कि कितने सेकंड बाद कोशिश करें।
+        """
+
+    @abstractmethod
+    def acquire(self, cost: float, limit: float, held: float = 0.0) -> bool:
+        """
+        चल रहे अनुरोधों की कुल लागत में `cost` जोड़ता है, अगर इससे `limit` पार न हो। `held` उसी अनुरोध की
+        पहले से गिनी हुई लागत है; उसके सिवा कुछ न चल रहा हो तो सीमा से बड़ी लागत भी स्वीकार होती है।
+        """
+
+    @abstractmethod
+    def release(self, cost: float) -> None:
+        """स्वीकार किए गए अनुरोध के ख़त्म होने पर उसकी लागत कुल में से घटाता है।"""
+
+    @abstractmethod
+    def inflight(self) -> float:
+        """अभी चल रहे अनुरोधों की कुल लागत।"""
+
+
+class InMemoryAdmissionBackend(AdmissionBackend):
+    """इसी प्रोसेस की मेमोरी में स्थिति रखता है; हर uvicorn worker की अपनी अलग सीमा होती है।"""
+
+    def __init__(self, max_clients: Optional[int] = None):
+        self.max_clients = max_clients or settings.ADMISSION_MAX_CLIENTS
+        # client -> [tokens, आख़िरी बार भरने का समय]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._inflight = 0.0
+        self._lock = threading.Lock()
+
+    def take_tokens(self, client: str, cost: float, capacity: float, rate: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [capacity, now]
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            # bucket से बड़ा अनुरोध पूरा भरा bucket माँगता है, वरना वह कभी स्वीकार ही न हो
+            needed = min(cost, capacity)
+            if bucket[0] >= needed:
+                bucket[0] -= needed
+                return 0.0
+            return (needed - bucket[0]) / rate if rate > 0 else float(INFLIGHT_RETRY_AFTER_SECONDS)
+
+    def acquire(self, cost: float, limit: float, held: float = 0.0) -> bool:
+        with self._lock:
+            # कुछ और न चल रहा हो तो सीमा से बड़ा अनुरोध भी स्वीकार होता है, वरना वह कभी नहीं चल पाता
+            if self._inflight - held > 0 and self._inflight + cost > limit:
+                return False
+            self._inflight += cost
+            return True
+
+    def release(self, cost: float) -> None:
+        with self._lock:
+            self._inflight = max(0.0, self._inflight - cost)
+
+    def inflight(self) -> float:
+        return self._inflight
+
+
+class AdmissionTicket:
+    """
+    एक स्वीकार किए गए अनुरोध की लागत; अनुरोध ख़त्म होने पर इतनी ही लागत वापस की जाती है। `held` होने पर
+    लागत जवाब के बाद भी गिनी जाती है और पृष्ठभूमि जॉब उसे अपना काम ख़त्म होने पर लौटाता है (`hold_admission`)।
+    """
+
+    def __init__(self, client: str, cost: float):
+        self.client = client
+        self.cost = cost
+        self.held = False
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    अनुमानित लागत के आधार पर अनुरोध स्वीकार या अस्वीकार करता है: हर क्लाइंट की दर (429) और
+    पूरे सर्वर पर एक साथ चल रहे काम की कुल लागत (503), दोनों पर सीमा है।
+    """
+
+    def __init__(self, backend: Optional[AdmissionBackend] = None):
+        self.backend = backend or InMemoryAdmissionBackend()
+        self.rejections: Dict[str, int] = {"client_rate": 0, "inflight": 0}
+
+    def client_id(self, scope) -> str:
+        if settings.ADMISSION_TRUST_FORWARDED_FOR:
+            forwarded = Headers(scope=scope).get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",", 1)[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _reserve(self, client: str, cost: float, held: float = 0.0) -> None:
+        if not self.backend.acquire(cost, settings.ADMISSION_MAX_INFLIGHT_COST, held):
+            self.rejections["inflight"] += 1
+            raise AdmissionRejected(
+                503, "The server is busy with other documents. Please try again shortly.", INFLIGHT_RETRY_AFTER_SECONDS
+            )
+        retry_after = self.backend.take_tokens(
+            client, cost, settings.ADMISSION_CLIENT_BURST, settings.ADMISSION_CLIENT_RATE
+        )
+        if retry_after > 0:
+            self.backend.release(cost)
+            self.rejections["client_rate"] += 1
+            raise AdmissionRejected(429, "Too many large requests. Please slow down.", retry_after)
+
+    def admit(self, client: str, cost: float) -> AdmissionTicket:
+        self._reserve(client, cost)
+        return AdmissionTicket(client, cost)
+
+    def extend(self, ticket: AdmissionTicket, extra: float) -> None:
+        """
+        स्वीकार हो चुके अनुरोध की लागत बढ़ाता है। route यह भारी काम शुरू करने से पहले बुलाते हैं, इसलिए बढ़ी
+        हुई लागत पर भी वही दोनों सीमाएँ लागू होती हैं; अस्वीकार होने पर ticket की लागत नहीं बदलती।
+        """
+        if extra <= 0:
+            return
+        self._reserve(ticket.client, extra, held=ticket.cost)
+        ticket.cost += extra
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        self.backend.release(ticket.cost)
+
+
+admission_controller = AdmissionController()
+
+
+def _rejection_error(rejected: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=rejected.status_code, detail=rejected.detail,
+        headers={"Retry-After": str(max(1, math.ceil(rejected.retry_after)))},
+    )
+
+
+def charge(request: Request, files: int = 0, pages: int = 0, stored_bytes: int = 0) -> None:
+    """
+    route फ़ाइलें और पेज गिन लेने के बाद, PDF पर काम शुरू करने से पहले इसे बुलाते हैं, ताकि लागत का अनुमान
+    सही हो सके। बढ़ी हुई लागत सीमा पार करे तो 429 या 503 (`HTTPException`) उठता है।
+    शुरुआती अनुमान में एक फ़ाइल पहले से गिनी हुई है। `stored_bytes` उन इनपुट का आकार है जो body में नहीं,
+    storage key से आते हैं, और इसलिए `Content-Length` में नहीं गिने गए।
+    """
+    ticket = request.scope.get("state", {}).get("admission")
+    if ticket is not None:
+        try:
+            admission_controller.extend(
+                ticket,
+                max(0, files - 1) * settings.ADMISSION_COST_PER_FILE
+                + pages * settings.ADMISSION_COST_PER_PAGE
+                + stored_bytes / _MB * settings.ADMISSION_COST_PER_MB,
+            )
+        except AdmissionRejected as e:
+            raise _rejection_error(e)
+
+
+def hold_admission(request: Request) -> Callable[[], None]:
+    """
+    पृष्ठभूमि जॉब के लिए: अनुरोध की लागत 202 जवाब के बाद भी गिनी रहती है, और लौटाया गया फ़ंक्शन जॉब का
+    काम ख़त्म होने पर उसे छोड़ता है। प्रवेश नियंत्रण बंद हो तो यह फ़ंक्शन कुछ नहीं करता।
+    """
+    ticket = request.scope.get("state", {}).get("admission")
+    if ticket is None:
+        return lambda: None
+    ticket.held = True
+    return partial(admission_controller.release, ticket)
+
+
+def takes_upload(route) -> bool:
+    """
+    route अनुरोध की body (अपलोड) लेता है: FastAPI के File/Form/Body पैरामीटर से, या `openapi_extra` में घोषित
+    requestBody से (वे route जो body को कच्चे stream के रूप में पढ़ते हैं, जैसे storage के PUT)।
+    """
+    return getattr(route, "body_field", None) is not None or "requestBody" in (getattr(route, "openapi_extra", None) or {})
+
+
+class AdmissionMiddleware:
+    """
+    अपलोड लेने वाले हर route के अनुरोध को, HTTP method चाहे जो हो, body का पहला टुकड़ा पढ़े जाने से पहले
+    `Content-Length` से अनुमानित लागत पर स्वीकार या अस्वीकार करता है, ताकि बड़े अपलोड की बाढ़ बाक़ी क्लाइंट्स के
+    लिए वर्कर पूल न रोक दे। जाँच पहली `receive()` पर होती है, जब routing हो चुकी होती है और `scope["route"]`
+    से पता चलता है कि route अपलोड लेता है या नहीं। अस्वीकार होने पर `Retry-After` के साथ 429 (इस क्लाइंट की दर)
+    या 503 (पूरा सर्वर व्यस्त) लौटता है। लागत जवाब की आख़िरी बाइट भेजे जाने तक गिनी जाती है, और पृष्ठभूमि जॉब
+    के लिए उसका काम ख़त्म होने तक (`hold_admission`)।
+    """
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    def admit(self, scope) -> AdmissionTicket:
+        content_length = Headers(scope=scope).get("content-length")
+        try:
+            content_length = int(content_length) if content_length is not None else None
+        except ValueError:
+            content_length = None
+        try:
+            return self.controller.admit(self.controller.client_id(scope), estimate_cost(content_length))
+        except AdmissionRejected as e:
+            raise _rejection_error(e)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        checked = False
+        ticket: Optional[AdmissionTicket] = None
+
+        async def admitted_receive():
+            nonlocal checked, ticket
+            if not checked:
+                checked = True
+                if takes_upload(scope.get("route")):
+                    ticket = self.admit(scope)
+                    scope.setdefault("state", {})["admission"] = ticket
+            return await receive()
+
+        try:
+            await self.app(scope, admitted_receive, send)
+        finally:
+            if ticket is not None and not ticket.held:
+                self.controller.release(ticket)
+
+
+registry.collector(
+    "pdfkaro_admission_rejections_total", "Requests rejected by admission control, by reason.",
+    lambda: {(("reason", reason),): count for reason, count in admission_controller.rejections.items()},
+    kind="counter",
+)
+registry.collector(
+    "pdfkaro_admission_inflight_cost", "Estimated cost of the requests currently being processed.",
+    lambda: {(): admission_controller.backend.inflight()},
+)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import hashlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.core.lazy_imports import lazy_import
+from app.services.metrics import span
+
+pikepdf = lazy_import("pikepdf")
+
+# एक pass में बदले गए references से नए जोड़े बन सकते हैं (font file -> descriptor -> font -> resources),
+# इसलिए मिलान कई pass में होता है
+MAX_PASSES = 6
+
+# इन streams की पहचान उनकी जगह से है, सामग्री से नहीं
+_SKIPPED_STREAM_TYPES = {"/XRef", "/ObjStm"}
+# ये ऑब्जेक्ट दस्तावेज़ के ढाँचे का हिस्सा हैं; एक जैसे दिखने पर भी इन्हें मिलाना ग़लत होगा
+_SKIPPED_TYPES = {"/Catalog", "/Pages", "/Page", "/Annot", "/Outlines", "/StructTreeRoot", "/StructElem",
+                  "/Sig", "/AcroForm", "/Action", "/OCG", "/OCMD"}
+# ऐसे key वाले dictionaries (annotations, form fields, tree nodes) किसी एक जगह से बंधे होते हैं
+_IDENTITY_KEYS = ("/Parent", "/Kids", "/P", "/Rect", "/FT")
+
+ObjGen = Tuple[int, int]
+
+
+def _digest(*parts: bytes) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part)
+    return h.digest()
+
+
+def _object_key(obj: pikepdf.Object, unique_lengths: set) -> Optional[bytes]:
+    """
+    ऑब्जेक्ट की सामग्री की पहचान: stream के लिए dictionary (/Length के बिना) और कच्चे बाइट्स का hash,
+    बाक़ी के लिए उनके serialized रूप का। None का मतलब है कि यह ऑब्जेक्ट मिलाया नहीं जा सकता।
+    दूसरे ऑब्जेक्ट्स के reference "n g R" के रूप में गिने जाते हैं, इसलिए जोड़े नीचे से ऊपर बनते हैं।
+    """
+    if isinstance(obj, pikepdf.Stream):
+        if str(obj.get("/Type")) in _SKIPPED_STREAM_TYPES:
+            return None
+        length = obj.get("/Length")
+        # जिस लंबाई का कोई दूसरा stream नहीं, उसका डेटा पढ़ने की ज़रूरत ही नहीं
+        if isinstance(length, int) and length in unique_lengths:
+            return None
+        header = pikepdf.Dictionary({key: value for key, value in obj.stream_dict.items() if key != "/Length"})
+        return b"s" + _digest(header.unparse(), b"\0", obj.read_raw_bytes())
+    if isinstance(obj, pikepdf.Dictionary):
+        if str(obj.get("/Type")) in _SKIPPED_TYPES or any(key in obj for key in _IDENTITY_KEYS):
+            return None
+        return b"d" + _digest(obj.unparse(resolved=True))
+    if isinstance(obj, pikepdf.Array):
+        return b"a" + _digest(obj.unparse(resolved=True))
+    return None
+
+
+def _replace_references(container, replacements: Dict[ObjGen, pikepdf.Object]) -> bool:
+    """container (dictionary या array) और उसके अंदर के direct ऑब्जेक्ट्स में references बदलता है।"""
+    changed = False
+    entries = container.items() if isinstance(container, pikepdf.Dictionary) else enumerate(list(container))
+    for key, value in entries:
+        if not isinstance(value, (pikepdf.Dictionary, pikepdf.Array, pikepdf.Stream)):
+            continue
+        if value.is_indirect:
+            target = replacements.get(value.objgen)
+            if target is not None:
+                container[key] = target
+                changed = True
+        elif _replace_references(value, replacements):
+            changed = True
+    return changed
+
+
+def deduplicate(pdf: pikepdf.Pdf) -> dict:
+    """
+    एक जैसे streams (fonts, logos, ICC profiles, छवियाँ) और dictionaries को एक ही indirect ऑब्जेक्ट में
+    मिलाता है: हर दोहराव के सभी references पहली प्रति पर भेज दिए जाते हैं, और बिना reference वाली प्रतियाँ
+    save करते समय छूट जाती हैं। मेमोरी में हर ऑब्जेक्ट का सिर्फ़ 16 बाइट का hash रहता है, और streams एक-एक
+    करके पढ़े जाते हैं। मिलान के लिए सामग्री बाइट-दर-बाइट एक जैसी होनी चाहिए।
+    """
+    with span("dedup"):
+        lengths = Counter()
+        for obj in pdf.objects:
+            if isinstance(obj, pikepdf.Stream) and isinstance(obj.get("/Length"), int):
+                lengths[int(obj.get("/Length"))] += 1
+        unique_lengths = {length for length, count in lengths.items() if count == 1}
+
+        first_by_key: Dict[bytes, pikepdf.Object] = {}
+        merged: Dict[ObjGen, pikepdf.Object] = {}
+        bytes_saved = 0
+        pending: List[pikepdf.Object] = list(pdf.objects)
+        passes = 0
+        while pending and passes < MAX_PASSES:
+            passes += 1
+            replacements: Dict[ObjGen, pikepdf.Object] = {}
+            for obj in pending:
+                if not isinstance(obj, (pikepdf.Dictionary, pikepdf.Array, pikepdf.Stream)) or obj.objgen in merged:
+                    continue
+                key = _object_key(obj, unique_lengths)
+                if key is None:
+                    continue
+                first = first_by_key.setdefault(key, obj)
+                if first.objgen != obj.objgen:
+                    replacements[obj.objgen] = first
+                    if isinstance(obj, pikepdf.Stream):
+                        length = obj.get("/Length")
+                        bytes_saved += int(length) if isinstance(length, int) else len(obj.read_raw_bytes())
+            if not replacements:
+                break
+            merged.update(replacements)
+
+            # अगले pass में सिर्फ़ वही ऑब्जेक्ट दोबारा जाँचे जाते हैं जिनके references बदले
+            pending = []
+            for obj in pdf.objects:
+                if not isinstance(obj, (pikepdf.Dictionary, pikepdf.Array, pikepdf.Stream)) or obj.objgen in merged:
+                    continue
+                container = obj.stream_dict if isinstance(obj, pikepdf.Stream) else obj
+                if _replace_references(container, replacements):
+                    pending.append(obj)
+            _replace_references(pdf.trailer, replacements)
+
+    return {"objects_merged": len(merged), "bytes_saved": bytes_saved, "passes": passes}
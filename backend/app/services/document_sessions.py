@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.metrics import registry
+from app.services.pdf_processor import pdf_processor_service
+from app.services.storage import get_object_store
+from app.services.uploads import SpooledUpload, open_spooled_pdf, spool_upload
+
+pikepdf = lazy_import("pikepdf")
+
+
+def describe_pages(pdf: pikepdf.Pdf) -> List[dict]:
+    """हर पेज का आकार (points में) और rotation।"""
+    pages = []
+    for index, page in enumerate(pdf.pages):
+        x0, y0, x1, y1 = (float(v) for v in page.mediabox)
+        pages.append({
+            "index": index,
+            "width": round(abs(x1 - x0), 2),
+            "height": round(abs(y1 - y0), 2),
+            "rotation": page.rotation,
+        })
+    return pages
+
+
+def describe_document(path: str) -> List[dict]:
+    """वर्कर प्रोसेस में चलता है: डिस्क पर रखी PDF के पेजों का विवरण।"""
+    with open_spooled_pdf(path) as pdf:
+        return describe_pages(pdf)
+
+
+class DocumentSession:
+    """
+    एक बार अपलोड किया गया दस्तावेज़: डिस्क पर रखी फ़ाइल, उसका sha256 और पेजों का विवरण।
+    PDF मुख्य प्रोसेस में खुली नहीं रहती; हर काम बाक़ी कामों की तरह वर्कर पूल में `path` से फ़ाइल खोलता है
+    (memory-mapped होने से यह सस्ता है), इसलिए पूल की कतार सीमा (503) और टाइमआउट (504) यहाँ भी लागू होते हैं।
+    """
+
+    def __init__(self, upload: SpooledUpload, pages: List[dict]):
+        self.document_id = uuid.uuid4().hex
+        self.upload = upload
+        self.pages = pages
+        self.last_access = time.monotonic()
+        self.active = 0
+
+    @property
+    def filename(self) -> str:
+        return self.upload.filename
+
+    @property
+    def path(self) -> str:
+        return self.upload.path
+
+    @property
+    def sha256(self) -> str:
+        return self.upload.sha256
+
+    @property
+    def size(self) -> int:
+        return self.upload.size
+
+    def metadata(self) -> dict:
+        return {
+            "document_id": self.document_id,
+            "filename": self.filename,
+            "size": self.size,
+            "page_count": len(self.pages),
+            "pages": self.pages,
+        }
+
+    def close(self) -> None:
+        self.upload.cleanup()
+
+
+class DocumentSessionStore:
+    """
+    खुले दस्तावेज़ों का TTL + LRU कैश। जो सत्र अभी किसी अनुरोध में इस्तेमाल हो रहा है
+    (`active` > 0) उसे कभी नहीं हटाया जाता।
+    """
+
+    def __init__(self, max_sessions: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_sessions = settings.DOCUMENT_SESSION_MAX if max_sessions is None else max_sessions
+        self.ttl_seconds = settings.DOCUMENT_SESSION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._sessions: "OrderedDict[str, DocumentSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for document_id, session in list(self._sessions.items()):
+            if session.active == 0 and now - session.last_access > self.ttl_seconds:
+                self._remove(document_id)
+        # सबसे कम हाल में इस्तेमाल हुए सत्र पहले हटते हैं
+        for document_id, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if session.active == 0:
+                self._remove(document_id)
+
+    def _remove(self, document_id: str) -> None:
+        session = self._sessions.pop(document_id, None)
+        if session is not None:
+            session.close()
+
+    async def open(self, upload: SpooledUpload) -> DocumentSession:
+        """अपलोड को एक बार पार्स करके (वर्कर पूल में) नया सत्र बनाता है।"""
+        try:
+            pages = await pdf_processor_service.run(describe_document, upload.path)
+        except BaseException:
+            upload.cleanup()
+            raise
+        session = DocumentSession(upload, pages)
+        self._sessions[session.document_id] = session
+        self._evict()
+        return session
+
+    def get(self, document_id: str) -> DocumentSession:
+        self._evict()
+        session = self._sessions.get(document_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Document not found or expired. Please upload it again.")
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(document_id)
+        return session
+
+    @asynccontextmanager
+    async def use(self, document_id: str):
+        """अनुरोध के दौरान सत्र को हटाए जाने से बचाता है।"""
+        session = self.pin(document_id)
+        try:
+            yield session
+        finally:
+            self.unpin(session)
+
+    def pin(self, document_id: str) -> DocumentSession:
+        """`use` जैसा ही, पर स्ट्रीमिंग रिस्पॉन्स के लिए जहाँ छोड़ना बाद में `unpin` से होता है।"""
+        session = self.get(document_id)
+        session.active += 1
+        return session
+
+    def unpin(self, session: DocumentSession) -> None:
+        session.active -= 1
+        session.last_access = time.monotonic()
+
+    def delete(self, document_id: str) -> None:
+        session = self.get(document_id)
+        if session.active:
+            raise HTTPException(status_code=409, detail="Document is in use. Please try again shortly.")
+        self._remove(document_id)
+
+    def close_all(self) -> None:
+        for document_id in list(self._sessions):
+            self._remove(document_id)
+
+
+document_sessions = DocumentSessionStore()
+
+registry.collector(
+    "pdfkaro_document_sessions", "Open upload-once document sessions.",
+    lambda: {(): len(document_sessions)},
+)
+
+
+@asynccontextmanager
+async def pdf_source(file: Optional[UploadFile], document_id: Optional[str], input_key: Optional[str] = None):
+    """
+    अनुरोध का स्रोत लौटाता है: पहले से खुला सत्र, storage में रखा object (`input_key`), या नया अपलोड।
+    अपलोड और S3 से उतारी गई फ़ाइल ब्लॉक ख़त्म होते ही हट जाती हैं। सभी में `path`, `filename` और `sha256` मौजूद हैं।
+    """
+    if document_id:
+        async with document_sessions.use(document_id) as session:
+            yield session
+    elif input_key:
+        stored = await get_object_store().open_input(input_key)
+        try:
+            yield stored
+        finally:
+            stored.cleanup()
+    elif file is not None:
+        upload = await spool_upload(file)
+        try:
+            yield upload
+        finally:
+            upload.cleanup()
+    else:
+        raise HTTPException(status_code=400, detail="Either a file, a document_id or an input_key is required.")
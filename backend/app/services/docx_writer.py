@@ -0,0 +1,120 @@
+import re
+import zipfile
+from typing import Iterable, Iterator, List
+
+from app.services.zip_stream import ZipStreamWriter
+
+# document.xml इतने बड़े टुकड़ों में compressor को दिया जाता है
+XML_CHUNK_SIZE = 64 * 1024
+# DOCX का ZIP अक्सर बाहरी ZIP में दोबारा compress होता है, इसलिए यहाँ तेज़ स्तर काफ़ी है
+COMPRESS_LEVEL = 1
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+# हर दस्तावेज़ में एक जैसे रहने वाले हिस्से: एक बार बनते हैं और हर फ़ाइल में वही बाइट्स जाती हैं
+_TEMPLATE_PARTS = [
+    ("[Content_Types].xml", (
+        _XML_HEADER
+        + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '<Override PartName="/word/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+        '</Types>'
+    ).encode("utf-8")),
+    ("_rels/.rels", (
+        _XML_HEADER
+        + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="word/document.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ).encode("utf-8")),
+    ("word/_rels/document.xml.rels", (
+        _XML_HEADER
+        + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="styles.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+        '</Relationships>'
+    ).encode("utf-8")),
+    # "Code" डिफ़ॉल्ट paragraph style है, इसलिए हर paragraph को अलग से style देने की ज़रूरत नहीं
+    ("word/styles.xml", (
+        _XML_HEADER
+        + f'<w:styles xmlns:w="{_W_NS}">'
+        '<w:docDefaults><w:rPrDefault><w:rPr>'
+        '<w:rFonts w:ascii="Courier New" w:hAnsi="Courier New" w:eastAsia="Courier New" w:cs="Courier New"/>'
+        '<w:sz w:val="18"/><w:szCs w:val="18"/>'
+        '</w:rPr></w:rPrDefault><w:pPrDefault><w:pPr>'
+        '<w:spacing w:before="0" w:after="0" w:line="240" w:lineRule="auto"/>'
+        '</w:pPr></w:pPrDefault></w:docDefaults>'
+        '<w:style w:type="paragraph" w:default="1" w:styleId="Code"><w:name w:val="Code"/><w:qFormat/></w:style>'
+        '</w:styles>'
+    ).encode("utf-8")),
+]
+
+_DOCUMENT_START = _XML_HEADER + f'<w:document xmlns:w="{_W_NS}"><w:body>'
+# A4 पेज, 2 सेमी हाशिये
+_DOCUMENT_END = (
+    '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+    '<w:pgMar w:top="1134" w:right="1134" w:bottom="1134" w:left="1134" w:header="709" w:footer="709" w:gutter="0"/>'
+    '</w:sectPr></w:body></w:document>'
+)
+
+# XML 1.0 में मान्य न होने वाले अक्षर (tab और newline को छोड़कर control characters, surrogates)
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+_EMPTY_PARAGRAPH = "<w:p/>"
+
+
+def _paragraph(line: str) -> str:
+    """एक पंक्ति का paragraph; tab को <w:tab/> में बदला जाता है ताकि indentation बनी रहे।"""
+    if not line:
+        return _EMPTY_PARAGRAPH
+    line = _INVALID_XML_CHARS.sub("", line.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;"))
+    if "\t" in line:
+        line = '</w:t><w:tab/><w:t xml:space="preserve">'.join(line.split("\t"))
+    return f'<w:p><w:r><w:t xml:space="preserve">{line}</w:t></w:r></w:p>'
+
+
+def _lines(pieces: Iterable[str]) -> Iterator[str]:
+    """पाठ के टुकड़ों को पंक्तियों में बाँटता है; कोई पंक्ति दो टुकड़ों में बँटी हो तो उसे जोड़ देता है।"""
+    rest = ""
+    for piece in pieces:
+        lines = (rest + piece).split("\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith("\r") else line
+    if rest:
+        yield rest
+
+
+def document_xml(pieces: Iterable[str]) -> Iterator[bytes]:
+    """word/document.xml को लगभग `XML_CHUNK_SIZE` के टुकड़ों में बनाता है, हर पंक्ति एक paragraph।"""
+    batch: List[str] = [_DOCUMENT_START]
+    size = 0
+    for line in _lines(pieces):
+        paragraph = _paragraph(line)
+        batch.append(paragraph)
+        size += len(paragraph)
+        if size >= XML_CHUNK_SIZE:
+            yield "".join(batch).encode("utf-8")
+            batch, size = [], 0
+    batch.append(_DOCUMENT_END)
+    yield "".join(batch).encode("utf-8")
+
+
+def docx_chunks(pieces: Iterable[str]) -> Iterator[bytes]:
+    """
+    python-docx के बिना, WordprocessingML सीधे लिखकर DOCX बनाता है। पाठ पंक्ति-दर-पंक्ति monospace
+    paragraphs बनता है, और DOCX बाइट्स बनते ही लौटाई जाती हैं, इसलिए पूरा दस्तावेज़ कभी मेमोरी में नहीं रहता।
+    """
+    writer = ZipStreamWriter(zipfile.ZIP_DEFLATED, COMPRESS_LEVEL)
+    for name, data in _TEMPLATE_PARTS:
+        yield from writer.add(name, data)
+    yield from writer.add_chunks("word/document.xml", document_xml(pieces))
+    yield from writer.finish()
+
+
+def docx_bytes(pieces: Iterable[str]) -> bytes:
+    return b"".join(docx_chunks(pieces))
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import io
+import math
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+
+pikepdf = lazy_import("pikepdf")
+Image = lazy_import("PIL.Image")
+
+_IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+_MAX_FORM_DEPTH = 8
+# इससे छोटी छवियों को दोबारा एन्कोड करने से कोई ख़ास फ़ायदा नहीं होता
+_MIN_IMAGE_PIXELS = 64 * 64
+_MIN_IMAGE_BYTES = 2048
+# लक्ष्य DPI से थोड़ा ही ज़्यादा होने पर छवि का आकार नहीं बदला जाता
+_DPI_TOLERANCE = 1.1
+_REWRITTEN_KEYS = ("/Filter", "/DecodeParms", "/Width", "/Height", "/BitsPerComponent", "/ColorSpace")
+_SUPPORTED_FILTERS = {"/DCTDecode", "/FlateDecode", "/LZWDecode", "/RunLengthDecode"}
+
+
+def _multiply(m: Tuple[float, ...], n: Tuple[float, ...]) -> Tuple[float, ...]:
+    """PDF मैट्रिक्स गुणा: m × n"""
+    a1, b1, c1, d1, e1, f1 = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a1 * a2 + b1 * c2,
+        a1 * b2 + b1 * d2,
+        c1 * a2 + d1 * c2,
+        c1 * b2 + d1 * d2,
+        e1 * a2 + f1 * c2 + e2,
+        e1 * b2 + f1 * d2 + f2,
+    )
+
+
+def _mark_unknown(resources, placements: Dict) -> None:
+    # जिस content stream को पढ़ा नहीं जा सका, उसकी छवियों का आकार बदलना सुरक्षित नहीं
+    xobjects = resources.get("/XObject") if resources is not None else None
+    for _, xobj in (xobjects.items() if xobjects is not None else ()):
+        if isinstance(xobj, pikepdf.Stream) and xobj.get("/Subtype") == pikepdf.Name.Image and xobj.is_indirect:
+            placements[xobj.objgen] = 0.0
+
+
+def _scan_placements(content, resources, ctm, placements: Dict, depth: int) -> None:
+    if resources is None:
+        return
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return
+    try:
+        instructions = pikepdf.parse_content_stream(content, "q Q cm Do")
+    except pikepdf.PdfError:
+        _mark_unknown(resources, placements)
+        return
+
+    stack = []
+    for operands, operator in instructions:
+        op = str(operator)
+        if op == "q":
+            stack.append(ctm)
+        elif op == "Q":
+            ctm = stack.pop() if stack else ctm
+        elif op == "cm" and len(operands) == 6:
+            ctm = _multiply(tuple(float(x) for x in operands), ctm)
+        elif op == "Do" and operands:
+            xobj = xobjects.get(operands[0])
+            if not isinstance(xobj, pikepdf.Stream):
+                continue
+            subtype = xobj.get("/Subtype")
+            if subtype == pikepdf.Name.Image and xobj.is_indirect:
+                width_pt = math.hypot(ctm[0], ctm[1])
+                height_pt = math.hypot(ctm[2], ctm[3])
+                if width_pt == 0 or height_pt == 0:
+                    continue
+                dpi = min(int(xobj.get("/Width", 0)) * 72 / width_pt, int(xobj.get("/Height", 0)) * 72 / height_pt)
+                # सबसे बड़े स्थान पर दिखाई गई छवि (सबसे कम DPI) ही सीमा तय करती है
+                previous = placements.get(xobj.objgen)
+                placements[xobj.objgen] = dpi if previous is None else min(previous, dpi)
+            elif subtype == pikepdf.Name.Form and depth < _MAX_FORM_DEPTH:
+                matrix = tuple(float(x) for x in xobj.get("/Matrix", _IDENTITY))
+                form_resources = xobj.get("/Resources", resources)
+                _scan_placements(xobj, form_resources, _multiply(matrix, ctm), placements, depth + 1)
+
+
+def find_image_placements(pdf: pikepdf.Pdf) -> Dict[Tuple[int, int], float]:
+    """
+    हर पेज का content stream पढ़कर हर छवि XObject का प्रभावी DPI निकालता है।
+    एक ही छवि कई जगह हो तो सबसे कम DPI लिया जाता है; 0 का मतलब है "अज्ञात, मत छुओ"।
+    """
+    placements: Dict[Tuple[int, int], float] = {}
+    for page in pdf.pages:
+        _scan_placements(page, page.obj.get("/Resources"), _IDENTITY, placements, 0)
+    return placements
+
+
+def would_resize(image_dpi: float, dpi: int) -> bool:
+    """लक्ष्य DPI से काफ़ी ज़्यादा DPI वाली छवि ही छोटी की जाती है।"""
+    return image_dpi > dpi * _DPI_TOLERANCE
+
+
+class ImageCandidate:
+    """एक छवि जिसे दोबारा एन्कोड किया जा सकता है। उसके पिक्सेल सिर्फ़ एन्कोड करते समय डिकोड होते हैं।"""
+
+    def __init__(self, obj: pikepdf.Object, dpi: float, raw_size: int):
+        self.obj = obj
+        self.dpi = dpi
+        self.raw_size = raw_size
+        # पहली बार डिकोड होने पर "RGB" या "L"; छवि पढ़ी न जा सके या उसका mode समर्थित न हो तो ""
+        self.mode: Optional[str] = None
+        # पहली बार बदलने से पहले का मूल stream, ताकि दूसरे पैरामीटर आज़माते समय वापस लाया जा सके
+        self.original = None
+
+
+def _image_bytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+def is_recompressible(obj: pikepdf.Object) -> bool:
+    if obj.get("/ImageMask", False) or "/Decode" in obj or isinstance(obj.get("/Mask"), pikepdf.Array):
+        return False
+    if int(obj.get("/BitsPerComponent", 0)) != 8:
+        return False
+    if int(obj.get("/Width", 0)) * int(obj.get("/Height", 0)) < _MIN_IMAGE_PIXELS:
+        return False
+    filters = obj.get("/Filter")
+    if filters is None:
+        return True
+    names = [str(f) for f in filters] if isinstance(filters, pikepdf.Array) else [str(filters)]
+    return all(name in _SUPPORTED_FILTERS for name in names)
+
+
+def recompressible_images(pdf: pikepdf.Pdf,
+                          placements: Optional[Dict[Tuple[int, int], float]] = None) -> List[Tuple[pikepdf.Object, float, int]]:
+    """
+    दोबारा एन्कोड की जा सकने वाली छवियाँ (ऑब्जेक्ट, प्रभावी DPI, कच्चा आकार), पिक्सेल डिकोड किए बिना।
+    `placements` पहले से निकाले गए हों तो content streams दोबारा नहीं पढ़े जाते।
+    """
+    images = []
+    # placements का key objgen है, इसलिए कई पेजों पर इस्तेमाल हुई छवि सिर्फ़ एक बार आती है
+    for objgen, dpi in (find_image_placements(pdf) if placements is None else placements).items():
+        if not dpi:
+            continue
+        obj = pdf.get_object(objgen)
+        if not is_recompressible(obj):
+            continue
+        raw_size = len(obj.read_raw_bytes())
+        if raw_size < _MIN_IMAGE_BYTES:
+            continue
+        images.append((obj, dpi, raw_size))
+    return images
+
+
+class ImageRecompressor:
+    """
+    PDF की छवियों को लक्ष्य DPI तक छोटा करके दी गई JPEG quality पर दोबारा एन्कोड करता है।
+
+    छवियाँ एन्कोड होते समय ही डिकोड होती हैं और उसके तुरंत बाद बंद कर दी जाती हैं, इसलिए एक समय में
+    लगभग `max_threads` छवियों के पिक्सेल ही मेमोरी में रहते हैं। एक ही छवि को कई पैरामीटर पर आज़माने वाला
+    (target size) `decoded_cache_bytes` देकर डिकोड की गई छवियों का सीमित LRU कैश रख सकता है। pikepdf
+    ऑब्जेक्ट्स पर काम सिर्फ़ मुख्य थ्रेड में होता है; Pillow का resize/encode थ्रेड पूल में चलता है क्योंकि
+    वह GIL छोड़ देता है। `images` (recompressible_images का नतीजा) पहले से हो तो छवियाँ दोबारा नहीं खोजी जातीं।
+    """
+
+    def __init__(self, pdf: pikepdf.Pdf, max_threads: Optional[int] = None,
+                 images: Optional[List[Tuple[pikepdf.Object, float, int]]] = None, decoded_cache_bytes: int = 0):
+        self.pdf = pdf
+        self.max_threads = max_threads or settings.IMAGE_COMPRESSION_THREADS or min(4, os.cpu_count() or 1)
+        self.candidates = [
+            ImageCandidate(obj, dpi, raw_size)
+            for obj, dpi, raw_size in (recompressible_images(pdf) if images is None else images)
+        ]
+        self.decoded_cache_bytes = decoded_cache_bytes
+        self._decoded: "OrderedDict[int, Image.Image]" = OrderedDict()
+        self._decoded_size = 0
+        # आख़िरी अनुमान के पैरामीटर और नतीजे, ताकि उन्हीं पर `apply` हो तो छवियाँ दोबारा एन्कोड न हों
+        self._estimated: Tuple[Optional[Tuple[int, int]], List[Optional[Tuple[bytes, Tuple[int, int]]]]] = (None, [])
+        self._estimates: Dict[Tuple[int, int], int] = {}
+
+    @property
+    def total_raw_bytes(self) -> int:
+        return sum(candidate.raw_size for candidate in self.candidates)
+
+    @property
+    def images_found(self) -> int:
+        """वे छवियाँ जो पढ़ी जा सकीं (या अभी डिकोड नहीं हुईं)।"""
+        return sum(1 for candidate in self.candidates if candidate.mode != "")
+
+    def _decode(self, index: int) -> Optional[Image.Image]:
+        """मुख्य थ्रेड में चलता है: छवि के मूल पिक्सेल, कैश से या stream डिकोड करके; पढ़ी न जा सके तो None।"""
+        image = self._decoded.pop(index, None)
+        if image is not None:
+            self._decoded_size -= _image_bytes(image)
+            return image
+        candidate = self.candidates[index]
+        if candidate.mode == "":
+            return None
+        # पिछले `apply` ने stream बदल दिया हो तो पहले मूल वापस लाया जाता है
+        self._restore(candidate)
+        try:
+            image = pikepdf.PdfImage(candidate.obj).as_pil_image(apply_decode_array=False, apply_mask=False)
+        except Exception:
+            candidate.mode = ""
+            return None
+        if image.mode not in ("RGB", "L"):
+            image.close()
+            candidate.mode = ""
+            return None
+        candidate.mode = image.mode
+        return image
+
+    def _done_with(self, index: int, image: Image.Image) -> None:
+        """छवि को सीमित कैश में रखता है, और कैश की सीमा पार हो तो सबसे पुरानी छवियाँ बंद कर देता है।"""
+        size = _image_bytes(image)
+        if size > self.decoded_cache_bytes:
+            image.close()
+            return
+        self._decoded[index] = image
+        self._decoded_size += size
+        while self._decoded_size > self.decoded_cache_bytes:
+            _, old = self._decoded.popitem(last=False)
+            self._decoded_size -= _image_bytes(old)
+            old.close()
+
+    def _encode(self, index: int, image: Image.Image, dpi: int,
+                quality: int) -> Optional[Tuple[bytes, Tuple[int, int]]]:
+        candidate = self.candidates[index]
+        resized = would_resize(candidate.dpi, dpi)
+        if resized:
+            scale = dpi / candidate.dpi
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.LANCZOS)
+        try:
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=quality, optimize=True)
+            size = image.size
+        finally:
+            if resized:
+                image.close()
+        data = buffer.getvalue()
+        if len(data) >= candidate.raw_size:
+            return None
+        return data, size
+
+    def _encoded(self, dpi: int, quality: int) -> Iterator[Optional[Tuple[bytes, Tuple[int, int]]]]:
+        """
+        हर छवि का नतीजा क्रम से देता है (जो छवि छोटी न हो उसके लिए None)। छवियाँ मुख्य थ्रेड में एक-एक करके
+        डिकोड होती हैं और थ्रेड पूल में एन्कोड; एक समय में अधिकतम `max_threads` + 1 छवियाँ डिकोड रहती हैं।
+        """
+        in_flight: deque = deque()
+        with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
+            try:
+                for index in range(len(self.candidates)):
+                    image = self._decode(index)
+                    future = executor.submit(self._encode, index, image, dpi, quality) if image is not None else None
+                    in_flight.append((index, image, future))
+                    if len(in_flight) > self.max_threads:
+                        yield self._result(*in_flight.popleft())
+                while in_flight:
+                    yield self._result(*in_flight.popleft())
+            finally:
+                # बीच में रुकने पर बची छवियाँ उनका एन्कोड ख़त्म होने के बाद ही बंद की जाती हैं
+                for _, image, future in in_flight:
+                    if future is not None and not future.cancel():
+                        wait([future])
+                    if image is not None:
+                        image.close()
+
+    def _result(self, index: int, image: Optional[Image.Image], future) -> Optional[Tuple[bytes, Tuple[int, int]]]:
+        if future is None:
+            return None
+        try:
+            return future.result()
+        finally:
+            self._done_with(index, image)
+
+    def estimated_image_bytes(self, dpi: int, quality: int) -> int:
+        """इन पैरामीटर पर सभी छवियों का कुल अनुमानित आकार, बिना PDF सेव किए।"""
+        if (dpi, quality) not in self._estimates:
+            results = list(self._encoded(dpi, quality))
+            self._estimated = ((dpi, quality), results)
+            self._estimates[(dpi, quality)] = sum(
+                len(r[0]) if r else c.raw_size for c, r in zip(self.candidates, results)
+            )
+        return self._estimates[(dpi, quality)]
+
+    def apply(self, dpi: int, quality: int) -> dict:
+        """एन्कोड की गई छवियों को PDF में लिखता है और इस चरण के आँकड़े लौटाता है।"""
+        replaced = 0
+        bytes_before = 0
+        bytes_after = 0
+        params, estimated = self._estimated
+        results = estimated if params == (dpi, quality) else self._encoded(dpi, quality)
+        for index, result in enumerate(results):
+            candidate = self.candidates[index]
+            if result is None:
+                self._restore(candidate)
+                continue
+            data, (width, height) = result
+            obj = candidate.obj
+            if candidate.original is None:
+                candidate.original = (obj.read_raw_bytes(), {key: obj.get(key) for key in _REWRITTEN_KEYS})
+            obj.write(data, filter=pikepdf.Name.DCTDecode)
+            obj.Width = width
+            obj.Height = height
+            obj.BitsPerComponent = 8
+            colorspace = obj.get("/ColorSpace")
+            is_icc = isinstance(colorspace, pikepdf.Array) and len(colorspace) > 0 and colorspace[0] == pikepdf.Name.ICCBased
+            if not is_icc:
+                obj.ColorSpace = pikepdf.Name.DeviceGray if candidate.mode == "L" else pikepdf.Name.DeviceRGB
+            if "/DecodeParms" in obj:
+                del obj.DecodeParms
+            replaced += 1
+            bytes_before += candidate.raw_size
+            bytes_after += len(data)
+        return {
+            "images_found": self.images_found,
+            "images_recompressed": replaced,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_saved": bytes_before - bytes_after,
+        }
+
+    def _restore(self, candidate: ImageCandidate) -> None:
+        if candidate.original is None:
+            return
+        raw, keys = candidate.original
+        obj = candidate.obj
+        obj.write(raw, filter=keys["/Filter"], decode_parms=keys["/DecodeParms"])
+        for key, value in keys.items():
+            if value is None:
+                if key in obj:
+                    del obj[key]
+            else:
+                obj[key] = value
+        candidate.original = None
+
+    def close(self) -> None:
+        for image in self._decoded.values():
+            image.close()
+        self._decoded.clear()
+        self._decoded_size = 0
+        self._estimated = (None, [])
+        self._estimates.clear()
@@ -0,0 +1,344 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Set
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services.metrics import registry
+from app.services.pdf_processor import pdf_processor_service
+from app.services.result_cache import CachedResult
+from app.services.storage import get_object_store, result_key
+from app.services.uploads import SpooledUpload
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class ProgressReporter:
+    """
+    वर्कर प्रोसेस में चलता है: प्रगति को एक छोटी JSON फ़ाइल में लिखता है, जिसे मुख्य प्रोसेस पढ़ता है।
+    इससे किसी बाहरी broker या साझा मेमोरी की ज़रूरत नहीं पड़ती। `path` None हो तो कुछ नहीं करता।
+    """
+
+    def __init__(self, path: Optional[str], min_interval: float = 0.2):
+        self.path = path
+        self.min_interval = min_interval
+        self.fields: dict = {}
+        self._last_write = 0.0
+
+    def update(self, force: bool = False, **fields: Any) -> None:
+        if self.path is None:
+            return
+        self.fields.update(fields)
+        now = time.monotonic()
+        if not force and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.fields, f)
+        os.replace(tmp_path, self.path)
+
+
+def read_progress(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class LocalResultStore:
+    """
+    जॉब की काम-चलाऊ फ़ाइलें (वर्कर का आउटपुट और प्रगति) डिस्क पर रखता है। पूरा परिणाम object storage में
+    जाता है, जहाँ से क्लाइंट उसे हस्ताक्षरित URL से सीधे डाउनलोड कर सकता है।
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.JOB_RESULT_DIR or os.path.join(tempfile.gettempdir(), "pdfkaro_jobs")
+        os.makedirs(self.root, exist_ok=True)
+
+    def progress_path(self, job_id: str) -> str:
+        return os.path.join(self.root, f"{job_id}.progress")
+
+    def output_path(self, job_id: str) -> str:
+        """वर्कर यहाँ आउटपुट लिखता है; रद्द हुए जॉब का वर्कर बाद में लिखे तो `sweep` उसे हटा देता है।"""
+        return os.path.join(self.root, f"{job_id}.output")
+
+    def sweep(self, max_age: float, keep: Iterable[str] = ()) -> None:
+        """
+        `max_age` सेकंड से पुरानी फ़ाइलें हटाता है, `keep` वाले जॉब्स को छोड़कर। रद्द हुए जॉब का वर्कर
+        रद्द होने के बाद भी प्रगति फ़ाइल लिख सकता है, और पिछली बार चले सर्वर की फ़ाइलें भी यहीं बची रहती हैं।
+        """
+        keep = set(keep)
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if name.split(".", 1)[0] not in keep and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def delete(self, job_id: str) -> None:
+        for path in (self.progress_path(job_id), self.output_path(job_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class JobResult:
+    """जॉब के काम का नतीजा: आउटपुट (बाइट्स या फ़ाइल, media type और हेडर सहित) और डाउनलोड फ़ाइल नाम।"""
+
+    def __init__(self, output: CachedResult, filename: str):
+        self.output = output
+        self.filename = filename
+
+
+class Job:
+    """एक जॉब की स्थिति। इसमें हर बदलाव `_changed` से SSE सुनने वालों तक पहुँचता है।"""
+
+    def __init__(self, kind: str, inputs: List[SpooledUpload]):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.inputs = inputs
+        self.status = QUEUED
+        self.progress: dict = {}
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.result_key: Optional[str] = None
+        self.filename: Optional[str] = None
+        self.media_type: Optional[str] = None
+        self.headers: dict = {}
+        self.task: Optional[asyncio.Task] = None
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def update(self, status: Optional[str] = None, **progress: Any) -> None:
+        if status is not None:
+            self.status = status
+        self.progress.update(progress)
+        self.version += 1
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for_change(self, version: int, timeout: float) -> bool:
+        """`version` के बाद कोई बदलाव हुआ हो तो True; `timeout` सेकंड तक कुछ न बदले तो False।"""
+        if self.version != version:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.finished_at + settings.JOB_RESULT_TTL_SECONDS if self.finished_at else None,
+            "result_key": self.result_key if self.status == COMPLETED and self.result_key else None,
+            # URL की अपनी समय सीमा है, इसलिए हर बार नया बनता है
+            "result_url": (get_object_store().download_url(self.result_key, self.filename)
+                           if self.status == COMPLETED and self.result_key else None),
+        }
+
+
+JobWork = Callable[[Job, Callable[[Callable[..., Any], tuple], Awaitable[Any]]], Awaitable[JobResult]]
+
+
+class InProcessJobQueue:
+    """
+    लंबे merge/compress कामों को HTTP अनुरोध से अलग चलाता है।
+
+    जॉब की स्थिति इसी प्रोसेस की मेमोरी में रहती है और काम `asyncio` टास्क के रूप में चलता है, इसलिए
+    किसी बाहरी broker की ज़रूरत नहीं; भारी PDF काम फिर भी साझा वर्कर पूल में ही होता है। एक साथ
+    अधिकतम `max_concurrency` जॉब चलते हैं, और पूरे हुए जॉब `result_ttl` सेकंड बाद हटा दिए जाते हैं।
+    """
+
+    def __init__(
+        self,
+        store: Optional[LocalResultStore] = None,
+        max_concurrency: Optional[int] = None,
+        max_jobs: Optional[int] = None,
+        result_ttl: Optional[float] = None,
+    ):
+        self._store = store
+        self.max_concurrency = max_concurrency or settings.JOB_MAX_CONCURRENCY
+        self.max_jobs = max_jobs or settings.JOB_MAX_PENDING
+        self.result_ttl = settings.JOB_RESULT_TTL_SECONDS if result_ttl is None else result_ttl
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._deletions: Set[asyncio.Task] = set()
+
+    @property
+    def store(self) -> LocalResultStore:
+        """डायरेक्टरी पहली ज़रूरत पर ही बनाई जाती है।"""
+        if self._store is None:
+            self._store = LocalResultStore()
+        return self._store
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _expire(self) -> None:
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.result_ttl:
+                self._remove(job_id)
+
+    def _remove(self, job_id: str) -> None:
+        job = self._jobs.pop(job_id, None)
+        if job is not None:
+            self.store.delete(job_id)
+            self._delete_result(job)
+
+    def _delete_result(self, job: Job) -> None:
+        """परिणाम का object पृष्ठभूमि में हटाता है (S3 पर यह नेटवर्क कॉल है)।"""
+        if job.result_key is None:
+            return
+        task = asyncio.ensure_future(get_object_store().delete(job.result_key))
+        job.result_key = None
+        self._deletions.add(task)
+        task.add_done_callback(self._deletions.discard)
+
+    def check_capacity(self) -> None:
+        """
+        कतार भरी हो तो 503 देता है। submit route इसे अनुरोध की body पढ़ने से पहले ही बुलाते हैं (`JobSubmitRoute`),
+        ताकि भरी कतार के लिए बड़ा अपलोड डिस्क पर न लिखा जाए; `submit` में यह जाँच दोबारा होती है।
+        """
+        self._expire()
+        active = sum(1 for job in self._jobs.values() if not job.finished)
+        if active >= self.max_jobs:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many jobs are waiting. Please try again shortly.",
+                headers={"Retry-After": "10"},
+            )
+
+    def submit(self, kind: str, inputs: List[SpooledUpload], work: JobWork,
+               release: Optional[Callable[[], None]] = None) -> Job:
+        """
+        नया जॉब कतार में डालता है। `work(job, run)` को `run(fn, args)` मिलता है, जो `fn(*args, progress_path)`
+        को वर्कर पूल में चलाकर उसकी प्रगति जॉब में दर्ज करता रहता है। इनपुट फ़ाइलें जॉब ख़त्म होने पर हटती हैं,
+        और तभी `release` बुलाया जाता है (जैसे अनुरोध की प्रवेश लागत छोड़ने के लिए, `hold_admission`)।
+        """
+        try:
+            self.check_capacity()
+        except HTTPException:
+            for upload in inputs:
+                upload.cleanup()
+            if release is not None:
+                release()
+            raise
+        self.store.sweep(self.result_ttl, keep=self._jobs)
+        job = Job(kind, inputs)
+        self._jobs[job.job_id] = job
+        job.task = asyncio.create_task(self._execute(job, work, release))
+        return job
+
+    async def _execute(self, job: Job, work: JobWork, release: Optional[Callable[[], None]] = None) -> None:
+        try:
+            async with self.semaphore:
+                job.update(RUNNING)
+                result = await work(job, lambda fn, args: self._run_with_progress(job, fn, args))
+                job.result_key = result_key(job.job_id, result.filename)
+                await get_object_store().put(
+                    job.result_key, result.output, lambda written: job.update(bytes_written=written)
+                )
+                job.filename = result.filename
+                job.media_type = result.output.media_type
+                job.headers = result.output.headers
+                job.finished_at = time.time()
+                job.update(COMPLETED)
+        except asyncio.CancelledError:
+            job.finished_at = time.time()
+            job.update(CANCELLED)
+            self.store.delete(job.job_id)
+            self._delete_result(job)
+        except Exception as e:
+            job.error = e.detail if isinstance(e, HTTPException) else str(e)
+            job.finished_at = time.time()
+            job.update(FAILED)
+            self.store.delete(job.job_id)
+            self._delete_result(job)
+        finally:
+            for upload in job.inputs:
+                upload.cleanup()
+            if release is not None:
+                release()
+
+    async def _run_with_progress(self, job: Job, fn: Callable[..., Any], args: tuple) -> Any:
+        # वर्कर प्रगति फ़ाइल में लिखता है; यहाँ उसे थोड़े-थोड़े अंतराल पर पढ़कर जॉब में दर्ज किया जाता है
+        progress_path = self.store.progress_path(job.job_id)
+        task = asyncio.ensure_future(pdf_processor_service.run(fn, *args, progress_path))
+        try:
+            while not task.done():
+                await asyncio.wait([task], timeout=settings.JOB_PROGRESS_INTERVAL_SECONDS)
+                progress = read_progress(progress_path)
+                if progress and any(job.progress.get(k) != v for k, v in progress.items()):
+                    job.update(**progress)
+            return task.result()
+        finally:
+            task.cancel()
+
+    def get(self, job_id: str) -> Job:
+        self._expire()
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found or its result has expired.")
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        """चल रहे या कतार में रुके जॉब को रद्द करता है; पूरे हो चुके जॉब और उसका परिणाम हटा देता है।"""
+        job = self.get(job_id)
+        if job.finished:
+            self._remove(job_id)
+        elif job.task is not None:
+            job.task.cancel()
+        return job
+
+    async def close(self) -> None:
+        for job_id, job in list(self._jobs.items()):
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+                await asyncio.gather(job.task, return_exceptions=True)
+            self._remove(job_id)
+        await asyncio.gather(*self._deletions, return_exceptions=True)
+
+
+job_queue = InProcessJobQueue()
+
+
+def _jobs_by_status() -> dict:
+    counts = {((("status", status),)): 0 for status in (QUEUED, RUNNING, *FINISHED_STATES)}
+    for job in list(job_queue._jobs.values()):
+        counts[(("status", job.status),)] += 1
+    return counts
+
+
+registry.collector("pdfkaro_jobs", "Async jobs currently known to the queue, by status.", _jobs_by_status)
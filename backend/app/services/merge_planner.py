@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple
+
+from app.core.lazy_imports import lazy_import
+from app.services.metrics import span
+from app.services.pdf_processor import append_page
+from app.services.uploads import open_spooled_pdf
+
+pikepdf = lazy_import("pikepdf")
+
+
+class MergePlanError(ValueError):
+    """pages_data के निर्देश गलत हैं; API इसे 400 के रूप में लौटाती है।"""
+
+
+# (स्रोत का नाम, पेज index, rotation)
+PlanStep = Tuple[str, int, int]
+
+
+def source_name(instruction: dict) -> str:
+    """निर्देश का स्रोत: अपलोड की गई फ़ाइल का नाम, या /documents से खुले दस्तावेज़ के लिए "document:<id>"।"""
+    if "documentId" in instruction:
+        return f"document:{instruction['documentId']}"
+    return instruction["sourceFile"]
+
+
+def plan_merge(page_instructions, available_sources: Iterable[str]) -> List[PlanStep]:
+    """
+    किसी भी PDF को खोलने से पहले निर्देशों की जाँच करता है: ढाँचा, स्रोत का नाम, pageIndex और rotation।
+    पेज index की ऊपरी सीमा स्रोत खुलने पर ही पता चलती है, इसलिए वह जाँच `execute_merge_plan` में होती है।
+    """
+    if not isinstance(page_instructions, list) or not page_instructions:
+        raise MergePlanError("pages_data must be a non-empty list of page instructions.")
+    available = set(available_sources)
+    plan = []
+    for position, instruction in enumerate(page_instructions):
+        if not isinstance(instruction, dict) or not ("sourceFile" in instruction or "documentId" in instruction):
+            raise MergePlanError(f"Instruction {position} must name a sourceFile or documentId.")
+        name = source_name(instruction)
+        if name not in available:
+            raise MergePlanError(f"Instruction {position} refers to unknown source {name!r}.")
+        page_index = instruction.get("pageIndex")
+        if not isinstance(page_index, int) or isinstance(page_index, bool) or page_index < 0:
+            raise MergePlanError(f"Instruction {position} has an invalid pageIndex.")
+        rotation = instruction.get("rotation", 0)
+        if not isinstance(rotation, int) or isinstance(rotation, bool) or rotation % 90 != 0:
+            raise MergePlanError(f"Instruction {position} has an invalid rotation; use a multiple of 90.")
+        plan.append((name, page_index, rotation % 360))
+    return plan
+
+
+def referenced_sources(plan: List[PlanStep]) -> List[str]:
+    """योजना में इस्तेमाल हुए स्रोत, पहली बार आने के क्रम में।"""
+    return list(dict.fromkeys(name for name, _, _ in plan))
+
+
+def execute_merge_plan(file_map: Dict[str, str], plan: List[PlanStep], on_page=None) -> pikepdf.Pdf:
+    """
+    योजना के अनुसार नई PDF बनाता है। हर स्रोत तभी खोला जाता है जब उसका पहला पेज चाहिए, और उसके आख़िरी
+    इस्तेमाल के तुरंत बाद बंद कर दिया जाता है, ताकि एक समय में सिर्फ़ ज़रूरी स्रोत ही खुले रहें।
+    स्रोत पेज कभी नहीं बदलते, इसलिए एक ही पेज को कई बार जोड़ने पर rotation जुड़ता नहीं जाता।
+    """
+    last_use = {name: step for step, (name, _, _) in enumerate(plan)}
+    open_pdfs: Dict[str, pikepdf.Pdf] = {}
+    merged_pdf = pikepdf.Pdf.new()
+    try:
+        for step, (name, page_index, rotation) in enumerate(plan):
+            source_pdf = open_pdfs.get(name)
+            if source_pdf is None:
+                source_pdf = open_pdfs[name] = open_spooled_pdf(file_map[name])
+                _check_page_indexes(name, source_pdf, plan)
+            with span("page_copy"):
+                append_page(merged_pdf, source_pdf.pages[page_index], rotation)
+            if last_use[name] == step:
+                open_pdfs.pop(name).close()
+            if on_page is not None:
+                on_page(step + 1)
+    except BaseException:
+        merged_pdf.close()
+        raise
+    finally:
+        for source_pdf in open_pdfs.values():
+            source_pdf.close()
+    return merged_pdf
+
+
+def _check_page_indexes(name: str, source_pdf: pikepdf.Pdf, plan: List[PlanStep]) -> None:
+    # स्रोत खुलते ही उसके सभी निर्देश जाँचे जाते हैं, ताकि बाक़ी काम से पहले ही त्रुटि मिल जाए
+    page_count = len(source_pdf.pages)
+    for position, (step_name, page_index, _) in enumerate(plan):
+        if step_name == name and page_index >= page_count:
+            raise MergePlanError(
+                f"Instruction {position} asks for page index {page_index} of {name!r}, which has {page_count} pages."
+            )
+
@@ -0,0 +1,257 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTES_BUCKETS = tuple(16 * 1024 * 4 ** i for i in range(9))  # 16 KiB ... 1 GiB
+PAGES_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """Prometheus histogram, labels के हर संयोजन के लिए अलग buckets के साथ।"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Collector:
+    """
+    हर बार /metrics पढ़ते समय `collect()` से मान लेने वाला gauge या counter।
+    `collect()` का key labels के (name, value) जोड़ों का tuple है।
+    """
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]],
+                 kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, value in sorted(self.collect().items()):
+            names = tuple(name for name, _ in labels)
+            values = tuple(value for _, value in labels)
+            lines.append(f"{self.name}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = DURATION_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def collector(self, name: str, documentation: str, collect, kind: str = "gauge") -> Collector:
+        return self.register(Collector(name, documentation, collect, kind))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)।"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # किसी एक collector की त्रुटि से पूरा /metrics बंद न हो
+                continue
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.histogram(
+    "pdfkaro_http_request_duration_seconds", "HTTP request duration until the last body byte is sent.",
+    ("method", "handler", "status"),
+)
+STAGE_DURATION = registry.histogram(
+    "pdfkaro_stage_duration_seconds", "Duration of one processing stage (upload_read, pdf_open, pdf_save, ...).",
+    ("stage",),
+)
+INPUT_BYTES = registry.histogram("pdfkaro_input_bytes", "Size of processed input documents.", ("operation",), BYTES_BUCKETS)
+OUTPUT_BYTES = registry.histogram("pdfkaro_output_bytes", "Size of produced output documents.", ("operation",), BYTES_BUCKETS)
+PAGES = registry.histogram("pdfkaro_pages", "Pages per processed document.", ("operation",), PAGES_BUCKETS)
+COMPRESSION_RATIO = registry.histogram(
+    "pdfkaro_compression_ratio", "Output size divided by input size for compression.", ("operation",), RATIO_BUCKETS,
+)
+
+
+class RequestTimings:
+    """एक अनुरोध के चरणों का कुल समय; एक ही नाम के कई span जुड़ जाते हैं।"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        with self._lock:
+            stages = list(self.stages.items())
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+# वर्कर प्रोसेस में span यहाँ जमा होते हैं और परिणाम के साथ मुख्य प्रोसेस को लौटाए जाते हैं
+_worker_spans: Optional[List[Tuple[str, float]]] = None
+
+
+def record_span(name: str, seconds: float) -> None:
+    if _worker_spans is not None:
+        _worker_spans.append((name, seconds))
+        return
+    STAGE_DURATION.observe(seconds, stage=name)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """किसी चरण का समय मापता है: `with span("pdf_save"): ...`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+def call_with_spans(submitted_at: float, fn: Callable[..., Any], *args: Any) -> Tuple[Any, List[Tuple[str, float]]]:
+    """
+    वर्कर प्रोसेस में चलता है: `fn(*args)` का परिणाम और उसके दौरान दर्ज हुए span लौटाता है।
+    `submitted_at` (time.time()) से पूल की कतार में बीता समय "queue_wait" के रूप में दर्ज होता है।
+    """
+    global _worker_spans
+    _worker_spans = [("queue_wait", max(0.0, time.time() - submitted_at))]
+    try:
+        return fn(*args), _worker_spans
+    finally:
+        _worker_spans = None
+
+
+def observe_document(operation: str, input_bytes: int, output_bytes: int, pages: Optional[int] = None) -> None:
+    """एक प्रोसेस किए गए दस्तावेज़ का आकार, पेज संख्या और (compress के लिए) अनुपात दर्ज करता है।"""
+    INPUT_BYTES.observe(input_bytes, operation=operation)
+    OUTPUT_BYTES.observe(output_bytes, operation=operation)
+    if pages is not None:
+        PAGES.observe(pages, operation=operation)
+    if operation.startswith("compress") and input_bytes:
+        COMPRESSION_RATIO.observe(output_bytes / input_bytes, operation=operation)
+
+
+def _route_template(scope) -> str:
+    """
+    मिले हुए route का पूरा template, जैसे "/api/v1/jobs/{job_id}"। यही label है, ताकि URL में ID जैसे हिस्से
+    labels की संख्या न बढ़ाएँ। नए FastAPI में शामिल router अलग रहते हैं और `scope["route"]` में सिर्फ़ उसके
+    अंदर का path ("/{job_id}") होता है; तब पूरा path FastAPI के route context से लिया जाता है।
+    """
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    template = getattr(context, "path_format", None) or getattr(scope.get("route"), "path_format", None)
+    return template or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    हर HTTP अनुरोध का कुल समय दर्ज करता है और उस समय तक पूरे हुए चरणों को `Server-Timing` हेडर में भेजता है।
+    Pure ASGI middleware है, ताकि स्ट्रीमिंग रिस्पॉन्स का समय भी आख़िरी बाइट तक मापा जा सके।
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        status = {"code": 500, "response_started": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                status["response_started"] = time.perf_counter()
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_timings.reset(token)
+            finished = time.perf_counter()
+            if status["response_started"] is not None:
+                STAGE_DURATION.observe(finished - status["response_started"], stage="response_send")
+            REQUEST_DURATION.observe(
+                finished - timings.started,
+                method=scope["method"],
+                handler=_route_template(scope),
+                status=status["code"],
+            )
@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import re
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.image_compression import find_image_placements, recompressible_images, would_resize
+from app.services.metrics import span
+from app.services.uploads import open_spooled_pdf
+
+pikepdf = lazy_import("pikepdf")
+
+# छवियों के DPI समूह; सीमाएँ compress के स्तरों (72/150/300 DPI) से मेल खाती हैं
+DPI_BUCKETS = [(72, "<=72"), (150, "72-150"), (300, "150-300")]
+# qpdf इसी zlib स्तर पर streams को compress करता है
+_FLATE_LEVEL = 6
+# object stream के लिए इतने ऑब्जेक्ट्स का नमूना लिया जाता है
+_OBJECT_SAMPLE = 2000
+# हर ऑब्जेक्ट के "n 0 obj ... endobj" और xref entry के अनुमानित बाइट्स, जो object stream में नहीं लगते
+_OBJECT_OVERHEAD = 36
+_FONT_FILE_KEYS = ("/FontFile", "/FontFile2", "/FontFile3")
+_EOF_MARKER = re.compile(rb"%%EOF")
+_STARTXREF = re.compile(rb"startxref[ \t\r\n\f\x00]+(\d+)")
+_PREV = re.compile(rb"/Prev[ \t\r\n\f\x00]+(\d+)")
+_XREF_STREAM_HEADER = re.compile(rb"[ \t\r\n\f\x00]*\d+[ \t\r\n\f\x00]+\d+[ \t\r\n\f\x00]+obj\b")
+# फ़ाइल के अंत से इतने बाइट्स में आख़िरी "startxref" खोजा जाता है
+_STARTXREF_WINDOW = 4096
+_OBJECT_HEADER = re.compile(rb"(?<![0-9])(\d{1,10})[ \t\r\n\f\x00]+(\d{1,5})[ \t\r\n\f\x00]+obj\b")
+
+Source = Union[str, bytes]
+
+
+class PdfAnalysis:
+    """
+    `analyze_pdf` का नतीजा: JSON में भेजी जा सकने वाली रिपोर्ट, और दोबारा एन्कोड की जा सकने वाली छवियों
+    की सूची, ताकि compress को content streams दोबारा न पढ़ने पड़ें।
+    """
+
+    def __init__(self, report: dict, images: List[Tuple[pikepdf.Object, float, int]]):
+        self.report = report
+        self.images = images
+
+    @property
+    def rewrite_savings(self) -> int:
+        return self.report["estimates"]["rewrite_savings"]
+
+    def image_savings(self, dpi: int) -> int:
+        """
+        इस DPI पर छवियों से अनुमानित बचत। छोटी की जाने वाली छवि का आकार पिक्सेल की संख्या के अनुपात में
+        घटता माना जाता है; JPEG quality का असर नहीं गिना जाता, इसलिए असली बचत अक्सर इससे ज़्यादा होती है।
+        """
+        saved = 0.0
+        for _, image_dpi, raw_size in self.images:
+            if would_resize(image_dpi, dpi):
+                saved += raw_size * (1 - (dpi / image_dpi) ** 2)
+        return int(saved)
+
+    def expected_savings(self, levels: Dict[str, dict]) -> Dict[str, dict]:
+        """compress के हर स्तर ({"dpi": ..}) पर अनुमानित बचत और आउटपुट का आकार।"""
+        file_size = self.report["file_size"]
+        expected = {}
+        for name, params in levels.items():
+            images = self.image_savings(params["dpi"])
+            rewrite = self.rewrite_savings if images or self.rewrite_worthwhile() else 0
+            expected[name] = {
+                "image_savings": images,
+                "rewrite_savings": rewrite,
+                "estimated_size": max(0, file_size - images - rewrite),
+            }
+        return expected
+
+    def rewrite_worthwhile(self) -> bool:
+        return self.rewrite_savings >= self.report["file_size"] * settings.COMPRESS_MIN_REWRITE_SAVINGS_PERCENT / 100
+
+
+@contextmanager
+def _file_view(source: Source):
+    if isinstance(source, (bytes, bytearray)):
+        yield source
+        return
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+
+
+def _xref_prev(data, offset: int) -> Optional[int]:
+    """
+    `offset` पर शुरू होने वाले xref खंड (तालिका और उसका trailer, या xref stream) का /Prev। खंड न मिले तो
+    ValueError; /Prev न हो (सबसे पुराना खंड) तो None।
+    """
+    if data[offset:offset + 4] == b"xref":
+        start = data.find(b"trailer", offset)
+        end = data.find(b"startxref", start)
+    elif _XREF_STREAM_HEADER.match(data, offset):
+        start = offset
+        end = data.find(b"stream", start)
+    else:
+        raise ValueError(f"no cross-reference section at offset {offset}")
+    if start < 0 or end < 0:
+        raise ValueError(f"truncated cross-reference section at offset {offset}")
+    match = _PREV.search(data, start, end)
+    return int(match.group(1)) if match else None
+
+
+def _count_revisions(data) -> int:
+    """
+    फ़ाइल के अंत के startxref से xref खंडों की /Prev कड़ी पर चलकर revisions गिनता है। linearized फ़ाइल में
+    पहले पेज का xref खंड फ़ाइल की शुरुआत में होता है और उसका /Prev आगे के मुख्य खंड की ओर जाता है; ये दोनों
+    मिलकर एक ही revision हैं, इसलिए आगे की ओर जाने वाली कड़ी नहीं गिनी जाती। कड़ी पढ़ी न जा सके (टूटी फ़ाइल,
+    जिसे qpdf ने दोबारा बनाया) तो %%EOF गिने जाते हैं।
+    """
+    tail = max(0, len(data) - _STARTXREF_WINDOW)
+    position = data.rfind(b"startxref", tail)
+    match = _STARTXREF.match(data, position) if position >= 0 else None
+    try:
+        if match is None:
+            raise ValueError("no startxref at the end of the file")
+        revisions = 0
+        offset: Optional[int] = int(match.group(1))
+        seen = set()
+        while offset is not None and offset not in seen:
+            seen.add(offset)
+            prev = _xref_prev(data, offset)
+            if prev is None or prev < offset:
+                revisions += 1
+            offset = prev
+        return revisions
+    except ValueError:
+        return sum(1 for _ in _EOF_MARKER.finditer(data))
+
+
+def _scan_revisions(data) -> Tuple[int, int, int]:
+    """
+    (revisions, बदले जा चुके ऑब्जेक्ट, उनके बाइट्स)। incremental update में बदला गया ऑब्जेक्ट फ़ाइल के अंत में
+    दोबारा लिखा जाता है पर पुरानी प्रति भी फ़ाइल में रहती है; हर ऑब्जेक्ट की आख़िरी प्रति के अलावा बाक़ी बेकार हैं।
+    ऑब्जेक्ट का आकार अगले ऑब्जेक्ट की शुरुआत तक गिना जाता है, इसलिए यह अनुमान है।
+    """
+    revisions = _count_revisions(data)
+    if revisions <= 1:
+        return revisions, 0, 0
+    sizes: Dict[bytes, int] = {}
+    superseded = 0
+    superseded_bytes = 0
+    key = None
+    start = 0
+    for match in _OBJECT_HEADER.finditer(data):
+        if key is not None:
+            sizes[key] = match.start() - start
+        key = match.group(1) + b" " + match.group(2)
+        start = match.start()
+        if key in sizes:
+            superseded += 1
+            superseded_bytes += sizes[key]
+    return revisions, superseded, superseded_bytes
+
+
+def _filter_name(obj: pikepdf.Stream) -> str:
+    filters = obj.get("/Filter")
+    if filters is None:
+        return "none"
+    if isinstance(filters, pikepdf.Array):
+        return "+".join(str(f) for f in filters) or "none"
+    return str(filters)
+
+
+def _raw_length(obj: pikepdf.Stream) -> int:
+    length = obj.get("/Length")
+    return int(length) if isinstance(length, int) else len(obj.read_raw_bytes())
+
+
+def _dpi_bucket(dpi: Optional[float]) -> str:
+    if not dpi:
+        return "unknown"
+    for limit, name in DPI_BUCKETS:
+        if dpi <= limit:
+            return name
+    return f">{DPI_BUCKETS[-1][0]}"
+
+
+def _recompress_gain(streams: List[pikepdf.Stream], total_bytes: int, decode: bool) -> int:
+    """
+    नमूने के streams को qpdf की तरह दोबारा compress करके पूरे `total_bytes` पर अनुमानित बचत।
+    `decode` होने पर stream पहले zlib से खोला जाता है (flate streams)।
+    """
+    budget = int(settings.ANALYZER_SAMPLE_MB * 1024 * 1024)
+    before = 0
+    after = 0
+    for obj in streams:
+        if before >= budget:
+            break
+        raw = obj.read_raw_bytes()
+        try:
+            data = zlib.decompress(raw) if decode else raw
+        except zlib.error:
+            continue
+        before += len(raw)
+        after += len(zlib.compress(data, _FLATE_LEVEL))
+    if not before:
+        return 0
+    return max(0, int(total_bytes * (before - after) / before))
+
+
+def _object_stream_gain(objects: List[pikepdf.Object], object_count: int) -> int:
+    """object streams के बिना लिखी फ़ाइल में ऑब्जेक्ट्स को object streams में रखने से अनुमानित बचत।"""
+    if not objects:
+        return 0
+    sample = [obj.unparse() for obj in objects]
+    before = sum(len(data) + _OBJECT_OVERHEAD for data in sample)
+    after = len(zlib.compress(b"\n".join(sample), _FLATE_LEVEL))
+    return max(0, int(object_count * (before - after) / len(sample)))
+
+
+def analyze_pdf(pdf: pikepdf.Pdf, source: Source) -> PdfAnalysis:
+    """
+    ऑब्जेक्ट तालिका पर एक बार चलकर PDF की बनावट बताता है: पेज, छवियाँ (filter और DPI के हिसाब से),
+    embedded fonts, एक जैसे streams, incremental updates से बढ़ा आकार और encryption। साथ में अनुमान
+    कि पूरी फ़ाइल दोबारा लिखने (rewrite) से कितनी बचत होगी। `source` वही फ़ाइल (path या बाइट्स) है।
+    stream का डेटा सिर्फ़ एक जैसे आकार वाले streams का hash बनाने और छोटे नमूने के लिए पढ़ा जाता है।
+    """
+    file_size = os.path.getsize(source) if isinstance(source, str) else len(source)
+    stream_bytes = {"flate": 0, "uncompressed": 0, "other": 0}
+    flate_streams: List[pikepdf.Stream] = []
+    uncompressed_streams: List[pikepdf.Stream] = []
+    sizes: Dict[Tuple[int, int], int] = {}
+    by_size: Dict[Tuple[int, str], List[pikepdf.Stream]] = defaultdict(list)
+    image_sizes: Dict[Tuple[int, int], Tuple[int, str]] = {}
+    font_files = set()
+    object_sample: List[pikepdf.Object] = []
+    object_count = 0
+    stream_count = 0
+    object_streams = 0
+
+    with span("analyze_objects"):
+        for obj in pdf.objects:
+            if isinstance(obj, pikepdf.Stream):
+                stream_count += 1
+                object_type = obj.get("/Type")
+                if object_type == pikepdf.Name.ObjStm:
+                    object_streams += 1
+                    continue
+                if object_type == pikepdf.Name.XRef:
+                    continue
+                size = _raw_length(obj)
+                filter_name = _filter_name(obj)
+                sizes[obj.objgen] = size
+                by_size[(size, filter_name)].append(obj)
+                if obj.get("/Subtype") == pikepdf.Name.Image:
+                    image_sizes[obj.objgen] = (size, filter_name)
+                if filter_name == "/FlateDecode":
+                    stream_bytes["flate"] += size
+                    flate_streams.append(obj)
+                elif filter_name == "none":
+                    stream_bytes["uncompressed"] += size
+                    uncompressed_streams.append(obj)
+                else:
+                    stream_bytes["other"] += size
+            else:
+                object_count += 1
+                if isinstance(obj, pikepdf.Dictionary) and obj.get("/Type") == pikepdf.Name.FontDescriptor:
+                    for key in _FONT_FILE_KEYS:
+                        font_file = obj.get(key)
+                        if isinstance(font_file, pikepdf.Stream):
+                            font_files.add(font_file.objgen)
+                if isinstance(obj, (pikepdf.Dictionary, pikepdf.Array)) and len(object_sample) < _OBJECT_SAMPLE:
+                    object_sample.append(obj)
+
+    with span("analyze_duplicates"):
+        duplicate_groups = 0
+        duplicate_copies = 0
+        duplicate_bytes = 0
+        for (size, _), group in by_size.items():
+            if len(group) < 2 or size == 0:
+                continue
+            counts: Dict[bytes, int] = defaultdict(int)
+            for obj in group:
+                counts[hashlib.sha1(obj.read_raw_bytes()).digest()] += 1
+            for count in counts.values():
+                if count > 1:
+                    duplicate_groups += 1
+                    duplicate_copies += count - 1
+                    duplicate_bytes += size * (count - 1)
+
+    images: List[Tuple[pikepdf.Object, float, int]] = []
+    by_filter: Dict[str, int] = defaultdict(int)
+    by_dpi: Dict[str, int] = defaultdict(int)
+    if image_sizes:
+        with span("analyze_images"):
+            placements = find_image_placements(pdf)
+            images = recompressible_images(pdf, placements)
+        for objgen, (size, filter_name) in image_sizes.items():
+            by_filter[filter_name] += size
+            by_dpi[_dpi_bucket(placements.get(objgen))] += size
+
+    with span("analyze_revisions"):
+        with _file_view(source) as data:
+            revisions, superseded, superseded_bytes = _scan_revisions(data)
+
+    with span("analyze_sample"):
+        flate_gain = _recompress_gain(flate_streams, stream_bytes["flate"], decode=True)
+        compress_gain = _recompress_gain(uncompressed_streams, stream_bytes["uncompressed"], decode=False)
+        object_gain = _object_stream_gain(object_sample, object_count) if not object_streams else 0
+
+    encryption = {"encrypted": pdf.is_encrypted}
+    if pdf.is_encrypted:
+        encryption.update(method=pdf.encryption.stream_method.name, bits=pdf.encryption.bits)
+
+    report = {
+        "file_size": file_size,
+        "pdf_version": pdf.pdf_version,
+        "page_count": len(pdf.pages),
+        "linearized": pdf.is_linearized,
+        "encryption": encryption,
+        "objects": {"total": object_count + stream_count, "streams": stream_count, "object_streams": object_streams},
+        "stream_bytes": stream_bytes,
+        "images": {
+            "count": len(image_sizes),
+            "bytes": sum(size for size, _ in image_sizes.values()),
+            "by_filter": dict(by_filter),
+            "by_dpi": dict(by_dpi),
+            "recompressible": len(images),
+            "recompressible_bytes": sum(raw_size for _, _, raw_size in images),
+        },
+        "fonts": {
+            "embedded": len(font_files),
+            "bytes": sum(sizes.get(objgen, 0) for objgen in font_files),
+        },
+        "duplicate_streams": {"groups": duplicate_groups, "extra_copies": duplicate_copies, "bytes": duplicate_bytes},
+        "incremental_updates": {
+            "revisions": revisions,
+            "superseded_objects": superseded,
+            "superseded_bytes": superseded_bytes,
+        },
+        "estimates": {
+            "flate_recompress_savings": flate_gain,
+            "stream_compress_savings": compress_gain,
+            "object_stream_savings": object_gain,
+            "dedup_savings": duplicate_bytes if settings.PDF_DEDUPLICATE else 0,
+            "rewrite_savings": flate_gain + compress_gain + object_gain + superseded_bytes
+                               + (duplicate_bytes if settings.PDF_DEDUPLICATE else 0),
+        },
+    }
+    return PdfAnalysis(report, images)
+
+
+def analyze_pdf_file(pdf_path: str, levels: Dict[str, dict]) -> dict:
+    """वर्कर प्रोसेस में चलता है: रिपोर्ट के साथ compress के हर स्तर पर अनुमानित बचत।"""
+    with open_spooled_pdf(pdf_path) as pdf:
+        analysis = analyze_pdf(pdf, pdf_path)
+        return {**analysis.report, "expected_savings": analysis.expected_savings(levels)}
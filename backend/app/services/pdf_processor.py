@@ -1,55 +1,326 @@
-import pikepdf
-from fastapi import UploadFile
+from __future__ import annotations
+
+import asyncio
 import io
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.metrics import call_with_spans, record_span, registry
+from app.services.uploads import open_spooled_pdf, spool_upload, spooled_uploads
+
+pikepdf = lazy_import("pikepdf")
+
+logger = logging.getLogger(__name__)
+
+
+def append_page(dst: pikepdf.Pdf, page: pikepdf.Page, rotation: int = 0) -> None:
+    """
+    `page` की कॉपी `dst` के अंत में जोड़ता है और उस कॉपी का rotation स्रोत पेज के सापेक्ष सेट करता है।
+    स्रोत पेज नहीं बदलता, और एक ही पेज कई बार जोड़ने पर rotation जुड़ता नहीं जाता।
+    """
+    target = (page.rotation + rotation) % 360
+    dst.pages.append(page)
+    copy = dst.pages[-1]
+    if copy.rotation != target:
+        copy.rotate(target, relative=False)
+
+
+def merge_pdf_files(sources: list[tuple[str, str]]) -> bytes:
+    """
+    वर्कर प्रोसेस में चलता है: डिस्क पर रखी कई PDF फ़ाइलों को एक PDF में मर्ज करता है।
+    """
+    output_pdf = pikepdf.Pdf.new()
+    opened = []
+    for filename, path in sources:
+        try:
+            src_pdf = open_spooled_pdf(path)
+        except pikepdf.PdfError as e:
+            logger.warning(f"Skipping corrupted or invalid PDF: {filename}. Error: {e}")
+            continue
+        output_pdf.pages.extend(src_pdf.pages)
+        opened.append(src_pdf)
+
+    output_buffer = io.BytesIO()
+    output_pdf.save(output_buffer)
+    for src_pdf in opened:
+        src_pdf.close()
+    return output_buffer.getvalue()
+
+
+def compress_pdf_file(path: str) -> bytes:
+    """
+    वर्कर प्रोसेस में चलता है: अप्रयुक्त संसाधन हटाकर PDF को फिर से सेव करता है।
+    """
+    with open_spooled_pdf(path) as pdf:
+        # pikepdf छवियों को कंप्रेस करने और अप्रयुक्त वस्तुओं को हटाने के लिए अनुकूलन कर सकता है
+        pdf.remove_unreferenced_resources()
+
+        output_buffer = io.BytesIO()
+        pdf.save(output_buffer, compress_streams=True, linearize=True)
+        return output_buffer.getvalue()
+
+
+def prime_pdf_libraries() -> int:
+    """
+    मुख्य या वर्कर प्रोसेस में चलता है: pikepdf और PIL को load करता है, और एक छोटा PDF बनाकर दोबारा
+    खोलता है ताकि पहले असली अनुरोध को import और qpdf/JPEG codec की शुरुआती तैयारी का इंतज़ार न करना पड़े।
+    """
+    from PIL import Image
+
+    Image.new("RGB", (8, 8)).save(io.BytesIO(), format="JPEG")
+    buffer = io.BytesIO()
+    with pikepdf.Pdf.new() as pdf:
+        pdf.add_blank_page()
+        pdf.save(buffer, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+    with pikepdf.Pdf.open(io.BytesIO(buffer.getvalue())) as pdf:
+        return len(pdf.pages)
+
+
+def _terminate_workers(executor: ProcessPoolExecutor) -> None:
+    """पूल के सभी वर्कर प्रोसेस तुरंत रोकता है; उनमें चल रहे जॉब `BrokenProcessPool` के साथ ख़त्म होते हैं।"""
+    terminate = getattr(executor, "terminate_workers", None)  # Python 3.14+
+    if terminate is not None:
+        terminate()
+        return
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
 
 class PDFProcessor:
     """
     यह क्लास सभी PDF से संबंधित तर्क को संभालती है।
     API एंडपॉइंट्स से व्यावसायिक तर्क को अलग करने से कोड को बदलना और परीक्षण करना आसान हो जाता है।
     उदाहरण के लिए, यदि आप pikepdf को किसी अन्य लाइब्रेरी से बदलना चाहते हैं, तो आपको केवल इस फ़ाइल को अपडेट करना होगा।
+
+    pikepdf का open/save CPU पर भारी है, इसलिए सारा काम एक साझा प्रोसेस पूल में चलता है
+    ताकि event loop कभी ब्लॉक न हो। कतार भर जाने पर 503 और समय सीमा पार होने पर 504 मिलता है।
+    समय सीमा पार करने वाला या रद्द हुआ जॉब वर्कर में चलता न रहे, इसलिए उसका पूल बदलकर उसके प्रोसेस रोक दिए जाते हैं।
     """
 
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        job_timeout: Optional[float] = None,
+    ):
+        self.max_workers = max_workers or settings.PDF_WORKER_POOL_SIZE or os.cpu_count() or 1
+        self.max_queue = settings.PDF_WORKER_MAX_QUEUE if max_queue is None else max_queue
+        self.job_timeout = settings.PDF_JOB_TIMEOUT_SECONDS if job_timeout is None else job_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        # हर पूल के अधूरे जॉब, और उनमें से वे जिनका इंतज़ार टाइमआउट के बाद छोड़ दिया गया
+        self._futures: Dict[ProcessPoolExecutor, Set[Future]] = {}
+        self._abandoned: Set[Future] = set()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """पूल पहली ज़रूरत पर ही बनाया जाता है।"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    @property
+    def pending_jobs(self) -> int:
+        """चल रहे और कतार में रुके जॉब्स की कुल संख्या।"""
+        return self._pending
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> Tuple[ProcessPoolExecutor, Future]:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            executor = self._executor
+            future = executor.submit(fn, *args)
+            self._futures.setdefault(executor, set()).add(future)
+        future.add_done_callback(partial(self._release, executor))
+        return executor, future
+
+    def _release(self, executor: ProcessPoolExecutor, future: Future) -> None:
+        # स्लॉट तभी खाली होता है जब वर्कर सच में काम ख़त्म कर दे (या रोक दिया जाए),
+        # ताकि टाइमआउट हुए जॉब भी पूल की सीमा में गिने जाएँ।
+        with self._lock:
+            self._pending -= 1
+            self._abandoned.discard(future)
+            futures = self._futures.get(executor)
+            if futures is not None:
+                futures.discard(future)
+                if not futures:
+                    del self._futures[executor]
+
+    def _abandon(self, executor: ProcessPoolExecutor, future: Future) -> None:
+        """
+        टाइमआउट के बाद भी जॉब अपने वर्कर में चलता रहता है। इसलिए नए जॉब एक नए पूल में भेजे जाते हैं, और
+        पुराने पूल के प्रोसेस उसके बाक़ी जॉब पूरे होते ही रोक दिए जाते हैं (`_retire`)।
+        """
+        with self._lock:
+            if future not in self._futures.get(executor, ()):
+                return
+            self._abandoned.add(future)
+            if self._executor is not executor:
+                # पूल पहले से हटाया जा रहा है; उसका `_retire` इस जॉब को भी छोड़ा हुआ मान लेगा
+                return
+            self._executor = None
+        threading.Thread(target=self._retire, args=(executor,), name="pdf-pool-retire", daemon=True).start()
+
+    def _retire(self, executor: ProcessPoolExecutor) -> None:
+        while True:
+            with self._lock:
+                busy = [future for future in self._futures.get(executor, ()) if future not in self._abandoned]
+            if not busy:
+                break
+            wait(busy, timeout=1.0)
+        _terminate_workers(executor)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        `fn(*args)` को प्रोसेस पूल में चलाता है और उसका परिणाम लौटाता है।
+        `fn` मॉड्यूल-स्तर का फ़ंक्शन होना चाहिए और उसके आर्ग्युमेंट pickle होने योग्य।
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server is busy processing other PDFs. Please try again shortly.",
+                    headers={"Retry-After": "5"},
+                )
+            self._pending += 1
+
+        try:
+            executor, future = self._submit(call_with_spans, time.time(), fn, *args)
+        except BrokenProcessPool:
+            self._reset_executor()
+            with self._lock:
+                self._pending -= 1
+            raise HTTPException(status_code=503, detail="PDF worker pool restarted. Please retry.")
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        try:
+            result, spans = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.job_timeout)
+        except asyncio.TimeoutError:
+            # कतार में रुका जॉब बस रद्द हो जाता है; चल रहे जॉब के लिए उसका पूल बदला जाता है
+            if not future.cancel():
+                self._abandon(executor, future)
+            raise HTTPException(status_code=504, detail="PDF processing took too long and was stopped.")
+        except asyncio.CancelledError:
+            # जॉब रद्द हुआ या क्लाइंट चला गया: टाइमआउट की तरह वर्कर भी छोड़ा जाता है, ताकि वह स्लॉट न घेरे रहे
+            if not future.cancel():
+                self._abandon(executor, future)
+            raise
+        except BrokenProcessPool:
+            # किसी खराब PDF से वर्कर क्रैश हुआ हो तो अगले जॉब के लिए नया पूल बनेगा
+            self._reset_executor()
+            raise HTTPException(status_code=500, detail="PDF worker crashed while processing the file.")
+        for name, seconds in spans:
+            record_span(name, seconds)
+        return result
+
+    async def run_ordered(
+        self,
+        fn: Callable[..., Any],
+        arg_tuples: Iterable[tuple],
+        window: Optional[int] = None,
+        return_exceptions: bool = False,
+    ) -> AsyncIterator[Any]:
+        """
+        हर `args` के लिए `fn(*args)` को समानांतर चलाता है और परिणाम उसी क्रम में लौटाता है।
+        एक समय में अधिकतम `window` जॉब ही चलते हैं, ताकि मेमोरी जॉब्स की कुल संख्या पर निर्भर न रहे।
+        """
+        window = window or self.max_workers
+        args_iter = iter(arg_tuples)
+        in_flight: deque = deque()
+
+        def submit_next() -> bool:
+            args = next(args_iter, None)
+            if args is None:
+                return False
+            in_flight.append(asyncio.ensure_future(self.run(fn, *args)))
+            return True
+
+        try:
+            while len(in_flight) < window and submit_next():
+                pass
+            while in_flight:
+                task = in_flight.popleft()
+                try:
+                    result = await task
+                except Exception as e:
+                    if not return_exceptions or isinstance(e, HTTPException):
+                        raise
+                    result = e
+                submit_next()
+                yield result
+        finally:
+            # क्लाइंट के डिस्कनेक्ट होने या त्रुटि पर बाक़ी जॉब रद्द करें
+            for task in in_flight:
+                task.cancel()
+
+    def _reset_executor(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def warm_up(self) -> None:
+        """
+        ऐप शुरू होते समय पूल को तैयार करता है। पहले इसी प्रोसेस में लाइब्रेरी load होती हैं, फिर पूल बनता है,
+        इसलिए fork से बने वर्कर उन्हें पहले से load पाते हैं; हर वर्कर में भी एक बार यही जाँच चलती है
+        (spawn/forkserver पर यही असली warm-up है)।
+        """
+        prime_pdf_libraries()
+        futures = [self.executor.submit(prime_pdf_libraries) for _ in range(self.max_workers)]
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+
+    def shutdown(self) -> None:
+        """ऐप बंद होने पर पूल के सभी प्रोसेस बंद करता है, टाइमआउट के बाद हटाए जा रहे पूल भी।"""
+        with self._lock:
+            retiring = [executor for executor in self._futures if executor is not self._executor]
+        for executor in retiring:
+            _terminate_workers(executor)
+        self._reset_executor()
+
     async def merge_pdfs(self, files: list[UploadFile]) -> bytes:
         """
         कई PDF फाइलों को एक में मर्ज करता है।
         """
-        output_pdf = pikepdf.Pdf.new()
-        
-        for file in files:
-            content = await file.read()
-            # सुनिश्चित करें कि कर्सर शुरुआत में है
-            await file.seek(0) 
-            try:
-                with pikepdf.Pdf.open(io.BytesIO(content)) as src_pdf:
-                    output_pdf.pages.extend(src_pdf.pages)
-            except pikepdf.errors.PdfError as e:
-                # यहाँ खराब PDF के लिए बेहतर त्रुटि प्रबंधन जोड़ें
-                print(f"Skipping corrupted or invalid PDF: {file.filename}. Error: {e}")
-                continue
-
-        # मर्ज की गई PDF को मेमोरी में बाइट्स के रूप में सहेजें
-        output_buffer = io.BytesIO()
-        output_pdf.save(output_buffer)
-        output_buffer.seek(0)
-        
-        return output_buffer.getvalue()
+        async with spooled_uploads(files) as uploads:
+            sources = [(upload.filename, upload.path) for upload in uploads]
+            return await self.run(merge_pdf_files, sources)
 
     async def compress_pdf(self, file: UploadFile, level: int) -> bytes:
         """
         एक PDF फ़ाइल को कंप्रेस करता है।
         (नोट: यह एक सरल कार्यान्वयन है। उन्नत संपीड़न के लिए घोस्टस्क्रिप्ट की आवश्यकता हो सकती है।)
         """
-        content = await file.read()
-        pdf = pikepdf.Pdf.open(io.BytesIO(content))
-        
-        # pikepdf छवियों को कंप्रेस करने और अप्रयुक्त वस्तुओं को हटाने के लिए अनुकूलन कर सकता है
-        pdf.remove_unreferenced_resources()
-        
-        output_buffer = io.BytesIO()
-        pdf.save(output_buffer, compress_streams=True, linearize=True)
-        output_buffer.seek(0)
-        
-        return output_buffer.getvalue()
+        upload = await spool_upload(file)
+        try:
+            return await self.run(compress_pdf_file, upload.path)
+        finally:
+            upload.cleanup()
 
 # सेवा का एक उदाहरण बनाएँ जिसे निर्भरता इंजेक्शन के माध्यम से उपयोग किया जा सकता है
 pdf_processor_service = PDFProcessor()
+
+registry.collector(
+    "pdfkaro_worker_pool_jobs", "Jobs running or queued in the PDF worker pool, and the pool's limits.",
+    lambda: {
+        (("state", "pending"),): pdf_processor_service.pending_jobs,
+        (("state", "workers"),): pdf_processor_service.max_workers,
+        (("state", "capacity"),): pdf_processor_service.max_workers + pdf_processor_service.max_queue,
+    },
+)
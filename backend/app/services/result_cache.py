@@ -0,0 +1,421 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from fastapi import Response
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, StreamingResponse
+
+from app.core.config import settings
+from app.services.metrics import registry
+from app.services.uploads import remove_file
+
+# आउटपुट बनाने का तरीका बदलने पर इसे बढ़ाएँ, ताकि डिस्क पर रखे पुराने परिणाम इस्तेमाल न हों
+_KEY_VERSION = 4
+
+# वे सेटिंग्स जिनसे आउटपुट बदलता है; इनमें से कोई बदले तो पुराने परिणाम की key मेल नहीं खाती
+_OUTPUT_SETTINGS = (
+    "PDF_DEDUPLICATE",
+    "COMPRESS_MIN_REWRITE_SAVINGS_PERCENT",
+    "ANALYZER_SAMPLE_MB",
+    "TARGET_SIZE_TIME_BUDGET_SECONDS",
+)
+
+
+def cache_key(operation: str, input_hashes: Iterable, params) -> str:
+    """
+    इनपुट फ़ाइलों के sha256, सामान्यीकृत (normalized) पैरामीटर और आउटपुट बदलने वाली सेटिंग्स से कैश की
+    key बनाता है। एक ही इनपुट पर एक ही ऑपरेशन की key हमेशा एक जैसी होती है।
+    """
+    payload = json.dumps(
+        {"v": _KEY_VERSION, "op": operation, "inputs": list(input_hashes), "params": params,
+         "settings": {name: getattr(settings, name) for name in _OUTPUT_SETTINGS}},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def etag_for(key: str) -> str:
+    return f'"{key}"'
+
+
+class CachedResult:
+    """
+    कैश में रखा एक परिणाम: media type, अतिरिक्त हेडर और आउटपुट — या तो `data` बाइट्स, या डिस्क पर
+    `path` वाली फ़ाइल। `temporary` फ़ाइल इस परिणाम की अपनी है और भेजे जाने के बाद हटा दी जाती है।
+    """
+
+    def __init__(
+        self,
+        data: Optional[bytes],
+        media_type: str,
+        headers: Optional[Dict[str, str]] = None,
+        path: Optional[str] = None,
+        temporary: bool = False,
+    ):
+        self.data = data
+        self.media_type = media_type
+        self.headers = headers or {}
+        self.path = path
+        self.temporary = temporary
+        self.size = len(data) if data is not None else os.path.getsize(path)
+
+    @classmethod
+    def from_file(cls, path: str, media_type: str, headers: Optional[Dict[str, str]] = None) -> "CachedResult":
+        """वर्कर की लिखी अस्थायी आउटपुट फ़ाइल से परिणाम।"""
+        return cls(None, media_type, headers, path=path, temporary=True)
+
+    def read(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def load(self) -> "CachedResult":
+        """फ़ाइल वाले परिणाम को मेमोरी में पढ़ता है; अस्थायी फ़ाइल उसके बाद हटा दी जाती है।"""
+        if self.data is not None:
+            return self
+        loaded = CachedResult(self.read(), self.media_type, self.headers)
+        self.discard()
+        return loaded
+
+    def discard(self) -> None:
+        if self.temporary:
+            remove_file(self.path)
+
+
+class ResultCache:
+    """
+    merge/split/compress के परिणामों का content-addressed कैश।
+
+    पहला स्तर मेमोरी में LRU है; वैकल्पिक दूसरा स्तर डिस्क पर है, जिसकी भी आकार सीमा है।
+    डिस्क से मिला छोटा परिणाम फिर से मेमोरी में रखा जाता है; `max_memory_item_bytes` से बड़े परिणाम
+    कभी मेमोरी में नहीं आते, वे डिस्क की फ़ाइल से ही भेजे जाते हैं। hit/miss गिनती `stats()` से मिलती है।
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: Optional[int] = None,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: Optional[int] = None,
+        max_memory_item_bytes: Optional[int] = None,
+    ):
+        self.max_memory_bytes = (
+            settings.RESULT_CACHE_MEMORY_MB * 1024 * 1024 if max_memory_bytes is None else max_memory_bytes
+        )
+        self.max_memory_item_bytes = (
+            settings.RESULT_CACHE_MEMORY_ITEM_MB * 1024 * 1024 if max_memory_item_bytes is None else max_memory_item_bytes
+        )
+        self.disk_dir = settings.RESULT_CACHE_DIR if disk_dir is None else disk_dir
+        self.max_disk_bytes = settings.RESULT_CACHE_DISK_MB * 1024 * 1024 if max_disk_bytes is None else max_disk_bytes
+        self._memory: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    # --- मेमोरी स्तर ---
+
+    def _memory_put(self, key: str, result: CachedResult) -> None:
+        size = result.size
+        if result.data is None or size > self.max_memory_item_bytes or size > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old.size
+            self._memory[key] = result
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.size
+
+    def _memory_get(self, key: str) -> Optional[CachedResult]:
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+            return result
+
+    # --- डिस्क स्तर ---
+
+    def _paths(self, key: str):
+        base = os.path.join(self.disk_dir, key)
+        return base + ".bin", base + ".json"
+
+    def _load_disk_index(self) -> None:
+        # सबसे पुरानी इस्तेमाल हुई फ़ाइल पहले, ताकि वही सबसे पहले हटे
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith((".serve", ".tmp")):
+                # पिछली बार चले सर्वर के अधूरे लिखे या भेजे जा रहे snapshot
+                remove_file(os.path.join(self.disk_dir, name))
+            elif name.endswith(".bin"):
+                path = os.path.join(self.disk_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _snapshot(self, path: str, media_type: str, headers: Dict[str, str]) -> CachedResult:
+        """
+        कैश फ़ाइल का hard link, जिसे भेजने के बाद हटाया जाता है। भेजते समय LRU से फ़ाइल हट भी जाए
+        तो यह link बना रहता है। hard link न बन सके तो फ़ाइल कॉपी होती है।
+        """
+        serve_path = f"{path}.{uuid.uuid4().hex}.serve"
+        try:
+            os.link(path, serve_path)
+        except OSError:
+            shutil.copyfile(path, serve_path)
+        return CachedResult(None, media_type, headers, path=serve_path, temporary=True)
+
+    def _disk_put(self, key: str, result: CachedResult) -> CachedResult:
+        """
+        परिणाम डिस्क पर रखता है और भेजने लायक परिणाम लौटाता है। अस्थायी आउटपुट फ़ाइल कॉपी नहीं होती,
+        सीधे कैश डायरेक्टरी में ले जाई जाती है; तब लौटाया गया परिणाम उसका snapshot होता है।
+        """
+        size = result.size
+        if size > self.max_disk_bytes:
+            return result
+        data_path, meta_path = self._paths(key)
+        tmp_path = f"{data_path}.{threading.get_ident()}.tmp"
+        if result.data is not None:
+            with open(tmp_path, "wb") as f:
+                f.write(result.data)
+            served = result
+        else:
+            if result.temporary:
+                shutil.move(result.path, tmp_path)
+            else:
+                shutil.copyfile(result.path, tmp_path)
+            served = self._snapshot(tmp_path, result.media_type, result.headers)
+        with open(meta_path, "w") as f:
+            json.dump({"media_type": result.media_type, "headers": result.headers}, f)
+        os.replace(tmp_path, data_path)
+
+        evicted = []
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._disk_bytes += size
+            while self._disk_bytes > self.max_disk_bytes:
+                old_key, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            for path in self._paths(old_key):
+                remove_file(path)
+        return served
+
+    def _disk_get(self, key: str) -> Optional[CachedResult]:
+        with self._lock:
+            size = self._disk.get(key)
+            if size is None:
+                return None
+            self._disk.move_to_end(key)
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if size > self.max_memory_item_bytes:
+                result = self._snapshot(data_path, meta["media_type"], meta["headers"])
+            else:
+                with open(data_path, "rb") as f:
+                    result = CachedResult(f.read(), meta["media_type"], meta["headers"])
+            os.utime(data_path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+        return result
+
+    # --- सार्वजनिक API ---
+
+    async def get(self, key: str) -> Optional[CachedResult]:
+        result = self._memory_get(key)
+        if result is not None:
+            self.memory_hits += 1
+            return result
+        if self.disk_dir:
+            result = await asyncio.to_thread(self._disk_get, key)
+            if result is not None:
+                self.disk_hits += 1
+                self._memory_put(key, result)
+                return result
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, result: CachedResult) -> CachedResult:
+        """
+        परिणाम कैश में रखता है और वह परिणाम लौटाता है जिसे क्लाइंट को भेजना है। छोटी आउटपुट फ़ाइल
+        मेमोरी में पढ़ ली जाती है; बड़ी फ़ाइल डिस्क कैश में चली जाती है, और डिस्क कैश बंद हो तो बिना
+        कैश हुए उसी अस्थायी फ़ाइल से भेजी जाती है।
+        """
+        if result.data is None and result.size <= self.max_memory_item_bytes:
+            result = await asyncio.to_thread(result.load)
+        self._memory_put(key, result)
+        if self.disk_dir:
+            result = await asyncio.to_thread(self._disk_put, key, result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+def not_modified(key: str, if_none_match: Optional[str]) -> Optional[Response]:
+    """
+    क्लाइंट के पास पहले से यही परिणाम हो (If-None-Match मेल खाए) तो 304 लौटाता है।
+    key इनपुट और पैरामीटर से ही बनती है, इसलिए इसके लिए कैश में एंट्री होना ज़रूरी नहीं।
+    """
+    if not if_none_match:
+        return None
+    etag = etag_for(key)
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    if etag in candidates or f"W/{etag}" in candidates:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def parse_byte_range(http_range: str, size: int) -> Optional[tuple]:
+    """
+    `Range: bytes=...` हेडर से एक ही range का `(start, end)` (end exclusive) निकालता है।
+    कई ranges या न समझ आने वाले हेडर पर None; कोई range फ़ाइल के भीतर न हो तो `ValueError`।
+    """
+    unit, _, spec = http_range.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    first, last = first.strip(), last.strip()
+    if not dash or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # "bytes=-N": आख़िरी N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(size - length, 0), size
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+class BytesRangeResponse(Response):
+    """
+    मेमोरी में रखे परिणाम के लिए `Range` अनुरोध का समर्थन, ताकि फ़ाइल से भेजे गए परिणाम जैसा ही व्यवहार हो।
+    एक ही range का 206 मिलता है; कई ranges या न समझ आने वाला हेडर होने पर पूरा परिणाम (200) भेजा जाता है।
+    """
+
+    def __init__(self, content: bytes, media_type: str, headers: Dict[str, str]):
+        super().__init__(content=content, media_type=media_type, headers={**headers, "Accept-Ranges": "bytes"})
+
+    async def __call__(self, scope, receive, send) -> None:
+        request_headers = Headers(scope=scope)
+        http_range = request_headers.get("range")
+        http_if_range = request_headers.get("if-range")
+        if http_range is not None and (http_if_range is None or http_if_range == self.headers.get("etag")):
+            size = len(self.body)
+            try:
+                byte_range = parse_byte_range(http_range, size)
+            except ValueError:
+                response = Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+                await response(scope, receive, send)
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                self.status_code = 206
+                self.body = self.body[start:end]
+                self.headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+                self.headers["Content-Length"] = str(end - start)
+        await super().__call__(scope, receive, send)
+
+
+class TemporaryFileResponse(FileResponse):
+    """
+    भेजने के बाद फ़ाइल हटा देता है — क्लाइंट बीच में चला जाए या जवाब 416 हो, तब भी।
+    (`FileResponse` का background task ऐसे जवाबों में नहीं चलता।)
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            remove_file(self.path)
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    जवाब ख़त्म होते ही `release` बुलाता है: पूरा भेजा गया हो, बीच में त्रुटि हुई हो, या क्लाइंट body शुरू होने
+    से पहले ही चला गया हो (तब body के generator का `finally` कभी नहीं चलता)।
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+def result_response(key: str, result: CachedResult, filename: str) -> Response:
+    """
+    कैश किए गए (या अभी बने) परिणाम को ETag के साथ डाउनलोड रिस्पॉन्स में बदलता है। फ़ाइल वाला परिणाम
+    टुकड़ों में डिस्क से ही भेजा जाता है (`Content-Length` और `Range` के साथ) और अस्थायी हो तो बाद में हटता है।
+    """
+    headers = {
+        **result.headers,
+        "Content-Disposition": f"attachment; filename={filename}",
+        "ETag": etag_for(key),
+    }
+    if result.data is None:
+        response_class = TemporaryFileResponse if result.temporary else FileResponse
+        return response_class(result.path, media_type=result.media_type, headers=headers)
+    return BytesRangeResponse(result.data, result.media_type, headers)
+
+
+result_cache = ResultCache()
+
+registry.collector(
+    "pdfkaro_result_cache_lookups_total", "Result cache lookups by outcome.",
+    lambda: {
+        (("outcome", "memory_hit"),): result_cache.memory_hits,
+        (("outcome", "disk_hit"),): result_cache.disk_hits,
+        (("outcome", "miss"),): result_cache.misses,
+    },
+    kind="counter",
+)
+registry.collector(
+    "pdfkaro_result_cache_bytes", "Bytes held by each result cache tier.",
+    lambda: {
+        (("tier", "memory"),): result_cache.stats()["memory_bytes"],
+        (("tier", "disk"),): result_cache.stats()["disk_bytes"],
+    },
+)
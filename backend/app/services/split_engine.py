@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import io
+import re
+from typing import Dict, List, Optional, Tuple
+
+from app.core.lazy_imports import lazy_import
+from app.services.metrics import span
+from app.services.uploads import open_spooled_pdf
+
+pikepdf = lazy_import("pikepdf")
+
+# (ZIP में फ़ाइल का नाम, पहला पेज, आख़िरी पेज के बाद वाला पेज)
+Chunk = Tuple[str, int, int]
+
+_MAX_TITLE_LENGTH = 60
+
+
+def _safe_title(title: str) -> str:
+    title = re.sub(r"[^\w\- ]+", "", title, flags=re.UNICODE).strip().replace(" ", "_")
+    return title[:_MAX_TITLE_LENGTH] or "section"
+
+
+def _destination_page(pdf: pikepdf.Pdf, item: pikepdf.OutlineItem) -> Optional[int]:
+    """bookmark किस पेज पर ले जाता है; named destination और GoTo action भी समझता है।"""
+    destination = item.destination
+    if destination is None and item.action is not None and item.action.get("/S") == pikepdf.Name.GoTo:
+        destination = item.action.get("/D")
+    if isinstance(destination, (pikepdf.Name, pikepdf.String)):
+        names = pdf.Root.get("/Names")
+        if names is not None and "/Dests" in names:
+            destination = pikepdf.NameTree(names.Dests).get(str(destination))
+        elif "/Dests" in pdf.Root:
+            destination = pdf.Root.Dests.get("/" + str(destination).lstrip("/"))
+        if isinstance(destination, pikepdf.Dictionary):
+            destination = destination.get("/D")
+    if not isinstance(destination, pikepdf.Array) or len(destination) == 0:
+        return None
+    target = destination[0]
+    if isinstance(target, int):
+        return int(target)
+    try:
+        return pdf.pages.index(pikepdf.Page(target))
+    except (ValueError, TypeError):
+        return None
+
+
+def bookmark_chunks(pdf: pikepdf.Pdf) -> List[Chunk]:
+    """
+    ऊपरी स्तर के हर bookmark से अगले bookmark तक के पेजों का एक हिस्सा।
+    पहले bookmark से पहले के पेज पहले हिस्से में ही जुड़ जाते हैं।
+    """
+    starts: Dict[int, str] = {}
+    with pdf.open_outline() as outline:
+        for item in outline.root:
+            page = _destination_page(pdf, item)
+            if page is not None and page not in starts:
+                starts[page] = item.title or ""
+    if not starts:
+        return []
+    ordered = sorted(starts)
+    titles = [starts[page] for page in ordered]
+    bounds = [0] + ordered[1:] + [len(pdf.pages)]
+    return [
+        (f"{number:02d}_{_safe_title(title)}.pdf", bounds[number - 1], bounds[number])
+        for number, title in enumerate(titles, start=1)
+    ]
+
+
+def page_chunks(page_count: int, pages_per_file: int) -> List[Chunk]:
+    """हर `pages_per_file` पेज की एक फ़ाइल; 1 होने पर पुराने नाम (page_N.pdf) ही रहते हैं।"""
+    if pages_per_file <= 1:
+        return [(f"page_{n + 1}.pdf", n, n + 1) for n in range(page_count)]
+    return [
+        (f"pages_{start + 1}-{min(start + pages_per_file, page_count)}.pdf", start, min(start + pages_per_file, page_count))
+        for start in range(0, page_count, pages_per_file)
+    ]
+
+
+def plan_split(pdf_path: str, pages_per_file: int = 1, by_bookmarks: bool = False) -> List[Chunk]:
+    """वर्कर प्रोसेस में चलता है: PDF को किन हिस्सों में बाँटना है, यह तय करता है।"""
+    with open_spooled_pdf(pdf_path) as pdf:
+        if by_bookmarks:
+            return bookmark_chunks(pdf)
+        return page_chunks(len(pdf.pages), pages_per_file)
+
+
+def _resource_streams(obj, found: Dict[str, int], seen: set) -> None:
+    # /Resources से पहुँचने वाले सभी stream (fonts, images, forms) और उनके कच्चे आकार
+    if isinstance(obj, pikepdf.Object) and obj.is_indirect:
+        key = f"{obj.objgen[0]} {obj.objgen[1]}"
+        if key in seen:
+            return
+        seen.add(key)
+        if isinstance(obj, pikepdf.Stream):
+            found[key] = len(obj.read_raw_bytes())
+    if isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+        for name, value in obj.items():
+            if name not in ("/Parent", "/P"):
+                _resource_streams(value, found, seen)
+    elif isinstance(obj, pikepdf.Array):
+        for value in obj:
+            _resource_streams(value, found, seen)
+
+
+def _kept_resources(resources: pikepdf.Dictionary, kept: Optional[pikepdf.Dictionary]):
+    # स्रोत पेज के resources में से वही entries जो stripped कॉपी (`kept`) में भी बचे हैं
+    for category, entries in resources.items():
+        kept_entries = kept.get(category) if kept is not None else None
+        if isinstance(entries, pikepdf.Dictionary) and isinstance(kept_entries, pikepdf.Dictionary):
+            for name, value in entries.items():
+                if name in kept_entries:
+                    yield value
+
+
+def chunk_resources(pdf: pikepdf.Pdf, start: int, stop: int,
+                    kept_pages: Optional[List[pikepdf.Page]] = None) -> Dict[str, int]:
+    """
+    इस हिस्से के पेज जिन साझा stream को इस्तेमाल करते हैं, स्रोत PDF के objgen से पहचाने हुए।
+    `kept_pages` (stripped आउटपुट के पेज) मिलने पर सिर्फ़ वही resources गिने जाते हैं जो उनमें बचे हैं।
+    """
+    found: Dict[str, int] = {}
+    seen: set = set()
+    for offset, page in enumerate(pdf.pages[start:stop]):
+        resources = page.obj.get("/Resources")
+        if resources is None:
+            continue
+        if kept_pages is None:
+            _resource_streams(resources, found, seen)
+        else:
+            for value in _kept_resources(resources, kept_pages[offset].obj.get("/Resources")):
+                _resource_streams(value, found, seen)
+    return found
+
+
+def split_chunks(pdf_path: str, chunks: List[Chunk], strip_unused: bool = False,
+                 measure: bool = False) -> List[Tuple[bytes, Optional[Dict[str, int]]]]:
+    """
+    वर्कर प्रोसेस में चलता है: स्रोत एक बार खोलकर हर हिस्से की अलग PDF बनाता है।
+
+    `strip_unused` होने पर हर आउटपुट PDF के पेजों से वे fonts/images हटा दिए जाते हैं जिन्हें उनका content
+    stream इस्तेमाल नहीं करता; यह काम सिर्फ़ हिस्से के पेजों की कॉपी पर होता है, पूरे स्रोत पर नहीं। `measure`
+    होने पर हर हिस्से के साथ उसके resource streams भी लौटते हैं, ताकि दोहराव का हिसाब लगाया जा सके।
+    """
+    outputs = []
+    with open_spooled_pdf(pdf_path) as source_pdf:
+        for _, start, stop in chunks:
+            dst = pikepdf.Pdf.new()
+            with span("page_copy"):
+                dst.pages.extend(source_pdf.pages[start:stop])
+            if strip_unused:
+                with span("strip_unused"):
+                    dst.remove_unreferenced_resources()
+            resources = None
+            if measure:
+                resources = chunk_resources(source_pdf, start, stop, list(dst.pages) if strip_unused else None)
+            buffer = io.BytesIO()
+            with span("pdf_save"):
+                dst.save(buffer, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+            outputs.append((buffer.getvalue(), resources))
+    return outputs
+
+
+def batch_chunks(chunks: List[Chunk], pages_per_job: int) -> List[List[Chunk]]:
+    """लगातार हिस्सों को तब तक एक वर्कर जॉब में जोड़ता है जब तक उनके पेज `pages_per_job` न हो जाएँ।"""
+    batches: List[List[Chunk]] = []
+    current: List[Chunk] = []
+    pages = 0
+    for chunk in chunks:
+        current.append(chunk)
+        pages += chunk[2] - chunk[1]
+        if pages >= pages_per_job:
+            batches.append(current)
+            current, pages = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+class DuplicationReport:
+    """
+    सभी आउटपुट फ़ाइलों में एक ही साझा resource के बार-बार लिखे जाने का आकार।
+    आकार स्रोत PDF के कच्चे stream से गिने जाते हैं, इसलिए यह अनुमान है।
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.pages = 0
+        self.output_bytes = 0
+        self.resource_bytes_written = 0
+        self._unique: Dict[str, int] = {}
+
+    def add(self, chunk: Chunk, data: bytes, resources: Optional[Dict[str, int]]) -> None:
+        self.files += 1
+        self.pages += chunk[2] - chunk[1]
+        self.output_bytes += len(data)
+        for key, size in (resources or {}).items():
+            self.resource_bytes_written += size
+            self._unique[key] = size
+
+    def to_dict(self, input_bytes: int, strip_unused: bool) -> dict:
+        unique = sum(self._unique.values())
+        duplicated = self.resource_bytes_written - unique
+        return {
+            "files": self.files,
+            "pages": self.pages,
+            "input_bytes": input_bytes,
+            "output_bytes": self.output_bytes,
+            "strip_unused": strip_unused,
+            "unique_resource_bytes": unique,
+            "resource_bytes_written": self.resource_bytes_written,
+            "duplicated_resource_bytes": duplicated,
+            "duplicated_share_of_output": round(duplicated / self.output_bytes, 4) if self.output_bytes else 0.0,
+        }
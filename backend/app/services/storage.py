@@ -0,0 +1,521 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import time
+import uuid
+from typing import AsyncIterable, Callable, List, Optional, Tuple, Union
+from urllib.parse import quote, urlencode
+
+import aiofiles
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.metrics import span
+from app.services.result_cache import CachedResult
+from app.services.uploads import SpooledUpload, max_upload_bytes
+
+boto3 = lazy_import("boto3")
+botocore_config = lazy_import("botocore.config")
+botocore_exceptions = lazy_import("botocore.exceptions")
+
+# local स्टोर में पुराने objects की सफ़ाई इससे ज़्यादा बार नहीं होती (सेकंड)
+SWEEP_INTERVAL_SECONDS = 60.0
+
+_KEY_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9._\-/]{0,511}")
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._\-]+")
+_MISSING_S3_CODES = {"404", "NoSuchKey", "NotFound", "NoSuchUpload"}
+
+
+def validate_key(key: str) -> str:
+    """key सिर्फ़ सुरक्षित अक्षरों से बनी हो और स्टोर की डायरेक्टरी से बाहर न जा सके।"""
+    if not key or not _KEY_PATTERN.fullmatch(key) or any(part in ("", ".", "..") for part in key.split("/")):
+        raise HTTPException(status_code=400, detail="Invalid storage key.")
+    return key
+
+
+def safe_filename(filename: Optional[str]) -> str:
+    name = _UNSAFE_FILENAME_CHARS.sub("_", os.path.basename(filename or "")).strip("._")
+    return name[:128] or "file"
+
+
+def new_key(prefix: str, filename: Optional[str]) -> str:
+    """
+    `prefix/<uuid>/<filename>`। uuid के कारण key अनुमान नहीं लगाई जा सकती, इसलिए key जानना ही उस
+    object तक पहुँच की अनुमति है; upload और download URLs फिर भी अलग से हस्ताक्षरित और समय-सीमित हैं।
+    """
+    return f"{prefix}/{uuid.uuid4().hex}/{safe_filename(filename)}"
+
+
+def result_key(job_id: str, filename: str) -> str:
+    return f"results/{job_id}/{safe_filename(filename)}"
+
+
+def _object_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"The object is larger than the {settings.MAX_UPLOAD_SIZE_MB} MB upload limit.",
+    )
+
+
+def _not_found() -> HTTPException:
+    return HTTPException(status_code=404, detail="Object not found or it has expired.")
+
+
+def _attachment(filename: str) -> str:
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+def _copy_hashing(src: str, dst: str) -> str:
+    """फ़ाइल को टुकड़ों में कॉपी करता है और साथ-साथ उसका sha256 लौटाता है।"""
+    digest = hashlib.sha256()
+    with open(src, "rb") as source, open(dst, "wb") as out:
+        while chunk := source.read(settings.UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(settings.UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _move_hashing(src: str, dst: str) -> str:
+    """फ़ाइल को (उसी डिस्क पर हो तो बिना कॉपी किए) ले आता है और उसका sha256 लौटाता है।"""
+    shutil.move(src, dst)
+    return _file_sha256(dst)
+
+
+class StoredObject:
+    """स्टोर में लिखा गया object या multipart का एक भाग।"""
+
+    def __init__(self, key: str, size: int, etag: Optional[str] = None):
+        self.key = key
+        self.size = size
+        self.etag = etag
+
+
+class StoredInput(SpooledUpload):
+    """
+    local स्टोर का object, जिसे वर्कर सीधे उसकी जगह से पढ़ता है। यह कॉपी नहीं है, इसलिए `cleanup`
+    कुछ नहीं हटाता; object स्टोर की समय सीमा पर ही हटता है।
+    """
+
+    def cleanup(self) -> None:
+        pass
+
+
+class LocalObjectStore:
+    """
+    डिस्क पर रखा object store, S3 का स्थानीय विकल्प। upload/download URLs इसी API के /storage routes के हैं
+    और HMAC हस्ताक्षर व समय सीमा से सुरक्षित हैं। इनपुट objects वर्कर बिना कॉपी किए सीधे पढ़ता है,
+    और जॉब के परिणाम वर्कर की आउटपुट फ़ाइल को यहाँ ले आकर (move) रखे जाते हैं।
+
+    डायरेक्टरी: `objects/<key>` (डेटा), `meta/<key>` (आकार, sha256, media type), `multipart/<upload_id>/`
+    (अधूरे multipart अपलोड के भाग), `tmp/` (लिखे जा रहे objects) और `signing_secret` (URLs की कुंजी)।
+    """
+
+    def __init__(self, root: Optional[str] = None, secret: Optional[str] = None, url_ttl: Optional[int] = None):
+        self.root = root or settings.STORAGE_LOCAL_DIR or os.path.join(tempfile.gettempdir(), "pdfkaro_storage")
+        self.url_ttl = url_ttl or settings.STORAGE_URL_TTL_SECONDS
+        self.base_url = f"{settings.API_V1_STR}/storage"
+        self._last_sweep = 0.0
+        for name in ("objects", "meta", "multipart", "tmp"):
+            os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        self.secret = (secret or settings.STORAGE_SIGNING_SECRET or self._stored_secret()).encode("utf-8")
+
+    def _stored_secret(self) -> str:
+        """
+        `STORAGE_SIGNING_SECRET` न हो तो कुंजी स्टोर की डायरेक्टरी में रखी जाती है: पहला प्रोसेस उसे बनाता है
+        और बाक़ी (दूसरे worker, restart के बाद) वही पढ़ते हैं, ताकि एक worker का बनाया URL दूसरे पर भी चले।
+        फ़ाइल पहले tmp/ में पूरी लिखकर link की जाती है, इसलिए एक साथ शुरू हुए worker अधूरी कुंजी नहीं पढ़ते।
+        """
+        path = os.path.join(self.root, "signing_secret")
+        if not os.path.exists(path):
+            tmp_path = self._tmp_path()
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_path)
+        with open(path) as f:
+            return f.read().strip()
+
+    def object_path(self, key: str) -> str:
+        return os.path.join(self.root, "objects", validate_key(key))
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, "meta", validate_key(key))
+
+    def _multipart_dir(self, upload_id: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+            raise HTTPException(status_code=404, detail="Upload not found or it has expired.")
+        return os.path.join(self.root, "multipart", upload_id)
+
+    def _tmp_path(self) -> str:
+        return os.path.join(self.root, "tmp", uuid.uuid4().hex)
+
+    # --- हस्ताक्षरित URLs ---
+
+    def _signature(self, method: str, resource: str, expires: int, *extra: str) -> str:
+        message = "\n".join((method, resource, str(expires), *extra)).encode("utf-8")
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def _signed_url(self, method: str, resource: str, **params: str) -> str:
+        expires = int(time.time() + self.url_ttl)
+        signature = self._signature(method, resource, expires, *params.values())
+        query = urlencode({**params, "expires": expires, "signature": signature})
+        return f"{self.base_url}/{quote(resource)}?{query}"
+
+    def verify(self, method: str, resource: str, expires: int, signature: str, *extra: str) -> None:
+        """URL का हस्ताक्षर और समय सीमा जाँचता है; गड़बड़ी पर 403।"""
+        if expires < time.time():
+            raise HTTPException(status_code=403, detail="This link has expired.")
+        if not hmac.compare_digest(self._signature(method, resource, expires, *extra), signature):
+            raise HTTPException(status_code=403, detail="Invalid link signature.")
+
+    def upload_target(self, key: str) -> dict:
+        return {"method": "PUT", "url": self._signed_url("PUT", f"objects/{validate_key(key)}"), "headers": {}}
+
+    def part_target(self, key: str, upload_id: str, part_number: int) -> dict:
+        return {"method": "PUT", "url": self._signed_url("PUT", f"parts/{upload_id}/{part_number}"), "headers": {}}
+
+    def download_url(self, key: str, filename: str) -> str:
+        return self._signed_url("GET", f"objects/{validate_key(key)}", filename=filename)
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self.object_path(key)
+        return path if os.path.exists(path) else None
+
+    # --- लिखना ---
+
+    def _write_meta(self, key: str, size: int, sha256: Optional[str], media_type: str) -> None:
+        path = self._meta_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"size": size, "sha256": sha256, "media_type": media_type}, f)
+
+    def _commit(self, tmp_path: str, key: str, size: int, sha256: Optional[str], media_type: str) -> None:
+        path = self.object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        self._write_meta(key, size, sha256, media_type)
+
+    async def _receive(self, chunks: AsyncIterable[bytes], path: str) -> Tuple[int, str, str]:
+        """body को टुकड़ों में फ़ाइल में लिखता है; आकार, sha256 और md5 (S3 जैसा ETag) लौटाता है।"""
+        limit = max_upload_bytes()
+        sha256, md5 = hashlib.sha256(), hashlib.md5()
+        size = 0
+        try:
+            with span("upload_read"):
+                async with aiofiles.open(path, "wb") as out:
+                    async for chunk in chunks:
+                        size += len(chunk)
+                        if size > limit:
+                            raise _object_too_large()
+                        sha256.update(chunk)
+                        md5.update(chunk)
+                        await out.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return size, sha256.hexdigest(), md5.hexdigest()
+
+    async def write(self, key: str, chunks: AsyncIterable[bytes], media_type: str = "application/pdf") -> StoredObject:
+        tmp_path = self._tmp_path()
+        size, sha256, md5 = await self._receive(chunks, tmp_path)
+        self._commit(tmp_path, key, size, sha256, media_type)
+        return StoredObject(key, size, f'"{md5}"')
+
+    async def create_multipart(self, key: str) -> str:
+        upload_id = uuid.uuid4().hex
+        directory = self._multipart_dir(upload_id)
+        os.makedirs(directory)
+        with open(os.path.join(directory, "upload.json"), "w") as f:
+            json.dump({"key": validate_key(key)}, f)
+        return upload_id
+
+    def _multipart_key(self, upload_id: str) -> str:
+        try:
+            with open(os.path.join(self._multipart_dir(upload_id), "upload.json")) as f:
+                return json.load(f)["key"]
+        except (OSError, ValueError, KeyError):
+            raise HTTPException(status_code=404, detail="Upload not found or it has expired.")
+
+    async def write_part(self, upload_id: str, part_number: int, chunks: AsyncIterable[bytes]) -> StoredObject:
+        key = self._multipart_key(upload_id)
+        tmp_path = self._tmp_path()
+        size, _, md5 = await self._receive(chunks, tmp_path)
+        os.replace(tmp_path, os.path.join(self._multipart_dir(upload_id), str(part_number)))
+        return StoredObject(key, size, f'"{md5}"')
+
+    def _assemble(self, key: str, upload_id: str, parts: List[Tuple[int, str]]) -> StoredObject:
+        """भागों को क्रम से जोड़कर object बनाता है; हर भाग का ETag जाँचा जाता है, ठीक S3 की तरह।"""
+        directory = self._multipart_dir(upload_id)
+        limit = max_upload_bytes()
+        tmp_path = self._tmp_path()
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as out:
+                for part_number, etag in parts:
+                    md5 = hashlib.md5()
+                    try:
+                        part = open(os.path.join(directory, str(part_number)), "rb")
+                    except FileNotFoundError:
+                        raise HTTPException(status_code=400, detail=f"Part {part_number} was not uploaded.")
+                    with part:
+                        while chunk := part.read(settings.UPLOAD_CHUNK_SIZE):
+                            size += len(chunk)
+                            if size > limit:
+                                raise _object_too_large()
+                            md5.update(chunk)
+                            sha256.update(chunk)
+                            out.write(chunk)
+                    if md5.hexdigest() != etag.strip('"'):
+                        raise HTTPException(status_code=400, detail=f"ETag of part {part_number} does not match.")
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._commit(tmp_path, key, size, sha256.hexdigest(), "application/pdf")
+        shutil.rmtree(directory, ignore_errors=True)
+        return StoredObject(key, size)
+
+    async def complete_multipart(self, key: str, upload_id: str, parts: List[Tuple[int, str]]) -> StoredObject:
+        if self._multipart_key(upload_id) != key:
+            raise HTTPException(status_code=404, detail="Upload not found or it has expired.")
+        with span("multipart_assemble"):
+            return await asyncio.to_thread(self._assemble, key, upload_id, parts)
+
+    async def abort_multipart(self, key: str, upload_id: str) -> None:
+        if self._multipart_key(upload_id) == key:
+            shutil.rmtree(self._multipart_dir(upload_id), ignore_errors=True)
+
+    async def put(self, key: str, result: CachedResult, on_progress: Optional[Callable[[int], None]] = None) -> None:
+        """
+        परिणाम को object के रूप में रखता है। वर्कर की अस्थायी आउटपुट फ़ाइल कॉपी नहीं होती, सीधे यहाँ ले
+        आई जाती है; मेमोरी वाले परिणाम टुकड़ों में लिखे जाते हैं।
+        """
+        tmp_path = self._tmp_path()
+        if result.data is None:
+            sha256 = await asyncio.to_thread(_move_hashing if result.temporary else _copy_hashing, result.path, tmp_path)
+            if on_progress is not None:
+                on_progress(result.size)
+        else:
+            chunk_size = settings.UPLOAD_CHUNK_SIZE
+            view = memoryview(result.data)
+            digest = hashlib.sha256()
+            async with aiofiles.open(tmp_path, "wb") as out:
+                for offset in range(0, len(view), chunk_size):
+                    digest.update(view[offset:offset + chunk_size])
+                    await out.write(view[offset:offset + chunk_size])
+                    if on_progress is not None:
+                        on_progress(min(offset + chunk_size, len(view)))
+            sha256 = digest.hexdigest()
+        self._commit(tmp_path, key, result.size, sha256, result.media_type)
+
+    # --- पढ़ना ---
+
+    def stat(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def open_input(self, key: str) -> SpooledUpload:
+        meta = self.stat(key)
+        if meta is None or not os.path.exists(self.object_path(key)):
+            raise _not_found()
+        if meta["size"] > max_upload_bytes():
+            raise _object_too_large()
+        sha256 = meta.get("sha256")
+        if sha256 is None:
+            # पुराने संस्करण ने परिणाम बिना sha256 के रखे थे; एक बार गिनकर metadata में जोड़ दिया जाता है
+            sha256 = await asyncio.to_thread(_file_sha256, self.object_path(key))
+            self._write_meta(key, meta["size"], sha256, meta["media_type"])
+        return StoredInput(os.path.basename(key), self.object_path(key), meta["size"], sha256)
+
+    # --- हटाना ---
+
+    async def delete(self, key: str) -> None:
+        for path in (self.object_path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _sweep_tree(self, top: str, cutoff: float) -> None:
+        for directory, _, filenames in os.walk(top):
+            for name in filenames:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def sweep(self) -> None:
+        """`STORAGE_OBJECT_TTL_SECONDS` से पुराने objects, अधूरे multipart अपलोड और बची अस्थायी फ़ाइलें हटाता है।"""
+        now = time.time()
+        if now - self._last_sweep < SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        cutoff = now - settings.STORAGE_OBJECT_TTL_SECONDS
+        for name in ("objects", "meta", "tmp"):
+            self._sweep_tree(os.path.join(self.root, name), cutoff)
+        multipart_root = os.path.join(self.root, "multipart")
+        for upload_id in os.listdir(multipart_root):
+            directory = os.path.join(multipart_root, upload_id)
+            try:
+                if os.path.getmtime(directory) < cutoff:
+                    shutil.rmtree(directory, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+
+class S3ObjectStore:
+    """
+    S3 या S3-संगत (MinIO, R2) bucket। upload/download URLs सीधे bucket के presigned URLs हैं, इसलिए
+    अपलोड और परिणाम के डाउनलोड API प्रोसेस से होकर नहीं गुज़रते; प्रोसेसिंग के लिए इनपुट सिर्फ़ एक बार
+    वर्कर की डिस्क पर आता है। पुराने objects bucket के lifecycle नियम से हटने चाहिए, और ब्राउज़र से
+    multipart अपलोड के लिए bucket की CORS नीति में `ETag` हेडर expose होना चाहिए।
+    """
+
+    def __init__(self, bucket: Optional[str] = None, client=None, url_ttl: Optional[int] = None):
+        self.bucket = bucket or settings.S3_BUCKET_NAME
+        if not self.bucket:
+            raise RuntimeError("STORAGE_BACKEND is 's3' but S3_BUCKET_NAME is not set.")
+        self.url_ttl = url_ttl or settings.STORAGE_URL_TTL_SECONDS
+        self.client = client or boto3.client(
+            "s3",
+            region_name=settings.AWS_REGION,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            config=botocore_config.Config(signature_version="s3v4"),
+        )
+
+    def _presign(self, operation: str, **params) -> str:
+        return self.client.generate_presigned_url(
+            operation, Params={"Bucket": self.bucket, **params}, ExpiresIn=self.url_ttl
+        )
+
+    def upload_target(self, key: str) -> dict:
+        url = self._presign("put_object", Key=validate_key(key), ContentType="application/pdf")
+        return {"method": "PUT", "url": url, "headers": {"Content-Type": "application/pdf"}}
+
+    def part_target(self, key: str, upload_id: str, part_number: int) -> dict:
+        url = self._presign("upload_part", Key=validate_key(key), UploadId=upload_id, PartNumber=part_number)
+        return {"method": "PUT", "url": url, "headers": {}}
+
+    def download_url(self, key: str, filename: str) -> str:
+        return self._presign("get_object", Key=validate_key(key), ResponseContentDisposition=_attachment(filename))
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    async def _call(self, operation: str, **params):
+        """boto3 का blocking call thread में; object या अपलोड न मिले तो 404।"""
+        try:
+            return await asyncio.to_thread(getattr(self.client, operation), Bucket=self.bucket, **params)
+        except botocore_exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in _MISSING_S3_CODES:
+                raise _not_found()
+            raise
+
+    async def create_multipart(self, key: str) -> str:
+        response = await self._call("create_multipart_upload", Key=validate_key(key), ContentType="application/pdf")
+        return response["UploadId"]
+
+    async def complete_multipart(self, key: str, upload_id: str, parts: List[Tuple[int, str]]) -> StoredObject:
+        await self._call(
+            "complete_multipart_upload", Key=validate_key(key), UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": number, "ETag": etag} for number, etag in parts]},
+        )
+        head = await self._call("head_object", Key=key)
+        return StoredObject(key, head["ContentLength"], head.get("ETag"))
+
+    async def abort_multipart(self, key: str, upload_id: str) -> None:
+        await self._call("abort_multipart_upload", Key=validate_key(key), UploadId=upload_id)
+
+    async def put(self, key: str, result: CachedResult, on_progress: Optional[Callable[[int], None]] = None) -> None:
+        with span("storage_put"):
+            if result.data is None:
+                await asyncio.to_thread(
+                    self.client.upload_file, result.path, self.bucket, validate_key(key),
+                    ExtraArgs={"ContentType": result.media_type},
+                )
+                result.discard()
+            else:
+                await self._call("put_object", Key=validate_key(key), Body=result.data, ContentType=result.media_type)
+        if on_progress is not None:
+            on_progress(result.size)
+
+    def _download(self, key: str, path: str) -> Tuple[int, str]:
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "wb") as out:
+            for chunk in body.iter_chunks(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_upload_bytes():
+                    raise _object_too_large()
+                digest.update(chunk)
+                out.write(chunk)
+        return size, digest.hexdigest()
+
+    async def open_input(self, key: str) -> SpooledUpload:
+        """object को अस्थायी फ़ाइल में उतारता है (sha256 साथ-साथ); फ़ाइल `cleanup` पर हटती है।"""
+        head = await self._call("head_object", Key=validate_key(key))
+        if head["ContentLength"] > max_upload_bytes():
+            raise _object_too_large()
+        fd, path = tempfile.mkstemp(suffix=".pdf", prefix="upload_", dir=settings.UPLOAD_SPOOL_DIR)
+        os.close(fd)
+        try:
+            with span("storage_get"):
+                size, sha256 = await asyncio.to_thread(self._download, key, path)
+        except BaseException:
+            os.remove(path)
+            raise
+        return SpooledUpload(os.path.basename(key), path, size, sha256)
+
+    async def delete(self, key: str) -> None:
+        await self._call("delete_object", Key=validate_key(key))
+
+    def sweep(self) -> None:
+        """S3 पर पुराने objects bucket का lifecycle नियम हटाता है।"""
+
+
+ObjectStore = Union[LocalObjectStore, S3ObjectStore]
+
+_object_store: Optional[ObjectStore] = None
+
+
+def get_object_store() -> ObjectStore:
+    """`STORAGE_BACKEND` के अनुसार स्टोर; पहली ज़रूरत पर ही बनता है (डायरेक्टरी या S3 client)।"""
+    global _object_store
+    if _object_store is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _object_store = S3ObjectStore()
+        elif settings.STORAGE_BACKEND == "local":
+            _object_store = LocalObjectStore()
+        else:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND {settings.STORAGE_BACKEND!r}; use 'local' or 's3'.")
+    return _object_store
@@ -0,0 +1,101 @@
+import io
+from typing import List, Tuple
+
+from app.core.config import settings
+from app.services.metrics import span
+from app.services.uploads import open_spooled_pdf
+
+# अनुरोध का format -> (Pillow format, media type)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+
+
+class ThumbnailUnavailable(RuntimeError):
+    """सर्वर पर pdf2image या poppler उपलब्ध नहीं है; API इसे 503 के रूप में लौटाती है।"""
+
+
+def parse_page_ranges(spec: str, page_count: int) -> List[int]:
+    """
+    "1-4,9,12-" जैसे 1 से शुरू होने वाले पेज नंबरों को 0 से शुरू होने वाले index में बदलता है
+    (merge/split के pageIndex की तरह)। "all" का मतलब सभी पेज। क्रम बना रहता है, दोहराव हट जाता है।
+    """
+    indexes: List[int] = []
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    if not parts:
+        raise ValueError("pages must name at least one page, e.g. '1-4,9'.")
+    for part in parts:
+        try:
+            if part.lower() == "all":
+                first, last = 1, page_count
+            elif "-" in part:
+                start, _, stop = part.partition("-")
+                first = int(start) if start.strip() else 1
+                last = int(stop) if stop.strip() else page_count
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f"Invalid page range {part!r}; use page numbers like '1-4,9'.")
+        if first < 1 or last > page_count or first > last:
+            raise ValueError(f"Page range {part!r} is outside 1-{page_count}.")
+        indexes.extend(range(first - 1, last))
+    return list(dict.fromkeys(indexes))
+
+
+def page_runs(indexes: List[int], pages_per_job: int) -> List[Tuple[int, int]]:
+    """
+    index को लगातार पेजों के (पहला, आख़िरी) समूहों में बाँटता है, हर समूह में अधिकतम `pages_per_job` पेज।
+    poppler एक बार में पूरा समूह render करता है, इसलिए हर पेज के लिए अलग प्रोसेस नहीं चलता।
+    """
+    runs: List[Tuple[int, int]] = []
+    for index in indexes:
+        if runs and index == runs[-1][1] + 1 and index - runs[-1][0] < pages_per_job:
+            runs[-1] = (runs[-1][0], index)
+        else:
+            runs.append((index, index))
+    return runs
+
+
+def count_pages(pdf_path: str) -> int:
+    """वर्कर प्रोसेस में चलता है।"""
+    with open_spooled_pdf(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def render_thumbnails(pdf_path: str, first: int, last: int, width: int,
+                      fmt: str, quality: int) -> List[Tuple[bytes, int, int]]:
+    """
+    वर्कर प्रोसेस में चलता है: `first` से `last` (0 से शुरू) तक के पेज `width` चौड़ाई पर render करके
+    हर पेज के लिए (छवि बाइट्स, चौड़ाई, ऊँचाई) लौटाता है। ऊँचाई पेज के अनुपात से तय होती है।
+    """
+    try:
+        from pdf2image import convert_from_path
+        from pdf2image.exceptions import PDFInfoNotInstalledError, PopplerNotInstalledError
+    except ImportError:
+        raise ThumbnailUnavailable("Thumbnail rendering is not available on this server.")
+
+    pil_format, _ = THUMBNAIL_FORMATS[fmt]
+    try:
+        with span("thumbnail_render"):
+            images = convert_from_path(
+                pdf_path, first_page=first + 1, last_page=last + 1, size=(width, None),
+                timeout=int(settings.PDF_JOB_TIMEOUT_SECONDS),
+            )
+    except (PDFInfoNotInstalledError, PopplerNotInstalledError):
+        raise ThumbnailUnavailable("Thumbnail rendering is not available on this server.")
+
+    outputs = []
+    with span("thumbnail_encode"):
+        for image in images:
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            if pil_format == "WEBP":
+                image.save(buffer, pil_format, quality=quality, method=4)
+            else:
+                image.save(buffer, pil_format, quality=quality, optimize=True, progressive=True)
+            outputs.append((buffer.getvalue(), image.width, image.height))
+            image.close()
+    return outputs
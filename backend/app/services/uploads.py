@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Optional
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.core.lazy_imports import lazy_import
+from app.services.metrics import span
+
+pikepdf = lazy_import("pikepdf")
+
+
+class SpooledUpload:
+    """
+    डिस्क पर सहेजी गई एक अपलोड फ़ाइल।
+    वर्कर प्रोसेस को बाइट्स की जगह सिर्फ़ `path` भेजा जाता है।
+    """
+
+    def __init__(self, filename: str, path: str, size: int, sha256: str):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def cleanup(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def max_upload_bytes() -> int:
+    return settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+
+
+def _too_large(filename: str) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"{filename} is larger than the {settings.MAX_UPLOAD_SIZE_MB} MB upload limit.",
+    )
+
+
+async def spool_upload(file: UploadFile, max_bytes: Optional[int] = None) -> SpooledUpload:
+    """
+    अपलोड को टुकड़ों (chunks) में एक अस्थायी फ़ाइल में लिखता है।
+    आकार की सीमा लिखते समय ही जाँची जाती है, इसलिए बड़ी फ़ाइल कभी पूरी मेमोरी में नहीं आती।
+    """
+    limit = max_upload_bytes() if max_bytes is None else max_bytes
+    if file.size is not None and file.size > limit:
+        raise _too_large(file.filename)
+
+    fd, path = tempfile.mkstemp(suffix=".pdf", prefix="upload_", dir=settings.UPLOAD_SPOOL_DIR)
+    os.close(fd)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with span("upload_read"):
+            async with aiofiles.open(path, "wb") as out:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > limit:
+                        raise _too_large(file.filename)
+                    digest.update(chunk)
+                    await out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    finally:
+        await file.close()
+
+    return SpooledUpload(file.filename, path, size, digest.hexdigest())
+
+
+async def spool_uploads(files: List[UploadFile], max_bytes: Optional[int] = None) -> List[SpooledUpload]:
+    """
+    कई अपलोड को डिस्क पर लिखता है। बीच में त्रुटि होने पर पहले से लिखी फ़ाइलें हटा दी जाती हैं;
+    सफल होने पर फ़ाइलें हटाने की ज़िम्मेदारी कॉल करने वाले की है।
+    """
+    uploads: List[SpooledUpload] = []
+    try:
+        for file in files:
+            uploads.append(await spool_upload(file, max_bytes))
+    except BaseException:
+        for upload in uploads:
+            upload.cleanup()
+        raise
+    return uploads
+
+
+@asynccontextmanager
+async def spooled_uploads(files: List[UploadFile], max_bytes: Optional[int] = None):
+    """
+    कई अपलोड को डिस्क पर लिखता है और ब्लॉक ख़त्म होते ही अस्थायी फ़ाइलें हटा देता है।
+    """
+    uploads = await spool_uploads(files, max_bytes)
+    try:
+        yield uploads
+    finally:
+        for upload in uploads:
+            upload.cleanup()
+
+
+def spool_output_path(suffix: str = ".pdf") -> str:
+    """
+    वर्कर के आउटपुट के लिए अस्थायी फ़ाइल। वर्कर PDF सीधे इसी में लिखता है, ताकि पूरा आउटपुट
+    न तो वर्कर से मुख्य प्रोसेस तक pickle होकर आए और न ही भेजने से पहले मेमोरी में रहे।
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="output_", dir=settings.UPLOAD_SPOOL_DIR)
+    os.close(fd)
+    return path
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def output_file(suffix: str = ".pdf"):
+    """
+    `spool_output_path` की फ़ाइल देता है। ब्लॉक में त्रुटि हो तो फ़ाइल हटा दी जाती है; सफल होने पर
+    उसे हटाने की ज़िम्मेदारी कॉल करने वाले (आमतौर पर `CachedResult`) की है।
+    """
+    path = spool_output_path(suffix)
+    try:
+        yield path
+    except BaseException:
+        remove_file(path)
+        raise
+
+
+def open_spooled_pdf(path: str) -> pikepdf.Pdf:
+    """
+    वर्कर प्रोसेस में PDF को memory-mapped फ़ाइल के रूप में खोलता है,
+    ताकि फ़ाइल का डेटा प्रोसेस की अपनी मेमोरी में कॉपी न हो।
+    """
+    with span("pdf_open"):
+        return pikepdf.Pdf.open(path, access_mode=pikepdf.AccessMode.mmap)
@@ -0,0 +1,142 @@
+import asyncio
+import struct
+import time
+import zlib
+import zipfile
+from typing import AsyncIterator, Iterable, Iterator, List, Tuple
+
+_ZIP32_MAX = 0xFFFFFFFF
+_ZIP16_MAX = 0xFFFF
+# इन सीमाओं के पार offsets और सदस्यों की गिनती ZIP64 रिकॉर्ड में लिखी जाती है
+_ZIP64_OFFSET_LIMIT = _ZIP32_MAX
+_ZIP64_COUNT_LIMIT = _ZIP16_MAX
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+
+class _Entry:
+    def __init__(self, name: bytes, method: int, dos_time: int, dos_date: int, offset: int):
+        self.name = name
+        self.method = method
+        self.dos_time = dos_time
+        self.dos_date = dos_date
+        self.offset = offset
+        self.crc = 0
+        self.compressed_size = 0
+        self.size = 0
+
+
+class ZipStreamWriter:
+    """
+    बिना seek किए ZIP बनाता है: हर सदस्य का डेटा बनते ही बाइट्स के रूप में लौटा दिया जाता है।
+    आकार और CRC हर सदस्य के बाद data descriptor में लिखे जाते हैं, और central directory अंत में।
+    मेमोरी में सिर्फ़ हर सदस्य की छोटी-सी एंट्री रहती है, डेटा नहीं।
+    """
+
+    def __init__(self, compression: int = zipfile.ZIP_DEFLATED, compresslevel: int = 6):
+        if compression not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise ValueError("Only ZIP_STORED and ZIP_DEFLATED are supported")
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self._entries: List[_Entry] = []
+        self._offset = 0
+
+    def _emit(self, data: bytes) -> bytes:
+        self._offset += len(data)
+        return data
+
+    def add(self, name: str, data: bytes) -> Iterator[bytes]:
+        """एक पूरा सदस्य (जिसका डेटा पहले से मेमोरी में है) जोड़ता है।"""
+        return self.add_chunks(name, (data,))
+
+    def add_chunks(self, name: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """एक सदस्य जोड़ता है जिसका डेटा टुकड़ों में आता है।"""
+        year, month, day, hour, minute, second = time.localtime()[:6]
+        entry = _Entry(
+            name=name.encode("utf-8"),
+            method=self.compression,
+            dos_time=(hour << 11) | (minute << 5) | (second // 2),
+            dos_date=(max(year, 1980) - 1980) << 9 | (month << 5) | day,
+            offset=self._offset,
+        )
+        self._entries.append(entry)
+
+        yield self._emit(struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50, 20, _FLAG_DATA_DESCRIPTOR | _FLAG_UTF8, entry.method,
+            entry.dos_time, entry.dos_date, 0, 0, 0, len(entry.name), 0,
+        ) + entry.name)
+
+        compressor = (
+            zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+            if entry.method == zipfile.ZIP_DEFLATED else None
+        )
+        for chunk in chunks:
+            if not chunk:
+                continue
+            entry.crc = zlib.crc32(chunk, entry.crc)
+            entry.size += len(chunk)
+            out = compressor.compress(chunk) if compressor else chunk
+            if out:
+                entry.compressed_size += len(out)
+                yield self._emit(out)
+        if compressor:
+            out = compressor.flush()
+            entry.compressed_size += len(out)
+            yield self._emit(out)
+
+        if entry.size > _ZIP32_MAX or entry.compressed_size > _ZIP32_MAX:
+            raise ValueError(f"Archive member {name} is larger than 4 GB")
+        yield self._emit(struct.pack("<IIII", 0x08074B50, entry.crc, entry.compressed_size, entry.size))
+
+    def finish(self) -> Iterator[bytes]:
+        """central directory और end records लिखता है (ज़रूरत पड़ने पर ZIP64)।"""
+        cd_offset = self._offset
+        for entry in self._entries:
+            extra = b""
+            offset = entry.offset
+            version = 20
+            if offset > _ZIP64_OFFSET_LIMIT:
+                extra = struct.pack("<HHQ", 0x0001, 8, offset)
+                offset = _ZIP32_MAX
+                version = 45
+            yield self._emit(struct.pack(
+                "<IHHHHHHIIIHHHHHII",
+                0x02014B50, 0x0300 | version, version, _FLAG_DATA_DESCRIPTOR | _FLAG_UTF8, entry.method,
+                entry.dos_time, entry.dos_date, entry.crc, entry.compressed_size, entry.size,
+                len(entry.name), len(extra), 0, 0, 0, 0o100644 << 16, offset,
+            ) + entry.name + extra)
+        cd_size = self._offset - cd_offset
+        count = len(self._entries)
+
+        if count > _ZIP64_COUNT_LIMIT or cd_offset > _ZIP64_OFFSET_LIMIT or cd_size > _ZIP64_OFFSET_LIMIT:
+            zip64_end_offset = self._offset
+            yield self._emit(struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset,
+            ))
+            yield self._emit(struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1))
+            count = min(count, _ZIP16_MAX)
+            cd_size = min(cd_size, _ZIP32_MAX)
+            cd_offset = min(cd_offset, _ZIP32_MAX)
+
+        yield self._emit(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0))
+
+
+async def stream_zip(
+    members: AsyncIterator[Tuple[str, bytes]], compression: int = zipfile.ZIP_DEFLATED
+) -> AsyncIterator[bytes]:
+    """
+    (नाम, डेटा) जोड़ों के async iterator से ZIP बाइट्स बनाता है,
+    ताकि हर सदस्य तैयार होते ही `StreamingResponse` में भेजा जा सके।
+    deflate थ्रेड पूल में होता है ताकि बड़ा सदस्य event loop को न रोके।
+    """
+    writer = ZipStreamWriter(compression)
+    async for name, data in members:
+        if compression == zipfile.ZIP_DEFLATED:
+            chunks = await asyncio.to_thread(lambda: list(writer.add(name, data)))
+        else:
+            chunks = writer.add(name, data)
+        for chunk in chunks:
+            yield chunk
+    for chunk in writer.finish():
+        yield chunk
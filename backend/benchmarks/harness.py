@@ -0,0 +1,126 @@
+"""Timing, percentile and peak-RSS measurement shared by the benchmark cases."""
+import asyncio
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class RSSSampler:
+    """
+    Samples the resident set size of this process plus the PDF worker pool on a
+    background thread and keeps the peak. Without /proc (non-Linux) it falls back
+    to getrusage, which only reports the lifetime peak of this process.
+    """
+
+    def __init__(self, worker_pids: Callable[[], Iterable[int]] = lambda: (), interval: float = 0.01):
+        self.worker_pids = worker_pids
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> int:
+        return _rss(os.getpid()) + sum(_rss(pid) for pid in list(self.worker_pids()))
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RSSSampler":
+        if os.path.exists("/proc/self/statm"):
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        else:
+            scale = 1 if sys.platform == "darwin" else 1024
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+async def measure(
+    name: str,
+    operation: Callable[[], Awaitable[int]],
+    iterations: int,
+    warmup: int,
+    input_bytes: int,
+    worker_pids: Callable[[], Iterable[int]] = lambda: (),
+) -> dict:
+    """
+    Run `operation` `warmup` + `iterations` times. The operation returns the number of
+    output bytes so the result can be sanity-checked between runs.
+    """
+    for _ in range(warmup):
+        await operation()
+    latencies = []
+    output_bytes = 0
+    with RSSSampler(worker_pids) as sampler:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            output_bytes = await operation()
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    return {
+        "name": name,
+        "iterations": iterations,
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "latency_ms": {
+            "min": min(latencies) * 1000,
+            "p50": percentile(latencies, 50) * 1000,
+            "p90": percentile(latencies, 90) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+        },
+        "throughput": {
+            "ops_per_s": iterations / elapsed if elapsed else 0.0,
+            "input_mb_per_s": input_bytes * iterations / elapsed / 1e6 if elapsed else 0.0,
+        },
+        "peak_rss_mb": sampler.peak / 1e6,
+    }
+
+
+def in_thread(fn: Callable[[], int]) -> Callable[[], Awaitable[int]]:
+    """Wrap a blocking core function so it can be measured like an endpoint."""
+    async def operation() -> int:
+        return await asyncio.to_thread(fn)
+    return operation
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
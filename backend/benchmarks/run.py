@@ -0,0 +1,254 @@
+"""
+Benchmarks for the merge, split and compress hot paths.
+
+Run from backend/:
+
+    python -m benchmarks.run                          # every case, default corpora
+    python -m benchmarks.run --cases compress --scale 0.5 --iterations 3
+    python -m benchmarks.run --output new.json --compare baseline.json
+
+Endpoint cases drive the real FastAPI app through an in-process ASGI client,
+so routing, multipart parsing, spooling and the worker pool are all included.
+Core cases call the functions behind the routes directly. The result cache is
+disabled unless --with-cache is given, otherwise repeated iterations would only
+measure cache hits.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.harness import environment, in_thread, measure  # noqa: E402
+from benchmarks.synthetic import CORPORA, build_corpus  # noqa: E402
+
+DEFAULT_OUTPUT_DIR = BACKEND_DIR / "benchmarks" / "results"
+# Slower than this relative to the baseline p50 is flagged in --compare output
+REGRESSION_THRESHOLD = 1.10
+
+Corpus = List[Tuple[str, bytes]]
+
+
+def _size(corpus: Corpus) -> int:
+    return sum(len(data) for _, data in corpus)
+
+
+def _merge_instructions(corpus: Corpus) -> list:
+    from pikepdf import Pdf
+
+    instructions = []
+    for filename, data in corpus:
+        with Pdf.open(io.BytesIO(data)) as pdf:
+            instructions += [{"sourceFile": filename, "pageIndex": i} for i in range(len(pdf.pages))]
+    return instructions
+
+
+class Cases:
+    """Every benchmark case; each returns an async operation for the harness to time."""
+
+    def __init__(self, client, workdir: str):
+        self.client = client
+        self.workdir = workdir
+
+    def _spool(self, corpus: Corpus) -> Dict[str, str]:
+        paths = {}
+        for filename, data in corpus:
+            path = os.path.join(self.workdir, filename)
+            with open(path, "wb") as f:
+                f.write(data)
+            paths[filename] = path
+        return paths
+
+    # --- endpoints ---
+
+    def endpoint_merge(self, corpus: Corpus):
+        files = [("files", (filename, data, "application/pdf")) for filename, data in corpus]
+        pages_data = json.dumps(_merge_instructions(corpus))
+
+        async def operation() -> int:
+            response = await self.client.post("/api/v1/merge/", files=files, data={"pages_data": pages_data})
+            response.raise_for_status()
+            return len(response.content)
+        return operation
+
+    def endpoint_split_all(self, corpus: Corpus):
+        filename, data = corpus[0]
+
+        async def operation() -> int:
+            response = await self.client.post("/api/v1/split/", files={"file": (filename, data, "application/pdf")},
+                                              data={"pages_to_extract": "[]"})
+            response.raise_for_status()
+            return len(response.content)
+        return operation
+
+    def endpoint_compress(self, corpus: Corpus):
+        files = [("files", (filename, data, "application/pdf")) for filename, data in corpus]
+
+        async def operation() -> int:
+            response = await self.client.post("/api/v1/compress/", files=files, data={"level": "medium"})
+            response.raise_for_status()
+            return len(response.content)
+        return operation
+
+    # --- core functions ---
+
+    def core_merge(self, corpus: Corpus):
+        from api.routes.merge import merge_pages
+        from app.services.merge_planner import plan_merge
+
+        file_map = self._spool(corpus)
+        plan = plan_merge(_merge_instructions(corpus), file_map)
+        return in_thread(lambda: merge_pages(file_map, plan, io.BytesIO()))
+
+    def core_split_all(self, corpus: Corpus):
+        from api.routes.split import split_all_pages
+
+        path = self._spool(corpus[:1])[corpus[0][0]]
+
+        async def operation() -> int:
+            total = 0
+            async for _, data in split_all_pages(path):
+                total += len(data)
+            return total
+        return operation
+
+    def core_compress(self, corpus: Corpus):
+        from api.routes.compress import COMPRESSION_LEVELS, compress_pdf_bytes
+
+        params = COMPRESSION_LEVELS["medium"]
+        return in_thread(lambda: sum(len(compress_pdf_bytes(data, params)) for _, data in corpus))
+
+
+# case -> (Cases method, corpora it runs on)
+CASES: Dict[str, Tuple[str, List[str]]] = {
+    "merge": ("endpoint_merge", ["text-large", "many-small", "few-huge"]),
+    "split": ("endpoint_split_all", ["text-small", "text-large", "images"]),
+    "compress": ("endpoint_compress", ["text-large", "images", "images-shared", "many-small"]),
+    "core-merge": ("core_merge", ["text-large", "many-small", "few-huge"]),
+    "core-split": ("core_split_all", ["text-large", "images"]),
+    "core-compress": ("core_compress", ["images", "images-shared", "few-huge"]),
+}
+
+
+def _worker_pids() -> List[int]:
+    from app.services.pdf_processor import pdf_processor_service
+
+    executor = pdf_processor_service._executor
+    processes = getattr(executor, "_processes", None) or {}
+    return list(processes)
+
+
+async def run(args) -> dict:
+    import httpx
+    from main import app
+    from app.services.pdf_processor import pdf_processor_service
+
+    corpora: Dict[str, Corpus] = {}
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        with tempfile.TemporaryDirectory(prefix="pdfkaro_bench_") as workdir:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                cases = Cases(client, workdir)
+                for case in args.cases:
+                    method, corpus_names = CASES[case]
+                    for corpus_name in corpus_names:
+                        if args.corpora and corpus_name not in args.corpora:
+                            continue
+                        if corpus_name not in corpora:
+                            corpora[corpus_name] = build_corpus(corpus_name, args.scale)
+                        corpus = corpora[corpus_name]
+                        operation = getattr(cases, method)(corpus)
+                        result = await measure(f"{case}/{corpus_name}", operation, args.iterations, args.warmup,
+                                               _size(corpus), _worker_pids)
+                        result["files"] = len(corpus)
+                        results.append(result)
+                        _print_result(result)
+    finally:
+        pdf_processor_service.shutdown()
+
+    return {
+        "environment": environment(),
+        "settings": {"scale": args.scale, "iterations": args.iterations, "warmup": args.warmup,
+                     "result_cache": args.with_cache},
+        "results": results,
+    }
+
+
+def _print_result(result: dict) -> None:
+    latency = result["latency_ms"]
+    print(
+        f"{result['name']:<28} p50 {latency['p50']:9.1f} ms  p90 {latency['p90']:9.1f} ms  "
+        f"p99 {latency['p99']:9.1f} ms  {result['throughput']['input_mb_per_s']:8.2f} MB/s  "
+        f"peak RSS {result['peak_rss_mb']:8.1f} MB",
+        flush=True,
+    )
+
+
+def compare(current: dict, baseline: dict) -> List[str]:
+    """Returns the names of cases whose p50 regressed beyond REGRESSION_THRESHOLD."""
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    print(f"\n{'case':<28} {'baseline p50':>14} {'current p50':>14} {'ratio':>7} {'peak RSS Δ':>12}")
+    for result in current["results"]:
+        old = previous.get(result["name"])
+        if old is None:
+            continue
+        ratio = result["latency_ms"]["p50"] / old["latency_ms"]["p50"] if old["latency_ms"]["p50"] else 0.0
+        rss_delta = result["peak_rss_mb"] - old["peak_rss_mb"]
+        flag = "  <-- slower" if ratio > REGRESSION_THRESHOLD else ""
+        print(f"{result['name']:<28} {old['latency_ms']['p50']:11.1f} ms {result['latency_ms']['p50']:11.1f} ms "
+              f"{ratio:7.2f} {rss_delta:+9.1f} MB{flag}")
+        if flag:
+            regressions.append(result["name"])
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--corpora", nargs="+", choices=sorted(CORPORA), help="only run on these corpora")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for corpus page counts")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--with-cache", action="store_true", help="keep the result cache enabled")
+    parser.add_argument("--output", type=Path, help="JSON results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, help="baseline JSON to compare against; exits 1 on regressions")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Must be set before app.core.config is imported. Every request comes from one
+    # in-process client, so per-client rate limits would throttle the benchmark itself.
+    os.environ["ADMISSION_ENABLED"] = "false"
+    if not args.with_cache:
+        os.environ["RESULT_CACHE_MEMORY_MB"] = "0"
+        os.environ.pop("RESULT_CACHE_DIR", None)
+
+    report = asyncio.run(run(args))
+
+    output = args.output
+    if output is None:
+        DEFAULT_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        output = DEFAULT_OUTPUT_DIR / f"{report['environment']['timestamp'].replace(':', '')}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text()))
+        if regressions:
+            print(f"{len(regressions)} case(s) regressed by more than {REGRESSION_THRESHOLD - 1:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
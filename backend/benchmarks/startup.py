@@ -0,0 +1,164 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the app, to answer
+its first request, and to answer its first PDF request.
+
+Run from backend/:
+
+    python -m benchmarks.startup                       # 5 cold starts
+    python -m benchmarks.startup --runs 10 --worker-warmup --output warm.json
+
+Every run launches a new `uvicorn main:app` process, so nothing is shared between
+runs except the OS page cache. "first response" is measured from process launch to
+the first 200 from `/`; "first PDF" from launch to the first 200 from the analyzer,
+which has to start the worker pool and load pikepdf unless --worker-warmup already
+did so during startup. The import step runs in its own process and also reports
+which heavy libraries were loaded by `import main` (with lazy imports: none).
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.harness import environment, percentile  # noqa: E402
+from benchmarks.synthetic import make_pdf  # noqa: E402
+
+HEAVY_MODULES = ["pikepdf", "PIL.Image", "ijson", "pdf2image"]
+STARTUP_TIMEOUT_SECONDS = 60.0
+POLL_INTERVAL_SECONDS = 0.005
+
+_IMPORT_PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _environment(worker_warmup: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    # A single client would otherwise be throttled by the per-client rate limits
+    env["ADMISSION_ENABLED"] = "false"
+    env["PDF_WORKER_WARMUP"] = "true" if worker_warmup else "false"
+    env.pop("RESULT_CACHE_DIR", None)
+    return env
+
+
+def measure_import(env: Dict[str, str]) -> dict:
+    output = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_cold_start(env: Dict[str, str], pdf: bytes) -> dict:
+    import httpx
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, start_new_session=True,
+    )
+    try:
+        with httpx.Client(base_url=base_url, timeout=STARTUP_TIMEOUT_SECONDS) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"server exited with code {process.returncode} during startup")
+                if time.perf_counter() - started > STARTUP_TIMEOUT_SECONDS:
+                    raise RuntimeError("server did not answer within the startup timeout")
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(POLL_INTERVAL_SECONDS)
+            first_response = time.perf_counter() - started
+
+            request_started = time.perf_counter()
+            response = client.post("/api/v1/analyze/", files={"file": ("tiny.pdf", pdf, "application/pdf")})
+            response.raise_for_status()
+            finished = time.perf_counter()
+    finally:
+        process.terminate()
+        process.wait()
+        # Pool workers can outlive the server; they share its process group
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    return {
+        "first_response_ms": first_response * 1000,
+        "first_pdf_response_ms": (finished - started) * 1000,
+        "first_pdf_latency_ms": (finished - request_started) * 1000,
+    }
+
+
+def _summary(values: List[float]) -> dict:
+    return {"p50": percentile(values, 50), "min": min(values), "max": max(values)}
+
+
+def run(args) -> dict:
+    env = _environment(args.worker_warmup)
+    pdf = make_pdf(1)
+    runs = []
+    for index in range(args.runs):
+        result = {**measure_import(env), **measure_cold_start(env, pdf)}
+        runs.append(result)
+        print(f"run {index + 1:>2}: import {result['import_ms']:7.1f} ms  first response "
+              f"{result['first_response_ms']:7.1f} ms  first PDF {result['first_pdf_response_ms']:7.1f} ms "
+              f"(request {result['first_pdf_latency_ms']:6.1f} ms)  loaded by import: "
+              f"{', '.join(result['loaded']) or 'none'}", flush=True)
+
+    summary = {
+        metric: _summary([run[metric] for run in runs])
+        for metric in ("import_ms", "first_response_ms", "first_pdf_response_ms", "first_pdf_latency_ms")
+    }
+    print()
+    for metric, values in summary.items():
+        print(f"{metric:<24} p50 {values['p50']:8.1f}  min {values['min']:8.1f}  max {values['max']:8.1f}")
+    return {
+        "environment": environment(),
+        "settings": {"runs": args.runs, "worker_warmup": args.worker_warmup},
+        "summary": summary,
+        "runs": runs,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--worker-warmup", action="store_true",
+                        help="start the worker pool and load pikepdf during startup (PDF_WORKER_WARMUP)")
+    parser.add_argument("--output", type=Path, help="also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(args)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
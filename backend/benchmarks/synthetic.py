@@ -0,0 +1,86 @@
+"""Synthetic PDF generators for the benchmark corpora; output is deterministic for a given seed."""
+import io
+import random
+from typing import Dict, List, Tuple
+
+import pikepdf
+from PIL import Image
+
+PAGE_SIZE = (612, 792)  # US Letter, in points
+
+
+def _font(pdf: pikepdf.Pdf) -> pikepdf.Dictionary:
+    return pdf.make_indirect(pikepdf.Dictionary(
+        Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1, BaseFont=pikepdf.Name.Helvetica,
+    ))
+
+
+def _text_content(rng: random.Random, page_number: int, lines: int) -> bytes:
+    words = ["pdf", "merge", "split", "compress", "page", "document", "karo", "invoice", "report", "table"]
+    parts = [b"BT /F1 10 Tf 12 TL 56 740 Td", b"(Page %d) Tj T*" % page_number]
+    for _ in range(lines):
+        line = " ".join(rng.choice(words) for _ in range(12))
+        parts.append(b"(" + line.encode("ascii") + b") Tj T*")
+    parts.append(b"ET")
+    return b"\n".join(parts)
+
+
+def _jpeg(rng: random.Random, size: int, quality: int) -> bytes:
+    # Noise over a gradient: compresses like a photo rather than like a flat fill
+    image = Image.effect_noise((size, size), rng.randint(20, 80)).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    image = Image.blend(image, gradient, 0.5)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def make_pdf(pages: int, images: bool = False, image_size: int = 1200, text_lines: int = 40,
+             shared_image: bool = False, seed: int = 0) -> bytes:
+    """
+    Build a PDF with `pages` pages of text. With `images`, every page also shows a JPEG
+    drawn at roughly 300 DPI; `shared_image` reuses one image object on every page.
+    """
+    rng = random.Random(seed)
+    pdf = pikepdf.Pdf.new()
+    font = _font(pdf)
+    shared = None
+    for page_number in range(1, pages + 1):
+        pdf.add_blank_page(page_size=PAGE_SIZE)
+        page = pdf.pages[-1]
+        resources = pikepdf.Dictionary(Font=pikepdf.Dictionary(F1=font))
+        content = _text_content(rng, page_number, text_lines)
+        if images:
+            if shared is None or not shared_image:
+                data = _jpeg(rng, image_size, 92)
+                shared = pdf.make_stream(
+                    data, Type=pikepdf.Name.XObject, Subtype=pikepdf.Name.Image, Width=image_size,
+                    Height=image_size, ColorSpace=pikepdf.Name.DeviceRGB, BitsPerComponent=8,
+                    Filter=pikepdf.Name.DCTDecode,
+                )
+            resources.XObject = pikepdf.Dictionary(Im0=shared)
+            side = image_size * 72 / 300
+            content = b"q %.2f 0 0 %.2f 56 200 cm /Im0 Do Q\n" % (side, side) + content
+        page.Resources = resources
+        page.Contents = pdf.make_stream(content)
+    buffer = io.BytesIO()
+    pdf.save(buffer, compress_streams=True)
+    return buffer.getvalue()
+
+
+# name -> (file count, make_pdf kwargs); "scale" multiplies page counts
+CORPORA: Dict[str, Tuple[int, dict]] = {
+    "text-small": (1, {"pages": 10}),
+    "text-large": (1, {"pages": 400}),
+    "images": (1, {"pages": 20, "images": True}),
+    "images-shared": (1, {"pages": 40, "images": True, "shared_image": True}),
+    "many-small": (40, {"pages": 2}),
+    "few-huge": (2, {"pages": 40, "images": True, "image_size": 1600}),
+}
+
+
+def build_corpus(name: str, scale: float = 1.0) -> List[Tuple[str, bytes]]:
+    """Returns [(filename, pdf bytes)] for one of CORPORA."""
+    count, kwargs = CORPORA[name]
+    kwargs = {**kwargs, "pages": max(1, round(kwargs["pages"] * scale))}
+    return [(f"{name}_{i + 1}.pdf", make_pdf(seed=i, **kwargs)) for i in range(count)]
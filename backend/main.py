@@ -5,11 +5,32 @@ from pathlib import Path
 current_dir = Path(__file__).parent
 sys.path.append(str(current_dir))
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from api.api_router import api_router
+from app.core.config import settings
+from app.services.admission import AdmissionMiddleware
+from app.services.document_sessions import document_sessions
+from app.services.jobs import job_queue
+from app.services.metrics import MetricsMiddleware, registry
+from app.services.pdf_processor import pdf_processor_service
 
-app = FastAPI(title="PDFkaro.in Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warms up the PDF workers on startup when enabled; closes jobs, workers and sessions on shutdown"""
+    if settings.PDF_WORKER_WARMUP:
+        await pdf_processor_service.warm_up()
+    yield
+    await job_queue.close()
+    pdf_processor_service.shutdown()
+    document_sessions.close_all()
+
+app = FastAPI(title="PDFkaro.in Backend", lifespan=lifespan)
+
+# Added first so it runs inside CORS: rejections still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
 
 origins = ["*"]
 app.add_middleware(
@@ -18,10 +39,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After", "Server-Timing", "X-Compression-Report", "X-Achieved-Size", "X-Target-Met",
+                    "X-Image-Width", "X-Image-Height"],
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 def read_root():
     return {"message": "PDFkaro.in Backend is running!"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 app.include_router(api_router, prefix="/api/v1")
@@ -0,0 +1,73 @@
+"""
+Shared fixtures. Settings are read once at import, so the app is pointed at a
+temporary spool/storage/job directory before anything from app/ is imported.
+
+Run from backend/:
+
+    python -m pytest -q
+"""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+TMP_ROOT = tempfile.mkdtemp(prefix="pdfkaro_tests_")
+for _name in ("UPLOAD_SPOOL_DIR", "STORAGE_LOCAL_DIR", "JOB_RESULT_DIR"):
+    os.environ[_name] = os.path.join(TMP_ROOT, _name.lower())
+    os.makedirs(os.environ[_name])
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["ADMISSION_ENABLED"] = "false"
+os.environ.pop("RESULT_CACHE_DIR", None)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.services.admission import InMemoryAdmissionBackend, admission_controller  # noqa: E402
+from benchmarks.synthetic import make_pdf  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Entering the client runs the lifespan handler, so the worker pool and job queue are closed afterwards
+    with TestClient(main.app) as test_client:
+        yield test_client
+    shutil.rmtree(TMP_ROOT, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def image_pdf():
+    """Eight pages of text with one 400x400 JPEG each; built once since pikepdf work is the slow part"""
+    return make_pdf(8, images=True, image_size=400)
+
+
+@pytest.fixture(scope="session")
+def pdfs():
+    """A few small, distinct PDFs; built once since pikepdf work is the slow part"""
+    return {"three": make_pdf(3), "five": make_pdf(5, seed=7)}
+
+
+def _upload_spool_files() -> set:
+    return {name for name in os.listdir(settings.UPLOAD_SPOOL_DIR) if name.startswith("upload_")}
+
+
+@pytest.fixture
+def spooled_uploads():
+    """Returns the upload spool files created since the test started; a test that cleans up leaves none behind"""
+    existing = _upload_spool_files()
+    return lambda: sorted(_upload_spool_files() - existing)
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    """Admission control switched on with a fresh backend; tests tighten the limits through monkeypatch"""
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission_controller, "backend", InMemoryAdmissionBackend())
+    monkeypatch.setattr(admission_controller, "rejections", {"client_rate": 0, "inflight": 0})
+    return admission_controller
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import api.routes.jobs as jobs_routes
+from api.routes.jobs import cached_or_run
+from app.core.config import settings
+from app.services.admission import AdmissionBackend, InMemoryAdmissionBackend
+from app.services.pdf_processor import pdf_processor_service
+from test_cleanup import wait_for_job, wait_until
+
+UPLOAD = b"%PDF-1.4\n" + b"0" * 2 * 1024 * 1024
+
+
+def compress(client, data=UPLOAD):
+    return client.post("/api/v1/compress/", files=[("files", ("a.pdf", data, "application/pdf"))],
+                       data={"level": "low"})
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        AdmissionBackend()
+
+
+def test_client_over_its_rate_gets_429_with_retry_after(client, admission, monkeypatch):
+    # Each 2 MB upload costs about 5; the bucket holds one of them and refills slowly
+    monkeypatch.setattr(settings, "ADMISSION_CLIENT_BURST", 6.0)
+    monkeypatch.setattr(settings, "ADMISSION_CLIENT_RATE", 0.01)
+
+    assert compress(client).status_code != 429
+    rejected = compress(client)
+    assert rejected.status_code == 429
+    assert int(rejected.headers["retry-after"]) >= 1
+    assert admission.rejections["client_rate"] == 1
+    assert admission.backend.inflight() == 0
+
+
+def test_full_server_gets_503(client, admission, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_INFLIGHT_COST", 10.0)
+    ticket = admission.admit("someone-else", 9.0)
+    try:
+        rejected = compress(client)
+    finally:
+        admission.release(ticket)
+    assert rejected.status_code == 503
+    assert rejected.headers["retry-after"]
+    assert admission.rejections["inflight"] == 1
+
+
+def test_storage_put_uploads_are_admitted(client, admission, monkeypatch):
+    """The signed PUT routes take uploads too, so they are charged like form uploads"""
+    targets = [client.post("/api/v1/storage/uploads", data={"filename": "a.pdf"}).json() for _ in range(2)]
+    monkeypatch.setattr(settings, "ADMISSION_CLIENT_BURST", 6.0)
+    monkeypatch.setattr(settings, "ADMISSION_CLIENT_RATE", 0.01)
+    # Reserving the keys is charged too; start the PUTs with a full bucket
+    monkeypatch.setattr(admission, "backend", InMemoryAdmissionBackend())
+
+    assert client.put(targets[0]["url"], content=UPLOAD).status_code == 200
+    assert client.put(targets[1]["url"], content=UPLOAD).status_code == 429
+
+
+def test_routes_without_uploads_are_not_charged(client, admission, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_CLIENT_BURST", 1.0)
+    monkeypatch.setattr(settings, "ADMISSION_CLIENT_RATE", 0.01)
+    assert [client.get("/").status_code for _ in range(3)] == [200, 200, 200]
+    assert client.get("/api/v1/jobs/missing").status_code == 404
+    assert admission.rejections == {"client_rate": 0, "inflight": 0}
+
+
+def merge_pages(client, data, pages: int):
+    instructions = [{"sourceFile": "a.pdf", "pageIndex": index % 3} for index in range(pages)]
+    return client.post("/api/v1/merge/", data={"pages_data": json.dumps(instructions)},
+                       files=[("files", ("a.pdf", data, "application/pdf"))])
+
+
+def test_page_cost_over_the_client_budget_gets_429_before_any_work(client, admission, pdfs, monkeypatch):
+    runs = []
+
+    async def recording_run(*args, **kwargs):
+        runs.append(args)
+
+    monkeypatch.setattr(pdf_processor_service, "run", recording_run)
+    monkeypatch.setattr(settings, "ADMISSION_CLIENT_BURST", 20.0)
+    monkeypatch.setattr(settings, "ADMISSION_CLIENT_RATE", 0.01)
+    monkeypatch.setattr(settings, "ADMISSION_COST_PER_PAGE", 10.0)
+    # The upload alone is admitted; its 3 pages cost more than what is left in the bucket
+    rejected = merge_pages(client, pdfs["three"], 3)
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"]
+    assert runs == []
+    assert admission.rejections["client_rate"] == 1
+    assert admission.backend.inflight() == 0
+
+
+def test_page_cost_over_the_server_budget_gets_503(client, admission, pdfs, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_INFLIGHT_COST", 10.0)
+    monkeypatch.setattr(settings, "ADMISSION_COST_PER_PAGE", 1.0)
+    ticket = admission.admit("someone-else", 5.0)
+    try:
+        rejected = merge_pages(client, pdfs["three"], 6)
+    finally:
+        admission.release(ticket)
+    assert rejected.status_code == 503
+    assert admission.rejections["inflight"] == 1
+    assert admission.backend.inflight() == 0
+
+
+def test_background_job_holds_its_admission_cost_until_it_finishes(client, admission, image_pdf, monkeypatch):
+    gate = threading.Event()
+
+    async def gated(*args):
+        await asyncio.to_thread(gate.wait, 10)
+        return await cached_or_run(*args)
+
+    monkeypatch.setattr(jobs_routes, "cached_or_run", gated)
+    submitted = client.post("/api/v1/jobs/compress", files={"file": ("a.pdf", image_pdf, "application/pdf")},
+                            data={"level": "low"})
+    assert submitted.status_code == 202
+    # The 202 has been sent, but the job has not run yet, so its cost still counts
+    assert admission.backend.inflight() > 0
+    gate.set()
+    assert wait_for_job(client, submitted.json()["job_id"])["status"] == "completed"
+    assert wait_until(lambda: admission.backend.inflight() == 0)
@@ -0,0 +1,169 @@
+import asyncio
+import io
+import os
+import time
+import zipfile
+
+import httpx
+import pikepdf
+import pytest
+
+import api.routes.jobs as jobs_routes
+from app.core.config import settings
+from app.services.jobs import job_queue
+from app.services.split_engine import split_chunks
+from app.services.storage import get_object_store
+from app.services.uploads import spool_upload
+
+
+def wait_for_job(client, job_id: str, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/v1/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed", "cancelled"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_split_all_streams_every_page_and_removes_the_upload(client, pdfs, spooled_uploads):
+    response = client.post("/api/v1/split/", files={"file": ("a.pdf", pdfs["five"], "application/pdf")},
+                           data={"pages_to_extract": "[]", "include_report": "true"})
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+    assert names == [f"page_{n}.pdf" for n in range(1, 6)] + ["split_report.json"]
+    assert spooled_uploads() == []
+
+
+def call_and_leave(client, request: httpx.Request) -> None:
+    """Sends the request straight to the app and drops the connection before the response starts"""
+    body = request.read()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": request.method,
+        "scheme": "http", "path": request.url.path, "raw_path": request.url.raw_path, "root_path": "",
+        "query_string": b"", "client": ("127.0.0.1", 1), "server": ("test", 80),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in request.headers.items()],
+    }
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        # The connection is gone before the response starts, so the body generator never runs
+        raise OSError("client disconnected")
+
+    async def call():
+        try:
+            await client.app(scope, receive, send)
+        except OSError:
+            pass
+
+    asyncio.run(call())
+
+
+def test_split_all_releases_the_upload_when_the_client_leaves_before_the_body(client, pdfs, spooled_uploads):
+    call_and_leave(client, httpx.Request("POST", "http://test/api/v1/split/", data={"pages_to_extract": "[]"},
+                                         files={"file": ("a.pdf", pdfs["five"], "application/pdf")}))
+    assert spooled_uploads() == []
+
+
+@pytest.mark.parametrize("endpoint, output_format", [("single", "txt"), ("zip", "docx")])
+def test_export_releases_its_spool_file_when_the_client_leaves_before_the_body(client, endpoint, output_format):
+    def export_spool_files():
+        return [name for name in os.listdir(settings.UPLOAD_SPOOL_DIR) if name.startswith("export_")]
+
+    body = {"files": [{"path": "src/a.py", "content": "print(1)\n"}], "output_format": output_format}
+    call_and_leave(client, httpx.Request("POST", f"http://test/api/v1/project-exporter/{endpoint}", json=body))
+    assert export_spool_files() == []
+
+
+def test_split_all_from_a_document_session_unpins_it(client, pdfs):
+    opened = client.post("/api/v1/documents/", files={"file": ("a.pdf", pdfs["three"], "application/pdf")})
+    assert opened.status_code == 200
+    document_id = opened.json()["document_id"]
+    response = client.post("/api/v1/split/", data={"pages_to_extract": "[]", "document_id": document_id})
+    assert response.status_code == 200
+    # A session that is still pinned cannot be deleted (409)
+    assert client.delete(f"/api/v1/documents/{document_id}").status_code == 200
+
+
+def test_strip_unused_only_changes_the_chunk_outputs(pdfs, tmp_path):
+    source = pikepdf.Pdf.open(io.BytesIO(pdfs["three"]))
+    # Every page shares one resource dictionary that also lists a form nobody draws
+    shared = source.make_indirect(pikepdf.Dictionary(dict(source.pages[0].Resources.items())))
+    shared.XObject = pikepdf.Dictionary(Unused=source.make_stream(
+        b"0" * 4096, Type=pikepdf.Name.XObject, Subtype=pikepdf.Name.Form, BBox=[0, 0, 1, 1],
+    ))
+    for page in source.pages:
+        page.obj.Resources = shared
+    path = tmp_path / "shared.pdf"
+    source.save(path)
+
+    chunks = [(f"page_{n + 1}.pdf", n, n + 1) for n in range(3)]
+    kept = split_chunks(str(path), chunks, strip_unused=False, measure=True)
+    stripped = split_chunks(str(path), chunks, strip_unused=True, measure=True)
+
+    for (kept_data, kept_resources), (stripped_data, stripped_resources) in zip(kept, stripped):
+        assert len(stripped_data) < len(kept_data)
+        assert len(stripped_resources) < len(kept_resources)
+        with pikepdf.Pdf.open(io.BytesIO(stripped_data)) as output:
+            assert "/Unused" not in output.pages[0].Resources.get("/XObject", {})
+    with pikepdf.Pdf.open(path) as unchanged:
+        assert "/Unused" in unchanged.pages[0].Resources.XObject
+
+
+def test_finished_job_cleans_inputs_and_its_result_is_deleted_with_it(client, image_pdf, spooled_uploads):
+    submitted = client.post("/api/v1/jobs/compress", files={"file": ("a.pdf", image_pdf, "application/pdf")},
+                            data={"level": "low"})
+    assert submitted.status_code == 202
+    job = wait_for_job(client, submitted.json()["job_id"])
+    assert job["status"] == "completed"
+    assert spooled_uploads() == []
+
+    result_path = get_object_store().object_path(job["result_key"])
+    assert os.path.exists(result_path)
+    assert client.get(f"/api/v1/jobs/{job['job_id']}/result").content.startswith(b"%PDF")
+
+    assert client.delete(f"/api/v1/jobs/{job['job_id']}").status_code == 200
+    assert wait_until(lambda: not os.path.exists(result_path))
+    assert client.get(f"/api/v1/jobs/{job['job_id']}").status_code == 404
+
+
+def test_cancelled_job_cleans_its_inputs(client, image_pdf, spooled_uploads):
+    submitted = client.post("/api/v1/jobs/compress", files={"file": ("b.pdf", image_pdf, "application/pdf")},
+                            data={"level": "high", "target_size": "1"})
+    assert submitted.status_code == 202
+    job_id = submitted.json()["job_id"]
+    client.delete(f"/api/v1/jobs/{job_id}")
+    job = wait_for_job(client, job_id)
+    assert job["status"] in ("cancelled", "completed")
+    assert wait_until(lambda: spooled_uploads() == [])
+
+
+def test_full_job_queue_is_rejected_before_the_upload_is_read(client, image_pdf, spooled_uploads, monkeypatch):
+    spooled = []
+
+    async def recording_spool_upload(file):
+        spooled.append(file.filename)
+        return await spool_upload(file)
+
+    monkeypatch.setattr(job_queue, "max_jobs", 0)
+    monkeypatch.setattr(jobs_routes, "spool_upload", recording_spool_upload)
+    submitted = client.post("/api/v1/jobs/compress", files={"file": ("a.pdf", image_pdf, "application/pdf")},
+                            data={"level": "low"})
+    assert submitted.status_code == 503
+    assert submitted.headers["retry-after"]
+    assert spooled == []
+    assert spooled_uploads() == []
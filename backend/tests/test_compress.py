@@ -0,0 +1,60 @@
+import json
+
+from api.routes.compress import compress_pdf_file_to_size
+from app.core.config import settings
+
+
+def compress_to_size(client, data: bytes, target_kb: int):
+    return client.post("/api/v1/compress/size", files=[("files", ("a.pdf", data, "application/pdf"))],
+                       data={"target_size": str(target_kb), "size_unit": "KB"})
+
+
+def test_reachable_target_is_met(client, image_pdf):
+    target_kb = len(image_pdf) // 2 // 1024
+    response = compress_to_size(client, image_pdf, target_kb)
+    assert response.status_code == 200
+    assert response.headers["x-target-met"] == "true"
+    achieved = int(response.headers["x-achieved-size"])
+    assert achieved == len(response.content)
+    assert achieved <= target_kb * 1024
+    report = json.loads(response.headers["x-compression-report"])
+    assert report["target_met"] and report["compressed_size"] == achieved
+
+
+def test_unreachable_target_returns_the_smallest_result(client, image_pdf):
+    response = compress_to_size(client, image_pdf, 1)
+    assert response.status_code == 200
+    assert response.headers["x-target-met"] == "false"
+    achieved = int(response.headers["x-achieved-size"])
+    assert achieved == len(response.content)
+    assert 1024 < achieved < len(image_pdf) // 10
+
+
+def compress_at(client, data: bytes, level: str):
+    return client.post("/api/v1/compress/", files=[("files", ("a.pdf", data, "application/pdf"))],
+                       data={"level": level})
+
+
+def test_higher_level_gives_a_smaller_file(client, image_pdf):
+    low, high = compress_at(client, image_pdf, "low"), compress_at(client, image_pdf, "high")
+    assert low.status_code == high.status_code == 200
+    assert low.content.startswith(b"%PDF") and high.content.startswith(b"%PDF")
+    assert len(high.content) < len(low.content)
+    low_report = json.loads(low.headers["x-compression-report"])
+    high_report = json.loads(high.headers["x-compression-report"])
+    assert high_report["params"]["quality"] < low_report["params"]["quality"]
+
+
+def test_target_size_search_keeps_only_the_smallest_candidate_on_disk(image_pdf, tmp_path, monkeypatch):
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_DIR", str(spool_dir))
+    source, output = tmp_path / "a.pdf", tmp_path / "out.pdf"
+    source.write_bytes(image_pdf)
+
+    report = compress_pdf_file_to_size(str(source), 1024, str(output))
+    sizes = [step["actual_size"] for step in report["iterations"] if "actual_size" in step]
+    assert len(sizes) > 1
+    assert report["compressed_size"] == min(sizes) == output.stat().st_size
+    # Candidates were saved to spool files, and every one of them is gone
+    assert list(spool_dir.iterdir()) == []
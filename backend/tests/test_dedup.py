@@ -0,0 +1,99 @@
+import io
+import random
+
+import pikepdf
+
+from app.services.dedup import deduplicate
+from benchmarks.synthetic import _jpeg
+
+PAGES = 3
+
+
+def reopened(pdf: pikepdf.Pdf) -> pikepdf.Pdf:
+    """Saves and reopens pdf, so every stream has its /Length as in an uploaded file"""
+    output = io.BytesIO()
+    pdf.save(output)
+    return pikepdf.Pdf.open(io.BytesIO(output.getvalue()))
+
+
+def exported_pdf() -> pikepdf.Pdf:
+    """Every page carries its own copy of the same image and the same embedded font, like pages exported one by one"""
+    jpeg = _jpeg(random.Random(5), 64, 80)
+    font_file = b"\x00\x01\x00\x00" + bytes(range(256)) * 8
+    pdf = pikepdf.Pdf.new()
+    for page_number in range(PAGES):
+        pdf.add_blank_page()
+        page = pdf.pages[-1]
+        image = pdf.make_stream(jpeg, Type=pikepdf.Name.XObject, Subtype=pikepdf.Name.Image, Width=64, Height=64,
+                                ColorSpace=pikepdf.Name.DeviceRGB, BitsPerComponent=8, Filter=pikepdf.Name.DCTDecode)
+        descriptor = pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.FontDescriptor, FontName=pikepdf.Name.Embedded, Flags=32,
+            FontFile2=pdf.make_stream(font_file, Length1=len(font_file)),
+        ))
+        font = pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Font, Subtype=pikepdf.Name.TrueType, BaseFont=pikepdf.Name.Embedded,
+            FontDescriptor=descriptor,
+        ))
+        page.Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image),
+                                            Font=pikepdf.Dictionary(F1=font))
+        page.Contents = pdf.make_stream(b"q 64 0 0 64 56 600 cm /Im0 Do Q BT /F1 12 Tf 56 560 Td (Page %d) Tj ET"
+                                        % (page_number + 1))
+    return reopened(pdf)
+
+
+def page_content(pdf: pikepdf.Pdf) -> list:
+    return [(page.Contents.read_bytes(), page.Resources.XObject.Im0.read_raw_bytes(),
+             page.Resources.Font.F1.FontDescriptor.FontFile2.read_bytes()) for page in pdf.pages]
+
+
+def test_duplicate_images_and_fonts_are_merged_and_the_pages_are_unchanged():
+    with exported_pdf() as pdf:
+        before = page_content(pdf)
+        objects_before = len(pdf.objects)
+        stats = deduplicate(pdf)
+        # One copy each of the image, the font file, its descriptor and the font is kept
+        assert stats["objects_merged"] == 4 * (PAGES - 1)
+        assert stats["bytes_saved"] > 0
+        with reopened(pdf) as deduplicated:
+            assert len(deduplicated.objects) == objects_before - stats["objects_merged"]
+            assert page_content(deduplicated) == before
+            images = {page.Resources.XObject.Im0.objgen for page in deduplicated.pages}
+            fonts = {page.Resources.Font.F1.objgen for page in deduplicated.pages}
+            assert len(images) == len(fonts) == 1
+
+
+def test_objects_with_an_identity_are_never_merged():
+    pdf = pikepdf.Pdf.new()
+    for _ in range(2):
+        pdf.add_blank_page()
+    for page in pdf.pages:
+        page.Annots = pdf.make_indirect(pikepdf.Array([
+            pdf.make_indirect(pikepdf.Dictionary(Type=pikepdf.Name.Annot, Subtype=pikepdf.Name.Link,
+                                                 Rect=[0, 0, 10, 10])),
+            pdf.make_indirect(pikepdf.Dictionary(Rect=[0, 0, 10, 10], Note=pikepdf.String("no type"))),
+            pdf.make_indirect(pikepdf.Dictionary(Type=pikepdf.Name.Sig, Filter=pikepdf.Name("/Adobe.PPKLite"))),
+        ]))
+    with reopened(pdf) as pdf:
+        identities = [page.obj.objgen for page in pdf.pages]
+        identities += [annotation.objgen for page in pdf.pages for annotation in page.Annots]
+        deduplicate(pdf)
+        after = [page.obj.objgen for page in pdf.pages]
+        after += [annotation.objgen for page in pdf.pages for annotation in page.Annots]
+        assert after == identities
+        assert len(set(after)) == len(after)
+
+
+def test_references_in_the_trailer_are_rewritten():
+    pdf = pikepdf.Pdf.new()
+    pdf.add_blank_page()
+    metadata = pikepdf.Dictionary(Title=pikepdf.String("Report"), Producer=pikepdf.String("export"))
+    # The copy made first is the one kept, so the trailer's /Info is the one merged away
+    pdf.Root.PieceInfo = pdf.make_indirect(metadata)
+    pdf.trailer.Info = pdf.make_indirect(pikepdf.Dictionary(metadata))
+    kept = pdf.Root.PieceInfo.objgen
+    assert pdf.trailer.Info.objgen != kept
+    assert deduplicate(pdf)["objects_merged"] == 1
+    assert pdf.trailer.Info.objgen == kept
+    with reopened(pdf) as saved:
+        assert str(saved.trailer.Info.Title) == "Report"
+        assert saved.trailer.Info.objgen == saved.Root.PieceInfo.objgen
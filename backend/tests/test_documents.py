@@ -0,0 +1,17 @@
+from app.services.pdf_processor import pdf_processor_service
+
+
+def test_document_session_work_is_limited_by_the_worker_pool(client, image_pdf, monkeypatch):
+    opened = client.post("/api/v1/documents/", files={"file": ("a.pdf", image_pdf, "application/pdf")})
+    assert opened.status_code == 200
+    document_id = opened.json()["document_id"]
+    monkeypatch.setattr(pdf_processor_service, "_pending",
+                        pdf_processor_service.max_workers + pdf_processor_service.max_queue)
+    response = client.post("/api/v1/split/", data={"pages_to_extract": "[1]", "document_id": document_id})
+    assert response.status_code == 503
+    monkeypatch.undo()
+
+    response = client.post("/api/v1/split/", data={"pages_to_extract": "[1]", "document_id": document_id})
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+    assert client.delete(f"/api/v1/documents/{document_id}").status_code == 200
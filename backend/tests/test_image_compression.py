@@ -0,0 +1,57 @@
+import io
+
+import pikepdf
+import pytest
+from PIL import Image
+
+from app.services.image_compression import ImageRecompressor
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Counts image decodes and tracks how many decoded images are still open"""
+    stats = {"decoded": 0, "open": set(), "peak": 0}
+    as_pil_image = pikepdf.PdfImage.as_pil_image
+    close = Image.Image.close
+
+    def counting_as_pil_image(self, *args, **kwargs):
+        image = as_pil_image(self, *args, **kwargs)
+        stats["decoded"] += 1
+        stats["open"].add(id(image))
+        stats["peak"] = max(stats["peak"], len(stats["open"]))
+        return image
+
+    def tracking_close(self):
+        stats["open"].discard(id(self))
+        close(self)
+
+    monkeypatch.setattr(pikepdf.PdfImage, "as_pil_image", counting_as_pil_image)
+    monkeypatch.setattr(Image.Image, "close", tracking_close)
+    return stats
+
+
+def test_images_are_decoded_only_while_they_are_encoded(image_pdf, decodes):
+    with pikepdf.open(io.BytesIO(image_pdf)) as pdf:
+        recompressor = ImageRecompressor(pdf, max_threads=2)
+        assert len(recompressor.candidates) == 8
+        assert decodes["decoded"] == 0
+
+        report = recompressor.apply(72, 50)
+        assert report["images_found"] == report["images_recompressed"] == 8
+        assert decodes["decoded"] == 8
+        assert decodes["peak"] <= recompressor.max_threads + 1
+        assert decodes["open"] == set()
+
+
+def test_decoded_cache_avoids_decoding_again_for_new_parameters(image_pdf, decodes):
+    with pikepdf.open(io.BytesIO(image_pdf)) as pdf:
+        recompressor = ImageRecompressor(pdf, max_threads=2, decoded_cache_bytes=64 * 1024 * 1024)
+        high = recompressor.estimated_image_bytes(150, 70)
+        low = recompressor.estimated_image_bytes(72, 40)
+        assert low < high < recompressor.total_raw_bytes
+        assert decodes["decoded"] == 8
+
+        recompressor.apply(72, 40)
+        assert decodes["decoded"] == 8
+        recompressor.close()
+        assert decodes["open"] == set()
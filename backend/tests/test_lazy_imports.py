@@ -0,0 +1,23 @@
+import json
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+HEAVY_MODULES = ("pikepdf", "PIL", "ijson")
+
+
+def imported_after(code: str) -> list:
+    """Runs code in a fresh interpreter and returns which heavy modules it left in sys.modules"""
+    script = f"import json, sys\n{code}\nprint(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True,
+                            timeout=60, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_importing_the_app_does_not_load_the_pdf_libraries():
+    assert imported_after("import main") == []
+
+
+def test_the_libraries_load_on_first_use():
+    assert imported_after("import main\nfrom api.routes import merge\nmerge.pikepdf.Pdf") == ["pikepdf"]
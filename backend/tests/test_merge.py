@@ -0,0 +1,70 @@
+import io
+import json
+
+import pikepdf
+import pytest
+
+from app.services import merge_planner
+from app.services.merge_planner import MergePlanError, execute_merge_plan
+from app.services.pdf_processor import pdf_processor_service
+
+
+def merge(client, pages, files):
+    return client.post("/api/v1/merge/", data={"pages_data": json.dumps(pages)},
+                       files=[("files", (name, data, "application/pdf")) for name, data in files.items()])
+
+
+def test_merging_a_rotated_page_twice_does_not_add_up_the_rotation(client, pdfs):
+    pages = [{"sourceFile": "a.pdf", "pageIndex": 1, "rotation": 90}] * 2
+    response = merge(client, pages, {"a.pdf": pdfs["three"]})
+    assert response.status_code == 200
+    with pikepdf.Pdf.open(io.BytesIO(response.content)) as merged:
+        assert [page.obj.get("/Rotate") for page in merged.pages] == [90, 90]
+
+
+@pytest.mark.parametrize("instruction, status", [
+    ({"sourceFile": "missing.pdf", "pageIndex": 0}, 400),
+    ({"sourceFile": "a.pdf", "pageIndex": -1}, 400),
+    ({"sourceFile": "a.pdf", "pageIndex": 0, "rotation": 45}, 400),
+    # An unknown or expired document is not an instruction error, but it is found before any upload is read
+    ({"documentId": "no-such-document", "pageIndex": 0}, 404),
+])
+def test_invalid_instruction_is_rejected_before_any_pdf_is_opened(client, pdfs, spooled_uploads, monkeypatch,
+                                                                  instruction, status):
+    runs = []
+
+    async def recording_run(*args, **kwargs):
+        runs.append(args)
+
+    monkeypatch.setattr(pdf_processor_service, "run", recording_run)
+    response = merge(client, [{"sourceFile": "a.pdf", "pageIndex": 0}, instruction], {"a.pdf": pdfs["three"]})
+    assert response.status_code == status
+    assert runs == []
+    assert spooled_uploads() == []
+
+
+def test_page_index_past_the_end_is_rejected_before_any_page_is_copied(pdfs, tmp_path, monkeypatch):
+    opened, copied = [], []
+    open_spooled_pdf = merge_planner.open_spooled_pdf
+
+    def recording_open(path):
+        opened.append(path)
+        return open_spooled_pdf(path)
+
+    monkeypatch.setattr(merge_planner, "open_spooled_pdf", recording_open)
+    source = tmp_path / "a.pdf"
+    source.write_bytes(pdfs["three"])
+    other = tmp_path / "b.pdf"
+    other.write_bytes(pdfs["five"])
+    plan = [("a.pdf", 0, 0), ("a.pdf", 3, 0), ("b.pdf", 0, 0)]
+    with pytest.raises(MergePlanError, match="page index 3"):
+        execute_merge_plan({"a.pdf": str(source), "b.pdf": str(other)}, plan, on_page=copied.append)
+    # The upper bound is known only once the source is open; it is checked before anything is copied
+    assert opened == [str(source)]
+    assert copied == []
+
+
+def test_page_index_past_the_end_gets_400(client, pdfs):
+    response = merge(client, [{"sourceFile": "a.pdf", "pageIndex": 3}], {"a.pdf": pdfs["three"]})
+    assert response.status_code == 400
+    assert "page index 3" in response.json()["detail"]
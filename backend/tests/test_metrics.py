@@ -0,0 +1,39 @@
+import json
+
+from benchmarks.synthetic import make_pdf
+
+
+def server_timing(response) -> dict:
+    entries = [entry.split(";dur=") for entry in response.headers["server-timing"].split(", ")]
+    return {name: float(duration) for name, duration in entries}
+
+
+def test_response_carries_server_timing_for_its_stages(client):
+    first, second = make_pdf(2, seed=21), make_pdf(3, seed=22)
+    pages = [{"sourceFile": "a.pdf", "pageIndex": 0}, {"sourceFile": "b.pdf", "pageIndex": 2}]
+    response = client.post("/api/v1/merge/", data={"pages_data": json.dumps(pages)},
+                           files=[("files", ("a.pdf", first, "application/pdf")),
+                                  ("files", ("b.pdf", second, "application/pdf"))])
+    assert response.status_code == 200
+    timings = server_timing(response)
+    # Spans recorded in the worker process are reported next to the ones from the event loop
+    assert {"upload_read", "queue_wait", "pdf_open", "page_copy", "pdf_save", "total"} <= timings.keys()
+    assert all(duration >= 0 for duration in timings.values())
+
+
+def job_lookups_not_found(client) -> int:
+    series = 'pdfkaro_http_request_duration_seconds_count{method="GET",handler="/api/v1/jobs/{job_id}",status="404"} '
+    counts = [line[len(series):] for line in client.get("/metrics").text.splitlines() if line.startswith(series)]
+    return int(counts[0]) if counts else 0
+
+
+def test_metrics_label_requests_by_route_template(client):
+    before = job_lookups_not_found(client)
+    for job_id in ("missing-one", "missing-two"):
+        assert client.get(f"/api/v1/jobs/{job_id}").status_code == 404
+    assert job_lookups_not_found(client) == before + 2
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert "# TYPE pdfkaro_http_request_duration_seconds histogram" in metrics.text
+    assert "missing-one" not in metrics.text
@@ -0,0 +1,118 @@
+import io
+import json
+import re
+
+import pikepdf
+import pytest
+
+from api.routes.compress import save_compressed
+from app.services.pdf_analyzer import _scan_revisions
+from benchmarks.synthetic import make_pdf
+
+
+def optimized(data: bytes) -> bytes:
+    """The file as compress writes it: linearized, with object streams and recompressed streams"""
+    output = io.BytesIO()
+    with pikepdf.Pdf.open(io.BytesIO(data)) as pdf:
+        save_compressed(pdf, output)
+    return output.getvalue()
+
+
+def linearized_with_xref_tables(data: bytes) -> bytes:
+    """Without object streams both cross-reference sections are tables, each with its own %%EOF"""
+    output = io.BytesIO()
+    with pikepdf.Pdf.open(io.BytesIO(data)) as pdf:
+        pdf.save(output, linearize=True)
+    return output.getvalue()
+
+
+def append_update(data: bytes) -> bytes:
+    """
+    Append an incremental update with a new copy of the first page's content
+    stream, the way an editor saving in place does
+    """
+    with pikepdf.Pdf.open(io.BytesIO(data)) as pdf:
+        number, generation = pdf.pages[0].obj.Contents.objgen
+        size = int(pdf.trailer.Size)
+        root = pdf.Root.objgen
+    old = re.search(rb"(?<![0-9])%d %d obj\b(.*?)endobj" % (number, generation), data, re.S)
+    prev = int(re.findall(rb"startxref\s+(\d+)", data)[-1])
+    data = data if data.endswith(b"\n") else data + b"\n"
+    object_offset = len(data)
+    update = b"%d %d obj%sendobj\n" % (number, generation, old.group(1))
+    xref_offset = object_offset + len(update)
+    update += b"xref\n0 1\n0000000000 65535 f \n%d 1\n%010d %05d n \n" % (number, object_offset, generation)
+    update += b"trailer\n<< /Size %d /Root %d %d R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n" % (
+        size, *root, prev, xref_offset)
+    return data + update
+
+
+PLAIN = make_pdf(3, seed=41)
+LINEARIZED = optimized(PLAIN)
+LINEARIZED_TABLES = linearized_with_xref_tables(PLAIN)
+
+
+@pytest.mark.parametrize("data, revisions", [
+    (PLAIN, 1),
+    # The first-page cross-reference section of a linearized file is part of its only revision
+    (LINEARIZED, 1),
+    (LINEARIZED_TABLES, 1),
+    (append_update(PLAIN), 2),
+    (append_update(LINEARIZED), 2),
+    (append_update(LINEARIZED_TABLES), 2),
+    (append_update(append_update(PLAIN)), 3),
+])
+def test_revisions_follow_the_prev_chain(data, revisions):
+    with pikepdf.Pdf.open(io.BytesIO(data)):
+        pass
+    assert _scan_revisions(data)[0] == revisions
+
+
+def test_superseded_copies_are_counted():
+    _, superseded, superseded_bytes = _scan_revisions(append_update(PLAIN))
+    assert superseded == 1
+    assert superseded_bytes > 0
+
+
+def analyze(client, data: bytes) -> dict:
+    response = client.post("/api/v1/analyze/", files={"file": ("a.pdf", data, "application/pdf")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_analyze_endpoint_reports_the_structure(client):
+    report = analyze(client, LINEARIZED)
+    assert report["page_count"] == 3
+    assert report["linearized"] is True
+    assert report["incremental_updates"] == {"revisions": 1, "superseded_objects": 0, "superseded_bytes": 0}
+    assert set(report["expected_savings"]) == {"low", "medium", "high"}
+
+    updated = analyze(client, append_update(LINEARIZED))
+    assert updated["incremental_updates"]["revisions"] == 2
+    assert updated["incremental_updates"]["superseded_objects"] == 1
+    assert updated["estimates"]["rewrite_savings"] >= updated["incremental_updates"]["superseded_bytes"] > 0
+
+
+def compress_report(client, data: bytes) -> tuple:
+    response = client.post("/api/v1/compress/", files=[("files", ("a.pdf", data, "application/pdf"))],
+                           data={"level": "medium"})
+    assert response.status_code == 200
+    return response.content, json.loads(response.headers["x-compression-report"])
+
+
+def test_compress_skips_the_stages_that_cannot_pay_off(client):
+    content, report = compress_report(client, LINEARIZED)
+    stages = {stage["stage"]: stage for stage in report["stages"]}
+    assert stages["images"]["skipped"] and stages["rewrite"]["skipped"]
+    assert "dedup" not in stages
+    assert content == LINEARIZED
+
+
+def test_compress_rewrites_a_file_with_superseded_objects(client):
+    updated = append_update(LINEARIZED)
+    content, report = compress_report(client, updated)
+    rewrite = next(stage for stage in report["stages"] if stage["stage"] == "rewrite")
+    assert not rewrite.get("skipped")
+    assert len(content) < len(updated)
+    with pikepdf.Pdf.open(io.BytesIO(content)) as pdf:
+        assert len(pdf.pages) == 3
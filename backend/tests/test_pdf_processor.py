@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import jobs
+from app.services.jobs import InProcessJobQueue, LocalResultStore
+from app.services.pdf_processor import PDFProcessor
+
+
+async def wait_for_idle(processor: PDFProcessor, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while processor.pending_jobs and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+
+def test_timed_out_job_is_stopped_and_its_slot_released():
+    processor = PDFProcessor(max_workers=1, max_queue=0, job_timeout=0.5)
+
+    async def scenario():
+        with pytest.raises(HTTPException) as timed_out:
+            await processor.run(time.sleep, 30)
+        assert timed_out.value.status_code == 504
+        # The sleeping worker is terminated instead of holding the only slot for 30 seconds
+        await wait_for_idle(processor)
+        assert processor.pending_jobs == 0
+        assert await processor.run(abs, -3) == 3
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        processor.shutdown()
+
+
+def test_timeout_keeps_the_pool_for_other_running_jobs():
+    processor = PDFProcessor(max_workers=2, max_queue=0, job_timeout=5)
+
+    async def scenario():
+        other = asyncio.ensure_future(processor.run(time.sleep, 1.5))
+        await asyncio.sleep(0.3)
+        with pytest.raises(HTTPException) as timed_out:
+            await processor.run(time.sleep, 30, timeout=0.5)
+        assert timed_out.value.status_code == 504
+        # The job that was already running on the old pool still finishes normally
+        assert await other is None
+        await wait_for_idle(processor)
+        assert processor.pending_jobs == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        processor.shutdown()
+
+
+def sleep_with_progress(seconds: float, progress_path: str) -> None:
+    time.sleep(seconds)
+
+
+def test_cancelled_job_stops_its_worker_and_releases_the_slot(tmp_path, monkeypatch):
+    processor = PDFProcessor(max_workers=1, max_queue=0, job_timeout=60)
+    monkeypatch.setattr(jobs, "pdf_processor_service", processor)
+    queue = InProcessJobQueue(store=LocalResultStore(str(tmp_path)))
+
+    async def work(job, run):
+        await run(sleep_with_progress, (30,))
+
+    async def scenario():
+        job = queue.submit("sleep", [], work)
+        deadline = time.monotonic() + 5
+        while not processor.pending_jobs and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        assert processor.pending_jobs == 1
+
+        queue.cancel(job.job_id)
+        await asyncio.gather(job.task, return_exceptions=True)
+        assert job.status == jobs.CANCELLED
+        # The cancelled job's worker is terminated instead of holding the only slot for 30 seconds
+        await wait_for_idle(processor)
+        assert processor.pending_jobs == 0
+        assert await processor.run(abs, -3) == 3
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        processor.shutdown()
@@ -0,0 +1,37 @@
+import io
+import zipfile
+from xml.etree import ElementTree
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+FILES = [{"path": "src/a.py", "content": "if a < b and c > d:\n    print(\"a & b\")\n"},
+         {"path": "README.md", "content": "# Title\n"}]
+
+
+def document_text(docx: bytes) -> str:
+    with zipfile.ZipFile(io.BytesIO(docx)) as package:
+        assert package.testzip() is None
+        names = package.namelist()
+        assert "[Content_Types].xml" in names and "word/document.xml" in names
+        content_types = ElementTree.fromstring(package.read("[Content_Types].xml"))
+        assert any(override.get("PartName") == "/word/document.xml" for override in content_types)
+        document = ElementTree.fromstring(package.read("word/document.xml"))
+    return "\n".join("".join(text.text or "" for text in paragraph.iter(f"{WORD_NS}t"))
+                     for paragraph in document.iter(f"{WORD_NS}p"))
+
+
+def test_zip_export_docx_members_are_valid_documents(client):
+    response = client.post("/api/v1/project-exporter/zip", json={"files": FILES, "output_format": "docx"})
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.namelist() == ["src/a.docx", "README.docx"]
+        member = archive.read("src/a.docx")
+    text = document_text(member)
+    assert "--- File: src/a.py ---" in text
+    assert 'if a < b and c > d:' in text and 'print("a & b")' in text
+
+
+def test_single_docx_export_is_a_valid_document(client):
+    response = client.post("/api/v1/project-exporter/single", json={"files": FILES, "output_format": "docx"})
+    assert response.status_code == 200
+    text = document_text(response.content)
+    assert "# Title" in text and 'print("a & b")' in text
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from app.core.config import settings
+from app.services.result_cache import CachedResult, ResultCache, cache_key, parse_byte_range
+from app.services.storage import get_object_store
+from app.services.uploads import spool_output_path
+
+
+def test_cache_key_depends_on_every_input():
+    key = cache_key("compress", ["a" * 64], {"level": "high", "dpi": 150})
+    assert key == cache_key("compress", ["a" * 64], {"dpi": 150, "level": "high"})
+    assert key != cache_key("compress", ["b" * 64], {"level": "high", "dpi": 150})
+    assert key != cache_key("compress", ["a" * 64], {"level": "low", "dpi": 150})
+    assert key != cache_key("merge", ["a" * 64], {"level": "high", "dpi": 150})
+
+
+def test_cache_key_keeps_input_order():
+    assert cache_key("merge", ["a", "b"], None) != cache_key("merge", ["b", "a"], None)
+
+
+@pytest.mark.parametrize("name, value", [("PDF_DEDUPLICATE", False), ("COMPRESS_MIN_REWRITE_SAVINGS_PERCENT", 50.0)])
+def test_cache_key_changes_with_settings_that_change_the_output(monkeypatch, name, value):
+    key = cache_key("compress", ["a" * 64], {"level": "high"})
+    monkeypatch.setattr(settings, name, value)
+    assert cache_key("compress", ["a" * 64], {"level": "high"}) != key
+
+
+def test_stored_results_used_as_inputs_do_not_share_a_cache_key(client, pdfs):
+    """Job results stored in the object store are hashed, whether they were bytes or a worker's output file"""
+    store = get_object_store()
+    output_path = spool_output_path()
+    with open(output_path, "wb") as f:
+        f.write(pdfs["five"])
+    asyncio.run(store.put("results/test-a/out.pdf", CachedResult(pdfs["three"], "application/pdf", {})))
+    asyncio.run(store.put("results/test-b/out.pdf", CachedResult.from_file(output_path, "application/pdf")))
+
+    for key, data in (("results/test-a/out.pdf", pdfs["three"]), ("results/test-b/out.pdf", pdfs["five"])):
+        assert store.stat(key)["sha256"] == hashlib.sha256(data).hexdigest()
+
+    responses = [
+        client.post("/api/v1/split/extract-single-page", data={"input_key": key, "page_number": 0})
+        for key in ("results/test-a/out.pdf", "results/test-b/out.pdf")
+    ]
+    assert [response.status_code for response in responses] == [200, 200]
+    assert responses[0].headers["etag"] != responses[1].headers["etag"]
+    assert responses[0].content != responses[1].content
+
+
+def test_open_input_hashes_objects_stored_without_a_digest(pdfs):
+    store = get_object_store()
+    key = "results/test-legacy/out.pdf"
+    asyncio.run(store.put(key, CachedResult(pdfs["three"], "application/pdf", {})))
+    store._write_meta(key, len(pdfs["three"]), None, "application/pdf")
+
+    stored = asyncio.run(store.open_input(key))
+    assert stored.sha256 == hashlib.sha256(pdfs["three"]).hexdigest()
+    assert store.stat(key)["sha256"] == stored.sha256
+
+
+def test_memory_tier_skips_items_over_the_per_item_limit():
+    cache = ResultCache(max_memory_bytes=100, disk_dir="", max_disk_bytes=0, max_memory_item_bytes=10)
+    asyncio.run(cache.put("big", CachedResult(b"x" * 20, "application/pdf", {})))
+    asyncio.run(cache.put("small", CachedResult(b"x" * 5, "application/pdf", {})))
+    assert asyncio.run(cache.get("big")) is None
+    assert asyncio.run(cache.get("small")).data == b"x" * 5
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-3", (0, 4)),
+    ("bytes=6-", (6, 10)),
+    ("bytes=-3", (7, 10)),
+    ("bytes=2-99", (2, 10)),
+    ("bytes=0-1,4-5", None),
+    ("bytes=5-2", None),
+    ("bytes=x-3", None),
+    ("items=0-3", None),
+])
+def test_parse_byte_range(header, expected):
+    assert parse_byte_range(header, 10) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=10-", "bytes=-0"])
+def test_parse_byte_range_rejects_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        parse_byte_range(header, 10)
+
+
+def test_cached_result_is_served_with_range_support(client, pdfs):
+    data = {"pages_to_extract": '[0, 1]'}
+    files = {"file": ("a.pdf", pdfs["five"], "application/pdf")}
+    full = client.post("/api/v1/split/", files=files, data=data)
+    assert full.status_code == 200
+
+    partial = client.post("/api/v1/split/", files=files, data=data, headers={"Range": "bytes=0-7"})
+    assert partial.status_code == 206
+    assert partial.content == full.content[:8]
+    assert partial.headers["content-range"] == f"bytes 0-7/{len(full.content)}"
+
+    beyond = client.post("/api/v1/split/", files=files, data=data,
+                         headers={"Range": f"bytes={len(full.content)}-"})
+    assert beyond.status_code == 416
+
+    cached = client.post("/api/v1/split/", files=files, data=data, headers={"If-None-Match": full.headers["etag"]})
+    assert cached.status_code == 304
@@ -0,0 +1,38 @@
+import os
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services.storage import LocalObjectStore
+
+
+def verify_download(store: LocalObjectStore, url: str) -> None:
+    parsed = urlparse(url)
+    query = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+    resource = parsed.path[len(store.base_url) + 1:]
+    store.verify("GET", resource, int(query["expires"]), query["signature"], query["filename"])
+
+
+def test_generated_secret_is_shared_by_stores_on_the_same_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_SIGNING_SECRET", None)
+    # Two workers, or one worker before and after a restart
+    first, second = LocalObjectStore(str(tmp_path)), LocalObjectStore(str(tmp_path))
+    assert first.secret == second.secret
+    verify_download(second, first.download_url("inputs/abc/a.pdf", "a.pdf"))
+    assert oct(os.stat(tmp_path / "signing_secret").st_mode & 0o777) == "0o600"
+    assert os.listdir(tmp_path / "tmp") == []
+
+    elsewhere = LocalObjectStore(str(tmp_path / "other"))
+    assert elsewhere.secret != first.secret
+    with pytest.raises(HTTPException) as rejected:
+        verify_download(elsewhere, first.download_url("inputs/abc/a.pdf", "a.pdf"))
+    assert rejected.value.status_code == 403
+
+
+def test_configured_secret_is_used_and_not_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_SIGNING_SECRET", "configured")
+    store = LocalObjectStore(str(tmp_path))
+    assert store.secret == b"configured"
+    assert not (tmp_path / "signing_secret").exists()
@@ -0,0 +1,74 @@
+import pdf2image
+import pytest
+from PIL import Image
+from pdf2image.exceptions import PopplerNotInstalledError
+
+from api.routes.thumbnails import thumbnail_key
+from app.services.pdf_processor import pdf_processor_service
+from benchmarks.synthetic import make_pdf
+
+
+@pytest.fixture
+def in_process_pool(monkeypatch):
+    """Runs worker functions in the test process, so monkeypatched libraries are used by them"""
+
+    async def run(fn, *args, timeout=None):
+        return fn(*args)
+
+    async def run_ordered(fn, arg_tuples, window=None, return_exceptions=False):
+        for args in arg_tuples:
+            yield fn(*args)
+
+    monkeypatch.setattr(pdf_processor_service, "run", run)
+    monkeypatch.setattr(pdf_processor_service, "run_ordered", run_ordered)
+
+
+@pytest.fixture
+def rendered(monkeypatch, in_process_pool):
+    """Replaces poppler with blank pages and records the (first, last) page range of every render"""
+    calls = []
+
+    def convert_from_path(pdf_path, first_page, last_page, size, timeout):
+        calls.append((first_page, last_page))
+        return [Image.new("RGB", (size[0], size[0] * 4 // 3), "white") for _ in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(pdf2image, "convert_from_path", convert_from_path)
+    return calls
+
+
+def thumbnails(client, data: bytes, pages: str, width: int = 120):
+    return client.post("/api/v1/thumbnails/", files={"file": ("a.pdf", data, "application/pdf")},
+                       data={"pages": pages, "width": str(width), "format": "jpeg"})
+
+
+def test_thumbnail_key_is_per_page_and_rendering_options():
+    key = thumbnail_key("a" * 64, 0, 200, "webp", 75)
+    assert thumbnail_key("a" * 64, 0, 200, "webp", 75) == key
+    assert len({key, thumbnail_key("a" * 64, 1, 200, "webp", 75), thumbnail_key("a" * 64, 0, 300, "webp", 75),
+                thumbnail_key("a" * 64, 0, 200, "jpeg", 75), thumbnail_key("a" * 64, 0, 200, "webp", 60),
+                thumbnail_key("b" * 64, 0, 200, "webp", 75)}) == 6
+
+
+def test_cached_pages_are_not_rendered_again(client, rendered):
+    data = make_pdf(4, seed=31)
+    first = thumbnails(client, data, "1-2")
+    assert first.status_code == 200
+    assert [thumb["index"] for thumb in first.json()["thumbnails"]] == [0, 1]
+    assert rendered == [(1, 2)]
+
+    second = thumbnails(client, data, "2-3")
+    assert second.status_code == 200
+    assert [thumb["index"] for thumb in second.json()["thumbnails"]] == [1, 2]
+    # Page 2 comes from the cache; only page 3 is rendered
+    assert rendered == [(1, 2), (3, 3)]
+    assert second.json()["thumbnails"][0]["data"] == first.json()["thumbnails"][1]["data"]
+
+
+def test_missing_poppler_gets_503(client, in_process_pool, monkeypatch):
+    def convert_from_path(*args, **kwargs):
+        raise PopplerNotInstalledError("Unable to get page count. Is poppler installed and in PATH?")
+
+    monkeypatch.setattr(pdf2image, "convert_from_path", convert_from_path)
+    response = thumbnails(client, make_pdf(2, seed=32), "1")
+    assert response.status_code == 503
+    assert "not available" in response.json()["detail"]
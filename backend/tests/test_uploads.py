@@ -0,0 +1,30 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.services.uploads import spool_upload
+
+OVERSIZED = b"%PDF-1.4\n" + b"0" * (1024 * 1024 + 1)
+
+
+def test_oversized_upload_gets_413_and_leaves_no_spool_file(client, spooled_uploads, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE_MB", 1)
+    response = client.post("/api/v1/compress/", files=[("files", ("big.pdf", OVERSIZED, "application/pdf"))],
+                           data={"level": "low"})
+    assert response.status_code == 413
+    assert spooled_uploads() == []
+
+
+def test_size_limit_is_checked_while_spooling(spooled_uploads, monkeypatch):
+    """Without a declared size the limit trips mid-write, and the partial spool file is removed"""
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE_MB", 1)
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 64 * 1024)
+    file = UploadFile(io.BytesIO(OVERSIZED), filename="big.pdf")
+    assert file.size is None
+    with pytest.raises(HTTPException) as too_large:
+        asyncio.run(spool_upload(file))
+    assert too_large.value.status_code == 413
+    assert spooled_uploads() == []
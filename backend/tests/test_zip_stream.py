@@ -0,0 +1,67 @@
+import asyncio
+import io
+import zipfile
+import zlib
+
+import pytest
+
+import app.services.zip_stream as zip_stream
+from app.services.zip_stream import ZipStreamWriter, stream_zip
+
+MEMBERS = [
+    ("a.txt", b"hello " * 1000),
+    ("dir/b.bin", bytes(range(256)) * 40),
+    ("empty.txt", b""),
+    ("नाम.txt", "यूनिकोड".encode("utf-8")),
+]
+
+
+def build(members, compression) -> bytes:
+    writer = ZipStreamWriter(compression)
+    out = []
+    for name, data in members:
+        out.extend(writer.add(name, data))
+    out.extend(writer.finish())
+    return b"".join(out)
+
+
+def assert_round_trips(archive: bytes, members) -> None:
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == [name for name, _ in members]
+        for (name, data), info in zip(members, zf.infolist()):
+            assert info.CRC == zlib.crc32(data)
+            assert info.file_size == len(data)
+            assert zf.read(name) == data
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_streamed_archive_opens_with_zipfile(compression):
+    assert_round_trips(build(MEMBERS, compression), MEMBERS)
+
+
+def test_member_data_can_arrive_in_chunks():
+    writer = ZipStreamWriter(zipfile.ZIP_DEFLATED)
+    archive = b"".join([*writer.add_chunks("a.txt", [b"abc", b"", b"def" * 5000]), *writer.finish()])
+    assert_round_trips(archive, [("a.txt", b"abc" + b"def" * 5000)])
+
+
+def test_zip64_records_are_written_past_the_limits(monkeypatch):
+    # Lowered limits make every offset after the first member, and the entry count, need ZIP64
+    monkeypatch.setattr(zip_stream, "_ZIP64_OFFSET_LIMIT", 100)
+    monkeypatch.setattr(zip_stream, "_ZIP64_COUNT_LIMIT", 2)
+    archive = build(MEMBERS, zipfile.ZIP_STORED)
+    assert b"PK\x06\x06" in archive and b"PK\x06\x07" in archive
+    assert_round_trips(archive, MEMBERS)
+
+
+def test_stream_zip_yields_a_valid_archive():
+    async def members():
+        for member in MEMBERS:
+            yield member
+
+    async def collect(compression):
+        return b"".join([chunk async for chunk in stream_zip(members(), compression)])
+
+    for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        assert_round_trips(asyncio.run(collect(compression)), MEMBERS)